@@ -0,0 +1,76 @@
+# Benchmark of the ACL message codecs.
+#
+# Compares the cost of encoding and decoding messages and the
+# bytes put on the wire by the pickle codec (the previous wire
+# format) and by the compact binary codec.
+#
+# Usage: python codec_benchmark.py [number_of_runs]
+
+from pade.acl.codec import PickleCodec, BinaryCodec
+from pade.acl.messages import ACLMessage
+from pade.acl.aid import AID
+
+from terminaltables import AsciiTable
+from pickle import dumps
+from sys import argv
+import timeit
+
+
+def inform_message():
+    message = ACLMessage(ACLMessage.INFORM)
+    message.set_sender(AID('sender@localhost:2000'))
+    message.add_receiver(AID('receiver@localhost:2001'))
+    message.set_content('Hello Agent!')
+    message.set_datetime_now()
+    return message
+
+
+def request_message():
+    message = ACLMessage(ACLMessage.REQUEST)
+    message.set_protocol(ACLMessage.FIPA_REQUEST_PROTOCOL)
+    message.set_sender(AID('sender@localhost:2000'))
+    message.add_receiver(AID('receiver@localhost:2001'))
+    message.set_content(dumps({'ref': 'REGISTER', 'content': list(range(100))}))
+    message.set_ontology('power')
+    message.set_language('python')
+    message.set_reply_with('request_1')
+    message.set_datetime_now()
+    return message
+
+
+def cfp_message():
+    message = ACLMessage(ACLMessage.CFP)
+    message.set_protocol(ACLMessage.FIPA_CONTRACT_NET_PROTOCOL)
+    message.set_sender(AID('sender@localhost:2000'))
+    for i in range(50):
+        message.add_receiver(AID('machine_{}@localhost:{}'.format(i, 3000 + i)))
+    message.set_content('60.0')
+    message.set_datetime_now()
+    return message
+
+
+def run(number):
+    codecs = [PickleCodec(), BinaryCodec()]
+    messages = [('inform', inform_message()),
+                ('request', request_message()),
+                ('cfp x50', cfp_message())]
+
+    table = [['message', 'codec', 'bytes', 'encode (us)', 'decode (us)']]
+    for name, message in messages:
+        for codec in codecs:
+            data = codec.encode(message)
+            encode_time = timeit.timeit(lambda: codec.encode(message), number=number)
+            decode_time = timeit.timeit(lambda: codec.decode(data), number=number)
+            table.append([name,
+                          codec.name,
+                          len(data),
+                          '{:.1f}'.format(encode_time / number * 1e6),
+                          '{:.1f}'.format(decode_time / number * 1e6)])
+    print(AsciiTable(table).table)
+
+
+if __name__ == '__main__':
+    if len(argv) > 1:
+        run(int(argv[1]))
+    else:
+        run(2000)
@@ -6,6 +6,7 @@ from pade.acl.aid import AID
 from pade.acl.messages import ACLMessage
 from pade.behaviours.protocols import FipaContractNetProtocol, FipaSubscribeProtocol
 from pade.behaviours.protocols import TimedBehaviour
+from pade.behaviours.contract_net import BatchedContractNetProtocol
 from pade.core.Organization import Organization
 from pade.misc.common import PadeSession
 
@@ -61,76 +62,29 @@ class PublisherProtocolMachine(FipaSubscribeProtocol):
         super(PublisherProtocolMachine, self).notify(message)
 
 
-class JobBidRequest(FipaContractNetProtocol):
+class JobBidRequest(BatchedContractNetProtocol):
     """JobBidRequest
 
        Initial FIPA-ContractNet Behaviour that sends CFP messages
        to Machine Agents asking for job bidding proposals.
-       This behaviour also analyzes the proposals and selects the
-       one it judges to be the best."""
+       The proposals of a round are evaluated together and the one
+       with the higher available power is selected."""
 
     def __init__(self, agent):
-        super(JobBidRequest, self).__init__(
-            agent=agent, message=None, is_initiator=True)
+        super(JobBidRequest, self).__init__(agent=agent, message=None)
         display_message(self.agent.aid.name, 'Sending proposals...')
 
-    def handle_all_proposes(self, proposes):
+    def handle_winners(self, winners, table):
         """
-        Function that looks at the received proposals,
-        anlaysis them and chooses the best one.
+        Function that reports the result of a round, the
+        proposals were already answered.
         """
-
-        super(JobBidRequest, self).handle_all_proposes(proposes)
-
-        best_proposer = None
-        higher_power = 0.0
-        other_proposers = list()
-        display_message(self.agent.aid.name, 'Analyzing proposals...')
-
-        i = 1
-
-        # logic to select proposals by the higher available power.
-        for message in proposes:
-            content = message.content
-            power = float(content)
-            display_message(self.agent.aid.name,
-                            'Analyzing proposal {i}'.format(i=i))
-            display_message(self.agent.aid.name,
-                            'Power Offered: {pot}'.format(pot=power))
-            i += 1
-            if power > higher_power:
-                if best_proposer is not None:
-                    other_proposers.append(best_proposer)
-
-                higher_power = power
-                best_proposer = message.sender
-            else:
-                other_proposers.append(message.sender)
-
         display_message(self.agent.aid.name,
-                        'The best proposal was: {pot} VA'.format(
-                            pot=higher_power))
-
-        if other_proposers:
+                        'Analyzed {} proposals'.format(len(table)))
+        if winners:
             display_message(self.agent.aid.name,
-                            'Sending REJECT_PROPOSAL answers...')
-            answer = ACLMessage(ACLMessage.REJECT_PROPOSAL)
-            answer.set_protocol(ACLMessage.FIPA_CONTRACT_NET_PROTOCOL)
-            answer.set_content('')
-            for agent in other_proposers:
-                answer.add_receiver(agent)
-
-            self.agent.send(answer)
-
-        if best_proposer is not None:
-            display_message(self.agent.aid.name,
-                            'Sending ACCEPT_PROPOSAL answer...')
-
-            answer = ACLMessage(ACLMessage.ACCEPT_PROPOSAL)
-            answer.set_protocol(ACLMessage.FIPA_CONTRACT_NET_PROTOCOL)
-            answer.set_content('OK')
-            answer.add_receiver(best_proposer)
-            self.agent.send(answer)
+                            'The best proposal was: {pot} VA'.format(
+                                pot=self.parse_bid(winners[0])))
 
     def handle_inform(self, message):
         """
@@ -146,13 +100,6 @@ class JobBidRequest(FipaContractNetProtocol):
 
         display_message(self.agent.aid.name, 'REFUSE message received')
 
-    def handle_propose(self, message):
-        """
-        """
-        super(JobBidRequest, self).handle_propose(message)
-
-        display_message(self.agent.aid.name, 'PROPOSE message received')
-
     def notify(self, message):
         particapants = self.agent.subProtocal.get_partial_subscribers("machine")
         for sub in particapants:
@@ -0,0 +1,314 @@
+"""Framework for Intelligent Agents Development - PADE
+
+The MIT License (MIT)
+
+Copyright (c) 2019 Lucas S Melo
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+"""
+    ACL message codecs module
+    -------------------------
+
+    This module contains the codecs used to put ACLMessage objects
+    on the wire. Every encoded message starts with one byte that
+    identifies the codec, so peers can decode messages produced
+    by any registered codec.
+
+    The BinaryCodec writes a struct-packed header followed only by
+    the FIPA fields that are populated in the message. The
+    PickleCodec keeps the previous wire format and is used as
+    fallback for messages the binary codec cannot represent.
+"""
+
+import xml.etree.ElementTree as ET
+from datetime import datetime
+import pickle
+import struct
+
+from pade.acl.aid import AID
+from pade.acl.messages import ACLMessage
+
+
+class CodecError(Exception):
+    """Raised when a message cannot be encoded or decoded."""
+    pass
+
+
+class Codec(object):
+    """Class that states the methods of a codec.
+    All codecs should inherit from this class.
+    """
+
+    codec_id = None
+    name = None
+
+    def encode(self, message):
+        """Returns the bytes that represent the message.
+        """
+        raise NotImplementedError
+
+    def decode(self, data):
+        """Returns the message represented by the bytes.
+        """
+        raise NotImplementedError
+
+
+class PickleCodec(Codec):
+    """Codec that pickles the whole ACLMessage object.
+    """
+
+    codec_id = 0
+    name = 'pickle'
+
+    def encode(self, message):
+        return pickle.dumps(message)
+
+    def decode(self, data):
+        return pickle.loads(data)
+
+
+class BinaryCodec(Codec):
+    """Compact codec that writes only the populated FIPA fields.
+
+    The encoded message has the layout:
+
+        flags (B) | content kind (B) | fields (H) | field values...
+
+    where the bits of ``fields`` tell which of the optional fields
+    follow, in the order of ``BinaryCodec.fields``. Strings are
+    written as UTF-8 with a 2-byte length, the datetime as its
+    wall-clock fields and the content with a 4-byte length.
+    """
+
+    codec_id = 1
+    name = 'binary'
+
+    HEADER = struct.Struct('!BBH')
+    SHORT = struct.Struct('!H')
+    LONG = struct.Struct('!I')
+    DATETIME = struct.Struct('!HBBBBBI')
+
+    SYSTEM_MESSAGE = 0x01
+
+    CONTENT_NONE = 0
+    CONTENT_STR = 1
+    CONTENT_BYTES = 2
+    CONTENT_XML = 3
+    CONTENT_PICKLE = 4
+
+    # optional string fields, in wire order
+    fields = ('performative', 'language', 'encoding', 'ontology', 'protocol',
+              'conversation_id', 'messageID', 'reply_with', 'in_reply_to',
+              'reply_by')
+
+    SENDER = 1 << len(fields)
+    RECEIVERS = SENDER << 1
+    REPLY_TO = RECEIVERS << 1
+    DATETIME_FIELD = REPLY_TO << 1
+
+    def encode(self, message):
+        parts = list()
+        present = 0
+
+        for i, field in enumerate(self.fields):
+            value = getattr(message, field)
+            if value is None:
+                continue
+            if not isinstance(value, str):
+                raise CodecError('field {} must be a string'.format(field))
+            present |= 1 << i
+            self._pack_str(parts, value)
+
+        if message.sender is not None:
+            present |= self.SENDER
+            self._pack_str(parts, message.sender.name)
+        if message.receivers:
+            present |= self.RECEIVERS
+            self._pack_aids(parts, message.receivers)
+        if message.reply_to:
+            present |= self.REPLY_TO
+            self._pack_aids(parts, message.reply_to)
+        if message.datetime is not None:
+            present |= self.DATETIME_FIELD
+            date = message.datetime
+            parts.append(self.DATETIME.pack(date.year, date.month, date.day, date.hour,
+                                            date.minute, date.second, date.microsecond))
+
+        kind, content = self._pack_content(message.content)
+        if content is not None:
+            parts.append(self.LONG.pack(len(content)))
+            parts.append(content)
+
+        flags = self.SYSTEM_MESSAGE if message.system_message else 0
+        parts.insert(0, self.HEADER.pack(flags, kind, present))
+        return b''.join(parts)
+
+    def decode(self, data):
+        data = memoryview(data)
+        flags, kind, present = self.HEADER.unpack_from(data)
+        offset = self.HEADER.size
+        message = ACLMessage()
+
+        values = dict()
+        for i, field in enumerate(self.fields):
+            if present & (1 << i):
+                values[field], offset = self._unpack_str(data, offset)
+
+        if 'performative' in values:
+            message.set_performative(values['performative'])
+        if 'language' in values:
+            message.set_language(values['language'])
+        if 'encoding' in values:
+            message.set_encoding(values['encoding'])
+        if 'ontology' in values:
+            message.set_ontology(values['ontology'])
+        if 'protocol' in values:
+            message.set_protocol(values['protocol'])
+        if 'conversation_id' in values:
+            message.set_conversation_id(values['conversation_id'])
+        if 'messageID' in values:
+            message.set_message_id(values['messageID'])
+        if 'reply_with' in values:
+            message.set_reply_with(values['reply_with'])
+        if 'in_reply_to' in values:
+            message.set_in_reply_to(values['in_reply_to'])
+        if 'reply_by' in values:
+            message.set_reply_by(values['reply_by'])
+
+        if present & self.SENDER:
+            name, offset = self._unpack_str(data, offset)
+            message.set_sender(AID(name=name))
+        if present & self.RECEIVERS:
+            names, offset = self._unpack_aids(data, offset)
+            for name in names:
+                message.add_receiver(AID(name=name))
+        if present & self.REPLY_TO:
+            names, offset = self._unpack_aids(data, offset)
+            for name in names:
+                message.reply_to.append(AID(name=name))
+        if present & self.DATETIME_FIELD:
+            message.set_datetime(datetime(*self.DATETIME.unpack_from(data, offset)))
+            offset += self.DATETIME.size
+
+        if kind != self.CONTENT_NONE:
+            length, = self.LONG.unpack_from(data, offset)
+            offset += self.LONG.size
+            content = data[offset:offset + length].tobytes()
+            message.set_content(self._unpack_content(kind, content))
+
+        message.set_system_message(bool(flags & self.SYSTEM_MESSAGE))
+        return message
+
+    def _pack_str(self, parts, value):
+        value = value.encode('utf-8')
+        if len(value) > 0xFFFF:
+            raise CodecError('string field longer than 65535 bytes')
+        parts.append(self.SHORT.pack(len(value)))
+        parts.append(value)
+
+    def _unpack_str(self, data, offset):
+        length, = self.SHORT.unpack_from(data, offset)
+        offset += self.SHORT.size
+        value = str(data[offset:offset + length], 'utf-8')
+        return value, offset + length
+
+    def _pack_aids(self, parts, aids):
+        if len(aids) > 0xFFFF:
+            raise CodecError('more than 65535 agents in a field')
+        parts.append(self.SHORT.pack(len(aids)))
+        for aid in aids:
+            self._pack_str(parts, aid.name)
+
+    def _unpack_aids(self, data, offset):
+        count, = self.SHORT.unpack_from(data, offset)
+        offset += self.SHORT.size
+        names = list()
+        for _ in range(count):
+            name, offset = self._unpack_str(data, offset)
+            names.append(name)
+        return names, offset
+
+    def _pack_content(self, content):
+        if content is None:
+            return self.CONTENT_NONE, None
+        if isinstance(content, str):
+            return self.CONTENT_STR, content.encode('utf-8')
+        if isinstance(content, bytes):
+            return self.CONTENT_BYTES, content
+        if isinstance(content, ET.Element):
+            return self.CONTENT_XML, ET.tostring(content)
+        return self.CONTENT_PICKLE, pickle.dumps(content)
+
+    def _unpack_content(self, kind, content):
+        if kind == self.CONTENT_STR:
+            return content.decode('utf-8')
+        if kind == self.CONTENT_BYTES:
+            return content
+        if kind == self.CONTENT_XML:
+            return ET.fromstring(content)
+        if kind == self.CONTENT_PICKLE:
+            return pickle.loads(content)
+        raise CodecError('unknown content kind {}'.format(kind))
+
+
+CODECS = dict()
+
+
+def register_codec(codec):
+    """Makes a codec available to encode and decode messages.
+
+    :param codec: Codec instance with an unique codec_id
+    """
+    CODECS[codec.codec_id] = codec
+
+
+register_codec(PickleCodec())
+register_codec(BinaryCodec())
+
+DEFAULT_CODEC = CODECS[BinaryCodec.codec_id]
+
+
+def encode(message, codec=None):
+    """Encodes the message prefixed by the codec id.
+    Messages the codec cannot represent are pickled.
+
+    :param message: ACLMessage to be encoded
+    :param codec: Codec instance, DEFAULT_CODEC when None
+    """
+    if codec is None:
+        codec = DEFAULT_CODEC
+    try:
+        data = codec.encode(message)
+    except CodecError:
+        codec = CODECS[PickleCodec.codec_id]
+        data = codec.encode(message)
+    return b''.join((bytes((codec.codec_id,)), data))
+
+
+def decode(data):
+    """Decodes a message produced by encode().
+
+    :param data: bytes starting with the codec id
+    """
+    try:
+        codec = CODECS[data[0]]
+    except (KeyError, IndexError):
+        raise CodecError('unknown codec')
+    return codec.decode(memoryview(data)[1:])
@@ -23,48 +23,303 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 THE SOFTWARE.
 """
 
+"""
+    Filters module
+    --------------
+
+    This module implements the filters used to select messages.
+    A Filter compares the fields of a message with the values set
+    in it, a field set with a collection of values matches any of
+    them. Filters are combined with the &, | and ~ operators.
+
+    The filters are compiled the first time they are used: only
+    the fields that were set are checked, the most selective ones
+    first, and the check stops at the first field that does not
+    match. The compiled predicate is kept until the filter, or a
+    filter combined in it, changes. keys() returns the (protocol,
+    performative, conversation_id) keys of the messages a filter
+    can match, the same keys used to dispatch messages to the
+    behaviours.
+
+    Filters that select the same messages compare equal. They can
+    change after they are built, so they are not hashable.
+"""
+
+from fnmatch import fnmatchcase
+from itertools import product
+import weakref
+
 from pade.acl.aid import AID
 from pade.acl.messages import ACLMessage
 
-class Filter():
+
+def _values(value):
+    """Returns None, a single value or a frozenset of values."""
+    if value is None or isinstance(value, (str, bytes, AID)):
+        return value
+    try:
+        return frozenset(value)
+    except TypeError:
+        return value
+
+
+def _field_check(field, value):
+    if isinstance(value, frozenset):
+        return lambda message: getattr(message, field) in value
+    return lambda message: getattr(message, field) == value
+
+
+class BaseFilter(object):
+    """Class that states the methods of a filter.
+    All filters should inherit from this class and
+    implement _build.
+    """
+
+    _predicate = None
+
+    def __setattr__(self, name, value):
+        # any change in the filter discards the compiled predicate,
+        # filters set as attributes are watched for changes
+        object.__setattr__(self, name, value)
+        if name.startswith('_'):
+            return
+        children = value if isinstance(value, tuple) else (value,)
+        for child in children:
+            if isinstance(child, BaseFilter):
+                child._add_parent(self)
+        self._changed()
+
+    def filter(self, message):
+        """Returns True if the message is selected by the filter."""
+        predicate = self._predicate
+        if predicate is None:
+            predicate = self.compile()
+        return predicate(message)
+
+    def compile(self):
+        """Returns a function that receives a message and
+        returns True if the message is selected by the filter.
+        The function is built once and kept until the filter
+        changes.
+        """
+        if self._predicate is None:
+            self._predicate = self._build()
+        return self._predicate
+
+    def _build(self):
+        raise NotImplementedError
+
+    def _add_parent(self, parent):
+        parents = self.__dict__.get('_parents')
+        if parents is None:
+            parents = self._parents = list()
+        if not any(ref() is parent for ref in parents):
+            parents.append(weakref.ref(parent))
+
+    def _changed(self):
+        """Discards the compiled predicate of the filter and
+        of the filters that contain it.
+        """
+        self._predicate = None
+        parents = self.__dict__.get('_parents')
+        if parents:
+            parents[:] = [ref for ref in parents if ref() is not None]
+            for ref in parents:
+                parent = ref()
+                if parent is not None:
+                    parent._changed()
+
+    def keys(self):
+        """Returns the (protocol, performative, conversation_id)
+        keys of the messages the filter can select, None in a
+        position matches any value, or None if the filter
+        cannot be indexed.
+        """
+        return None
+
+    def __and__(self, other):
+        return AndFilter(self, other)
+
+    def __or__(self, other):
+        return OrFilter(self, other)
+
+    def __invert__(self):
+        return NotFilter(self)
+
+    def __call__(self, message):
+        return self.filter(message)
+
+    def _key(self):
+        raise NotImplementedError
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self._key() == other._key()
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+
+class Filter(BaseFilter):
     '''
         This class instantiates a filter object. The filter has the purpose of 
         selecting messages with pre established attributes in the filter object
     '''
+
+    # fields in the order they are checked, the most selective first
+    fields = ('conversation_id', 'performative', 'protocol', 'sender',
+              'ontology', 'language', 'encoding')
+
     def __init__(self):
         self.conversation_id = None
         self.sender = None
+        self.sender_pattern = None
         self.performative = None
         self.protocol = None
-    
+        self.ontology = None
+        self.language = None
+        self.encoding = None
+        self.content_type = None
+
     def set_sender(self, aid):
-        self.sender = aid
+        self.sender = _values(aid)
+
+    def set_sender_pattern(self, pattern):
+        """Selects the senders whose name matches a shell-style
+        wildcard pattern, for instance 'machine_*@*'.
+        """
+        self.sender_pattern = pattern
         
     def set_performative(self, performative):
-        self.performative = performative
+        self.performative = _values(performative)
     
     def set_conversation_id(self, conversation_id):
-        self.conversation_id = conversation_id
+        self.conversation_id = _values(conversation_id)
     
     def set_protocol(self, protocol):
-        self.protocol = protocol
-    
-    def filter(self, message):
-        state = True
-        
-        if self.conversation_id != None and self.conversation_id != message.conversation_id:
-            state = False
-        
-        if self.sender != None and self.sender != message.sender:
-            state = False
-        
-        if self.performative != None and self.performative != message.performative:
-            state = False
-        
-        if self.protocol != None and self.protocol != message.protocol:
-            state = False
-            
-        return state
+        self.protocol = _values(protocol)
+
+    def set_ontology(self, ontology):
+        self.ontology = _values(ontology)
+
+    def set_language(self, language):
+        self.language = _values(language)
+
+    def set_encoding(self, encoding):
+        self.encoding = _values(encoding)
+
+    def set_content_type(self, content_type):
+        """Selects the messages whose content is an instance
+        of a type or of a tuple of types.
+        """
+        self.content_type = content_type
+
+    def _build(self):
+        checks = list()
+        for field in self.fields:
+            value = getattr(self, field)
+            if value is not None:
+                checks.append(_field_check(field, value))
+        if self.sender_pattern is not None:
+            pattern = self.sender_pattern
+            checks.append(lambda message: message.sender is not None and
+                          fnmatchcase(message.sender.name, pattern))
+        if self.content_type is not None:
+            content_type = self.content_type
+            checks.append(lambda message: isinstance(message.content, content_type))
+
+        if not checks:
+            return lambda message: True
+        if len(checks) == 1:
+            return checks[0]
+        checks = tuple(checks)
+        return lambda message: all(check(message) for check in checks)
+
+    def keys(self):
+        fields = list()
+        for value in (self.protocol, self.performative, self.conversation_id):
+            if value is None:
+                fields.append((None,))
+            elif isinstance(value, frozenset):
+                fields.append(tuple(value))
+            else:
+                fields.append((value,))
+        return list(product(*fields))
+
+    def _key(self):
+        content_type = self.content_type
+        if isinstance(content_type, (list, tuple)):
+            content_type = frozenset(content_type)
+        return tuple(getattr(self, field) for field in self.fields) + \
+            (self.sender_pattern, content_type)
+
+
+class AndFilter(BaseFilter):
+    """Selects the messages selected by all of its filters."""
+
+    def __init__(self, *filters):
+        self.filters = tuple(filters)
+
+    def _build(self):
+        predicates = tuple(f.compile() for f in self.filters)
+        return lambda message: all(p(message) for p in predicates)
+
+    def keys(self):
+        # a message selected by the filter is selected by every
+        # child, the keys of any indexable child are enough.
+        candidates = [keys for keys in (f.keys() for f in self.filters)
+                      if keys is not None]
+        if not candidates:
+            return None
+        return min(candidates, key=len)
+
+    def _key(self):
+        return self.filters
+
+
+class OrFilter(BaseFilter):
+    """Selects the messages selected by any of its filters."""
+
+    def __init__(self, *filters):
+        self.filters = tuple(filters)
+
+    def _build(self):
+        predicates = tuple(f.compile() for f in self.filters)
+        return lambda message: any(p(message) for p in predicates)
+
+    def keys(self):
+        keys = list()
+        for f in self.filters:
+            child = f.keys()
+            if child is None:
+                return None
+            keys.extend(k for k in child if k not in keys)
+        return keys
+
+    def _key(self):
+        return self.filters
+
+    def __eq__(self, other):
+        # the order of the filters does not matter
+        if type(self) is not type(other) or len(self.filters) != len(other.filters):
+            return False
+        return all(f in other.filters for f in self.filters) and \
+            all(f in self.filters for f in other.filters)
+
+
+class NotFilter(BaseFilter):
+    """Selects the messages not selected by its filter."""
+
+    def __init__(self, inner):
+        self.inner = inner
+
+    def _build(self):
+        predicate = self.inner.compile()
+        return lambda message: not predicate(message)
+
+    def _key(self):
+        return self.inner
 
 if __name__ == '__main__':
     message = ACLMessage(ACLMessage.REQUEST)
@@ -79,3 +334,9 @@ if __name__ == '__main__':
         print(message.as_xml())
     else:
         print('The message was blocked by the protocol.')
+
+    filtro_informs = Filter()
+    filtro_informs.set_performative([ACLMessage.INFORM, ACLMessage.INFORM_IF])
+
+    if (filtro & ~filtro_informs).filter(message):
+        print('The message is a request that is not an inform.')
@@ -39,10 +39,20 @@ from uuid import uuid1
 from pade.acl.aid import AID
 
 
-class ACLMessage(ET.Element):
+class ACLMessage(object):
     """Class that implements a ACLMessage message type
+
+    The message fields are kept in slots and the XML representation
+    is only generated when it is requested, by as_xml, get_message
+    or the read-only ElementTree view returned by as_element, which
+    also backs find, findall, findtext and iter.
     """
 
+    __slots__ = ('performative', 'system_message', 'sender', 'receivers',
+                 'reply_to', 'content', 'language', 'encoding', 'ontology',
+                 'protocol', '_conversation_id', '_message_id', 'reply_with',
+                 'in_reply_to', 'reply_by', 'datetime', '__weakref__')
+
     ACCEPT_PROPOSAL = 'accept-proposal'
     AGREE = 'agree'
     CANCEL = 'cancel'
@@ -89,62 +99,14 @@ class ACLMessage(ET.Element):
             It can be INFORM, CFP, AGREE, PROPOSE...
             All these types are attributes of ACLMessafe class.
         """
-        super(ACLMessage, self).__init__('ACLMessage')
-
-        self.append(ET.Element('performative'))
-        self.append(ET.Element('system-message'))
-        self.append(ET.Element('sender'))
-        self.append(ET.Element('receivers'))
-        self.append(ET.Element('reply-to'))
-        self.append(ET.Element('content'))
-        self.append(ET.Element('language'))
-        self.append(ET.Element('encoding'))
-        self.append(ET.Element('ontology'))
-        self.append(ET.Element('protocol'))
-        self.append(ET.Element('conversationID'))
-        self.append(ET.Element('messageID'))
-        self.append(ET.Element('reply-with'))
-        self.append(ET.Element('in-reply-to'))
-        self.append(ET.Element('reply-by'))
-        self.append(ET.Element('reply-by'))
-        self.append(ET.Element('datetime'))
-        
-        if performative != None:
-            if performative.lower() in self.performatives:
-                self.performative = performative.lower()
-                self.find('performative').text = self.performative
+        if performative is not None and performative.lower() in self.performatives:
+            self.performative = performative.lower()
         else:
             self.performative = None
 
-        self.conversation_id = str(uuid1())
-        self.find('conversationID').text = self.conversation_id
-
-        self.messageID = str(uuid1())
-        self.find('messageID').text = self.messageID
-
-        self.datetime = datetime.now()
-        datetime_tag = self.find('datetime')
-        day = ET.Element('day')
-        day.text = str(self.datetime.day)
-        datetime_tag.append(day)
-        month = ET.Element('month')
-        month.text = str(self.datetime.month)
-        datetime_tag.append(month)
-        year = ET.Element('year')
-        year.text = str(self.datetime.year)
-        datetime_tag.append(year)
-        hour = ET.Element('hour')
-        hour.text = str(self.datetime.hour)
-        datetime_tag.append(hour)
-        minute = ET.Element('minute')
-        minute.text = str(self.datetime.minute)
-        datetime_tag.append(minute)
-        second = ET.Element('second')
-        second.text = str(self.datetime.second)
-        datetime_tag.append(second)
-        microsecond = ET.Element('microsecond')
-        microsecond.text = str(self.datetime.microsecond)
-        datetime_tag.append(microsecond)
+        # the identifiers are generated the first time they are read
+        self._conversation_id = None
+        self._message_id = None
 
         self.system_message = False
         self.datetime = None
@@ -160,6 +122,26 @@ class ACLMessage(ET.Element):
         self.in_reply_to = None
         self.reply_by = None
 
+    @property
+    def conversation_id(self):
+        if self._conversation_id is None:
+            self._conversation_id = str(uuid1())
+        return self._conversation_id
+
+    @conversation_id.setter
+    def conversation_id(self, value):
+        self._conversation_id = value
+
+    @property
+    def messageID(self):
+        if self._message_id is None:
+            self._message_id = str(uuid1())
+        return self._message_id
+
+    @messageID.setter
+    def messageID(self, value):
+        self._message_id = value
+
     def set_performative(self, performative):
         """Method to set the Performative parameter of the ACL message.
 
@@ -167,23 +149,15 @@ class ACLMessage(ET.Element):
            It can be any of the attributes of the ACLMessage class.
         """
         self.performative = performative
-        self.find('performative').text = str(performative).lower()
 
     def set_system_message(self, is_system_message):
         self.system_message = is_system_message
-        self.find('system-message').text = str(is_system_message)
 
     def set_datetime_now(self):
         self.datetime = datetime.now()
-        datetime_tag = self.find('datetime')
 
-        datetime_tag.find('day').text = str(self.datetime.day)
-        datetime_tag.find('month').text = str(self.datetime.month)
-        datetime_tag.find('year').text = str(self.datetime.year)
-        datetime_tag.find('hour').text = str(self.datetime.hour)
-        datetime_tag.find('minute').text = str(self.datetime.minute)
-        datetime_tag.find('second').text = str(self.datetime.second)
-        datetime_tag.find('microsecond').text = str(self.datetime.microsecond)
+    def set_datetime(self, date):
+        self.datetime = date
 
     def set_sender(self, aid):
         """Method to set the agent that will send the message.
@@ -192,7 +166,6 @@ class ACLMessage(ET.Element):
         """
         if isinstance(aid, AID):
             self.sender = aid
-            self.find('sender').text = str(self.sender.name)
         else:
             self.set_sender(AID(name=aid))
 
@@ -204,10 +177,6 @@ class ACLMessage(ET.Element):
 
         if isinstance(aid, AID):
             self.receivers.append(aid)
-            receivers = self.find('receivers')
-            receiver = ET.Element('receiver')
-            receiver.text = str(aid.name)
-            receivers.append(receiver)
         else:
             self.add_receiver(AID(name=aid))
 
@@ -218,63 +187,118 @@ class ACLMessage(ET.Element):
 
         """
         if isinstance(aid, AID):
-            self.reply_to.append[aid]
-            reply_to = self.find('reply_to')
-            receiver = ET.Element('receiver')
-            receiver.text = str(aid.name)
-            reply_to.append(receiver)
+            self.reply_to.append(aid)
         else:
             self.add_reply_to(AID(name=aid))
 
     def set_content(self, data):
-        if isinstance(data, ET.Element):
-            self.content = data
-            self.find('content').append(data)
-        else:
-            self.content = data
-            self.find('content').text = self.content
+        self.content = data
 
     def set_language(self, data):
         self.language = data
-        self.find('language').text = str(data)
 
     def set_encoding(self, data):
         self.encoding = data
-        self.find('encoding').text = str(data)
 
     def set_ontology(self, data):
         self.ontology = data
-        self.find('ontology').text = str(data)
 
     def set_protocol(self, data):
         self.protocol = data
-        self.find('protocol').text = str(data)
 
     def set_conversation_id(self, data):
         self.conversation_id = data
-        self.find('conversationID').text = str(data)
 
-    def set_message_id(self):
-        self.messageID = str(uuid1())
-        self.find('messageID').text = self.messageID
+    def set_message_id(self, data=None):
+        if data is None:
+            data = str(uuid1())
+        self.messageID = data
 
     def set_reply_with(self, data):
         self.reply_with = data
-        self.find('reply-with').text = str(data)
 
     def set_in_reply_to(self, data):
         self.in_reply_to = data
-        self.find('in-reply-to').text = str(data)
 
     def set_reply_by(self, data):
         self.reply_by = data
-        self.find('reply-by').text = str(data)
+
+    def as_element(self):
+        """Builds the ElementTree representation of the message.
+
+        The tree is generated on every call, changes made to
+        it are not reflected in the message.
+        """
+        root = ET.Element('ACLMessage')
+
+        def element(tag, text=None):
+            e = ET.SubElement(root, tag)
+            if text is not None:
+                e.text = text
+            return e
+
+        if self.performative is not None:
+            element('performative', str(self.performative).lower())
+        else:
+            element('performative')
+        element('system-message', str(self.system_message))
+        element('sender', str(self.sender.name) if self.sender is not None else None)
+
+        receivers = element('receivers')
+        for aid in self.receivers:
+            ET.SubElement(receivers, 'receiver').text = str(aid.name)
+        reply_to = element('reply-to')
+        for aid in self.reply_to:
+            ET.SubElement(reply_to, 'receiver').text = str(aid.name)
+
+        content = element('content')
+        if isinstance(self.content, ET.Element):
+            content.append(self.content)
+        else:
+            content.text = self.content
+
+        for tag, value in (('language', self.language),
+                           ('encoding', self.encoding),
+                           ('ontology', self.ontology),
+                           ('protocol', self.protocol),
+                           ('conversationID', self.conversation_id),
+                           ('messageID', self.messageID),
+                           ('reply-with', self.reply_with),
+                           ('in-reply-to', self.in_reply_to),
+                           ('reply-by', self.reply_by)):
+            element(tag, str(value) if value is not None else None)
+
+        datetime_tag = element('datetime')
+        if self.datetime is not None:
+            for tag in ('day', 'month', 'year', 'hour', 'minute', 'second', 'microsecond'):
+                ET.SubElement(datetime_tag, tag).text = str(getattr(self.datetime, tag))
+
+        return root
+
+    @property
+    def tag(self):
+        return 'ACLMessage'
+
+    def find(self, path):
+        return self.as_element().find(path)
+
+    def findall(self, path):
+        return self.as_element().findall(path)
+
+    def findtext(self, path, default=None):
+        return self.as_element().findtext(path, default)
+
+    def iter(self, tag=None):
+        return self.as_element().iter(tag)
+
+    def __iter__(self):
+        return iter(self.as_element())
 
     def get_message(self):
-        return ET.tostring(self)
+        return ET.tostring(self.as_element())
 
     def as_xml(self):
-        domElement = minidom.parseString(ET.tostring(self))
+        domElement = minidom.parseString(ET.tostring(self.as_element()))
         return domElement.toprettyxml()
 
     def __str__(self):
@@ -335,141 +359,62 @@ class ACLMessage(ET.Element):
     def set_message(self, data):
         aclmsg = ET.fromstring(data)
 
-        try:
-            self.performative = aclmsg.find('performative').text
-            self.find('performative').text = self.performative
-        except:
-            pass
+        performative = aclmsg.findtext('performative')
+        if performative is not None:
+            self.performative = performative
 
-        try:
-            system_message = aclmsg.find('system-message').text
-            if system_message == 'True':
-                self.system_message = True
-                self.find('system-message').text = system_message
-            else:
-                self.system_message = False
-                self.find('system-message').text = system_message
-        except:
-            pass
+        system_message = aclmsg.findtext('system-message')
+        if system_message is not None:
+            self.system_message = system_message == 'True'
 
-        try:
-            self.conversation_id = aclmsg.find('conversationID').text
-            self.find('conversationID').text = self.conversation_id
-        except:
-            pass
+        conversation_id = aclmsg.findtext('conversationID')
+        if conversation_id is not None:
+            self.conversation_id = conversation_id
 
-        try:
-            self.messageID = aclmsg.find('messageID').text
-            self.find('messageID').text = self.messageID
-        except:
-            pass
+        message_id = aclmsg.findtext('messageID')
+        if message_id is not None:
+            self.messageID = message_id
 
         try:
             datetime_tag = aclmsg.find('datetime')
-            my_datetime_tag = self.find('datetime')
-
-            day = int(datetime_tag.findtext('day'))
-            my_datetime_tag.find('day').text = str(day)
-            month = int(datetime_tag.findtext('month'))
-            my_datetime_tag.find('month').text = str(month)
-            year = int(datetime_tag.findtext('year'))
-            my_datetime_tag.find('year').text = str(year)
-            hour = int(datetime_tag.findtext('hour'))
-            my_datetime_tag.find('hour').text = str(hour)
-            minute = int(datetime_tag.findtext('minute'))
-            my_datetime_tag.find('minute').text = str(minute)
-            second = int(datetime_tag.findtext('second'))
-            my_datetime_tag.find('second').text = str(second)
-            microsecond = int(datetime_tag.findtext('microsecond'))
-            my_datetime_tag.find('microsecond').text = str(microsecond)
-
-            self.datetime = datetime(year=year,
-                                     month=month,
-                                     day=day,
-                                     hour=hour,
-                                     minute=minute,
-                                     second=second,
-                                     microsecond=microsecond)
-        except:
-            pass
-
-        try:
-            self.sender = AID(name = aclmsg.find('sender').text)
-            self.find('sender').text = self.sender.name
-        except:
-            pass
-
-        try:
-            receivers = aclmsg.find('receivers').getchildren()
-
-            for receiver in receivers:
-                aid = AID(name=receiver.text)
-                self.receivers.append(aid)
-                r = ET.Element('receiver')
-                r.text = aid.name
-                self.find('receivers').append(r)
+            self.datetime = datetime(year=int(datetime_tag.findtext('year')),
+                                     month=int(datetime_tag.findtext('month')),
+                                     day=int(datetime_tag.findtext('day')),
+                                     hour=int(datetime_tag.findtext('hour')),
+                                     minute=int(datetime_tag.findtext('minute')),
+                                     second=int(datetime_tag.findtext('second')),
+                                     microsecond=int(datetime_tag.findtext('microsecond')))
         except:
             pass
 
-        try:
-            receivers = aclmsg.find('reply-to').getchildren()
+        sender = aclmsg.findtext('sender')
+        if sender is not None:
+            self.sender = AID(name=sender)
 
+        receivers = aclmsg.find('receivers')
+        if receivers is not None:
             for receiver in receivers:
-                aid = AID(name=receiver.text)
-                self.reply_to.append(aid)
-                r = ET.Element('receiver')
-                r.text = aid.name
-                self.find('reply-to').append(r)
-        except:
-            pass
-
-        try:
-            self.content = aclmsg.find('content').text
-            self.find('content').text = self.content
-        except:
-            pass
-
-        try:
-            self.language = aclmsg.find('language').text
-            self.find('language').text = self.language
-        except:
-            pass
-
-        try:
-            self.encoding = aclmsg.find('encoding').text
-            self.find('encoding').text = self.encoding
-        except:
-            pass
-
-        try:
-            self.ontology = aclmsg.find('ontology').text
-            self.find('ontology').text = self.ontology
-        except:
-            pass
-
-        try:
-            self.protocol = aclmsg.find('protocol').text
-            self.find('protocol').text = self.protocol
-        except:
-            pass
-
-        try:
-            self.reply_with = aclmsg.find('reply-with').text
-            self.find('reply-with').text = self.reply_with
-        except:
-            pass
-
-        try:
-            self.in_reply_to = aclmsg.find('in-reply-to').text
-            self.find('in-reply-to').text = self.in_reply_to
-        except:
-            pass
-
-        try:
-            self.reply_by = aclmsg.find('reply-by').text
-            self.find('reply-by').text = self.reply_by
-        except:
-            pass
+                self.receivers.append(AID(name=receiver.text))
+
+        reply_to = aclmsg.find('reply-to')
+        if reply_to is not None:
+            for receiver in reply_to:
+                self.reply_to.append(AID(name=receiver.text))
+
+        content = aclmsg.find('content')
+        if content is not None:
+            self.content = content.text
+
+        for tag, field in (('language', 'language'),
+                           ('encoding', 'encoding'),
+                           ('ontology', 'ontology'),
+                           ('protocol', 'protocol'),
+                           ('reply-with', 'reply_with'),
+                           ('in-reply-to', 'in_reply_to'),
+                           ('reply-by', 'reply_by')):
+            value = aclmsg.findtext(tag)
+            if value is not None:
+                setattr(self, field, value)
 
     def create_reply(self):
         """Creates a reply for the message
@@ -479,41 +424,67 @@ class ACLMessage(ET.Element):
 
         message = ACLMessage()
 
-        message.set_performative(self.performative)
-        message.set_system_message(is_system_message=self.system_message)
-
-        if self.language:
-            message.set_language(self.language)
-        if self.ontology:
-            message.set_ontology(self.ontology)
-        if self.protocol:
-            message.set_protocol(self.protocol)
-        if self.conversation_id:
-            message.set_conversation_id(self.conversation_id)
-
-        for i in self.reply_to:
-            message.add_receiver(i)
+        message.performative = self.performative
+        message.system_message = self.system_message
+        message.language = self.language
+        message.ontology = self.ontology
+        message.protocol = self.protocol
+        message.conversation_id = self.conversation_id
 
-        if not self.reply_to:
-            message.add_receiver(self.sender)
+        if self.reply_to:
+            message.receivers.extend(self.reply_to)
+        else:
+            message.receivers.append(self.sender)
 
         if self.reply_with:
-            message.set_in_reply_to(self.reply_with)
+            message.in_reply_to = self.reply_with
 
         return message
 
-    def __setstate__(self, state):
-        self.__init__()
-        self.__dict__.update(state)
+    def clone(self):
+        """Returns a copy of the message that can be changed
+        without affecting the original one. The receivers and
+        reply_to lists are copied, the other fields are shared
+        because they are not changed in place by the setters.
+        """
+        message = ACLMessage.__new__(ACLMessage)
+        for name in self.__slots__:
+            if name == '__weakref__':
+                continue
+            setattr(message, name, getattr(self, name))
+        message.receivers = list(self.receivers)
+        message.reply_to = list(self.reply_to)
+        # the identifiers are generated now, or the copies would
+        # generate different ones
+        message._conversation_id = self.conversation_id
+        message._message_id = self.messageID
+        return message
 
     def __getstate__(self):
-        # Copy the object's state from self.__dict__ which contains
-        # all our instance attributes. Always use the dict.copy()
-        # method to avoid modifying the original state.
-        state = self.__dict__.copy()
-        # Remove the unpicklable entries.
+        # The state is keyed by the public attribute names. The
+        # previous message class was an ElementTree element subclass
+        # and its pickles only kept the instance attributes, a dict
+        # with these same keys, so they are loaded by __setstate__.
+        state = dict()
+        for name in self.__slots__:
+            if name == '__weakref__':
+                continue
+            state[name] = getattr(self, name)
+        del state['_conversation_id'], state['_message_id']
+        state['conversation_id'] = self.conversation_id
+        state['messageID'] = self.messageID
         return state
 
+    def __setstate__(self, state):
+        self.__init__()
+        for name, value in state.items():
+            if name == 'conversation_id':
+                name = '_conversation_id'
+            elif name == 'messageID':
+                name = '_message_id'
+            if name in self.__slots__:
+                setattr(self, name, value)
+
 if __name__ == '__main__':
 
     msg = ACLMessage()
@@ -0,0 +1,208 @@
+"""Framework for Intelligent Agents Development - PADE
+
+The MIT License (MIT)
+
+Copyright (c) 2019 Lucas S Melo
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+"""
+    Batched contract net module
+    ---------------------------
+
+    This module implements a FIPA-ContractNet initiator for rounds
+    with many participants. The bids of a round are stored as they
+    arrive in a ProposalTable, one column of bid values and one of
+    senders, the winners are selected by a scoring function applied
+    to the whole column, and the accept and reject answers are sent
+    as one message each, with all of their receivers.
+
+    NumPy is used for the columns when it is installed, otherwise
+    the columns are Python lists.
+"""
+
+from pade.acl.messages import ACLMessage
+from pade.behaviours.protocols import FipaContractNetProtocol
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class ProposalTable(object):
+    """Columns with the bids of a contract net round.
+
+    Attributes
+    ----------
+    messages : list
+        PROPOSE messages, in the order of the values
+    refused : list
+        AIDs of the participants that refused
+    senders : list
+        AIDs of the proposers, in the order of the values
+    """
+
+    def __init__(self):
+        self.senders = list()
+        self.messages = list()
+        self.refused = list()
+        self._values = list()
+
+    def __len__(self):
+        return len(self.senders)
+
+    def add(self, message, value):
+        self.senders.append(message.sender)
+        self.messages.append(message)
+        self._values.append(value)
+
+    @property
+    def values(self):
+        """Bid values, a NumPy array when NumPy is installed."""
+        if numpy is not None:
+            return numpy.asarray(self._values, dtype=float)
+        return list(self._values)
+
+
+def highest_bid(values):
+    """Default scoring function, the highest bid wins."""
+    return values
+
+
+def lowest_bid(values):
+    """Scoring function for rounds where the lowest bid wins."""
+    if numpy is not None:
+        return -numpy.asarray(values)
+    return [-v for v in values]
+
+
+def best_indexes(scores, count):
+    """Returns the indexes of the count highest scores,
+    the best first.
+    """
+    if count <= 0 or len(scores) == 0:
+        return list()
+    if numpy is not None:
+        scores = numpy.asarray(scores, dtype=float)
+        if count < len(scores):
+            top = numpy.argpartition(-scores, count - 1)[:count]
+        else:
+            top = numpy.arange(len(scores))
+        return [int(i) for i in top[numpy.argsort(-scores[top], kind='stable')]]
+    order = sorted(range(len(scores)), key=lambda i: -scores[i])
+    return order[:count]
+
+
+class BatchedContractNetProtocol(FipaContractNetProtocol):
+    """FIPA-ContractNet initiator that evaluates the bids of a
+        round at once.
+
+        The bid of each PROPOSE is read by parse_bid and stored in
+        the ProposalTable of its round. When the round ends, by the
+        last answer or by its deadline, the scores of all the bids
+        are computed by the scoring function, the best winners bids
+        are accepted with one ACCEPT_PROPOSAL and the others are
+        rejected with one REJECT_PROPOSAL. handle_winners is then
+        called with the result.
+    """
+
+    def __init__(self, agent, message=None, scoring=highest_bid, winners=1):
+        """Inicializes the class
+
+            :param agent: instance of the agent that will execute the protocol's
+                         established behaviours.
+            :param message: CFP message sent when the behaviour starts.
+            :param scoring: function that receives the column of bid values
+                         and returns the column of scores, higher is better.
+            :param winners: number of proposals accepted in each round.
+        """
+        super(BatchedContractNetProtocol, self).__init__(agent, message, is_initiator=True)
+        self.scoring = scoring
+        self.winners = winners
+
+    def open_round(self, message):
+        conversation = super(BatchedContractNetProtocol, self).open_round(message)
+        conversation.table = ProposalTable()
+        return conversation
+
+    def parse_bid(self, message):
+        """Returns the bid value of a PROPOSE message, it
+            should be overridden when the content is not a number.
+
+            :param message: PROPOSE message
+        """
+        return float(message.content)
+
+    def handle_propose(self, message):
+        """This method overrides the handle_propose method from
+            FipaContractNetProtocol class, the bid is stored in
+            the table of the round.
+        """
+        self.received_qty += 1
+        try:
+            value = self.parse_bid(message)
+        except (TypeError, ValueError):
+            self.conversation.table.refused.append(message.sender)
+        else:
+            self.conversation.table.add(message, value)
+
+    def handle_refuse(self, message):
+        """This method overrides the handle_refuse method from
+            FipaContractNetProtocol class.
+        """
+        self.received_qty += 1
+        self.conversation.table.refused.append(message.sender)
+
+    def handle_all_proposes(self, proposes):
+        """This method overrides the handle_all_proposes method from
+            FipaContractNetProtocol class. It selects the winners of
+            the round and answers all the proposers.
+        """
+        super(BatchedContractNetProtocol, self).handle_all_proposes(proposes)
+        table = self.conversation.table
+        winners = best_indexes(self.scoring(table.values), self.winners)
+        chosen = set(winners)
+        losers = [i for i in range(len(table)) if i not in chosen]
+
+        if winners:
+            self._answer(ACLMessage.ACCEPT_PROPOSAL, [table.senders[i] for i in winners])
+        if losers:
+            self._answer(ACLMessage.REJECT_PROPOSAL, [table.senders[i] for i in losers])
+
+        self.handle_winners([table.messages[i] for i in winners], table)
+
+    def handle_winners(self, winners, table):
+        """This method should be overridden when implementing a protocol.
+            It is executed at the end of each round.
+
+            :param winners: accepted PROPOSE messages, the best first
+            :param table: ProposalTable of the round
+        """
+        pass
+
+    def _answer(self, performative, receivers):
+        answer = ACLMessage(performative)
+        answer.set_protocol(ACLMessage.FIPA_CONTRACT_NET_PROTOCOL)
+        answer.set_conversation_id(self.conversation.conversation_id)
+        answer.set_content('')
+        for receiver in receivers:
+            answer.add_receiver(receiver)
+        self.agent.send(answer)
@@ -0,0 +1,195 @@
+"""Framework for Intelligent Agents Development - PADE
+
+The MIT License (MIT)
+
+Copyright (c) 2019 Lucas S Melo
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+"""
+    Conversations module
+    --------------------
+
+    This module implements the state kept by a protocol for each
+    of its open conversations, keyed by conversation_id, so one
+    behaviour runs many rounds of a protocol at the same time.
+
+    Every conversation has a deadline. The deadlines are grouped in
+    the slots of an expiry wheel, one slot for each resolution
+    interval, and only one timer of the timer wheel of the process
+    is scheduled for each slot in use, however many conversations
+    expire in it.
+"""
+
+from pade.core.timers import timer_wheel
+
+import math
+
+
+class Conversation(object):
+    """State of an open conversation.
+
+    Attributes
+    ----------
+    conversation_id : str
+        conversation identifier
+    deadline : float
+        reactor time at which the conversation expires, None if it
+        does not expire
+    expected : int
+        number of answers expected
+    message : ACLMessage
+        message that opened the conversation
+    proposes : list
+        answers received
+    received : int
+        number of answers received
+    """
+
+    def __init__(self, conversation_id, message=None, expected=0, deadline=None):
+        self.conversation_id = conversation_id
+        self.message = message
+        self.expected = expected
+        self.received = 0
+        self.proposes = list()
+        self.deadline = deadline
+        self.slot = None
+
+    def complete(self):
+        """Returns True when every expected answer was received."""
+        return self.received >= self.expected
+
+
+class ConversationStore(object):
+    """Table of open conversations with an expiry wheel.
+
+    Attributes
+    ----------
+    conversations : dictionary
+        keys: conversation_id and values: Conversation
+    on_expire : method
+        called with the conversation when its deadline is reached,
+        the conversation is already closed
+    resolution : float
+        width in seconds of a slot of the expiry wheel
+    slots : dictionary
+        keys: slot number and values: dictionary with the
+        conversations that expire in the slot
+    """
+
+    def __init__(self, on_expire, resolution=0.1):
+        self.on_expire = on_expire
+        self.resolution = resolution
+        self.conversations = dict()
+        self.slots = dict()
+        self._calls = dict()
+
+    def __len__(self):
+        return len(self.conversations)
+
+    def __contains__(self, conversation_id):
+        return conversation_id in self.conversations
+
+    def get(self, conversation_id):
+        return self.conversations.get(conversation_id)
+
+    def open(self, conversation_id, message=None, expected=0, timeout=None):
+        """Opens a conversation, replacing an open conversation
+        with the same id.
+
+        Parameters
+        ----------
+        conversation_id : str
+            conversation identifier
+        message : ACLMessage, optional
+            message that opens the conversation
+        expected : int, optional
+            number of answers expected
+        timeout : float, optional
+            seconds until the conversation expires, never if None
+
+        Returns
+        -------
+        Conversation
+            the opened conversation
+        """
+        self.close(conversation_id)
+        deadline = None
+        if timeout is not None:
+            deadline = timer_wheel().seconds() + timeout
+        conversation = Conversation(conversation_id, message, expected, deadline)
+        self.conversations[conversation_id] = conversation
+        if deadline is not None:
+            self._schedule(conversation)
+        return conversation
+
+    def close(self, conversation_id):
+        """Closes a conversation and cancels its deadline.
+
+        Returns
+        -------
+        Conversation
+            the closed conversation, None if it was not open
+        """
+        conversation = self.conversations.pop(conversation_id, None)
+        if conversation is not None and conversation.slot is not None:
+            slot = self.slots.get(conversation.slot)
+            if slot is not None:
+                slot.pop(conversation_id, None)
+                if not slot:
+                    self._drop_slot(conversation.slot)
+            conversation.slot = None
+        return conversation
+
+    def clear(self):
+        """Closes every conversation without expiring them."""
+        for call in self._calls.values():
+            if call.active():
+                call.cancel()
+        self.conversations = dict()
+        self.slots = dict()
+        self._calls = dict()
+
+    def _schedule(self, conversation):
+        number = int(math.ceil(conversation.deadline / self.resolution))
+        conversation.slot = number
+        slot = self.slots.get(number)
+        if slot is None:
+            slot = self.slots[number] = dict()
+            self._calls[number] = timer_wheel().call_at(number * self.resolution,
+                                                        self._expire, number)
+        slot[conversation.conversation_id] = conversation
+
+    def _drop_slot(self, number):
+        del self.slots[number]
+        call = self._calls.pop(number, None)
+        if call is not None and call.active():
+            call.cancel()
+
+    def _expire(self, number):
+        self._calls.pop(number, None)
+        slot = self.slots.pop(number, None)
+        if not slot:
+            return
+        for conversation_id, conversation in list(slot.items()):
+            if self.conversations.get(conversation_id) is conversation:
+                del self.conversations[conversation_id]
+                conversation.slot = None
+                self.on_expire(conversation)
@@ -0,0 +1,152 @@
+"""Framework for Intelligent Agents Development - PADE
+
+The MIT License (MIT)
+
+Copyright (c) 2019 Lucas S Melo
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+"""
+    Behaviour dispatch module
+    -------------------------
+
+    This module implements the list of behaviours kept by every
+    agent. The list is still a list, in execution order, and it
+    also indexes the behaviours by the (protocol, performative,
+    conversation_id) keys they declare with dispatch_keys, so a
+    received message is only given to the behaviours that can
+    handle it. Behaviours without keys are catch-all behaviours
+    and receive every message. Behaviours with a message_filter
+    are indexed by the keys of the filter and also checked
+    against it.
+"""
+
+from itertools import product
+
+
+class BehaviourDispatcher(list):
+    """List of behaviours indexed by dispatch key.
+
+    Attributes
+    ----------
+    catch_all : list
+        behaviours that receive every message
+    index : dictionary
+        keys: (protocol, performative, conversation_id), None in a
+        position matches any value, and values: list of behaviours
+    """
+
+    def __init__(self, *args):
+        super(BehaviourDispatcher, self).__init__(*args)
+        self._reindex()
+
+    def dispatch(self, message):
+        """Returns the behaviours that should execute the
+        message, in the order they were added.
+
+        Parameters
+        ----------
+        message : ACLMessage
+            received message
+        """
+        return [behaviour for behaviour in self._candidates(message)
+                if getattr(behaviour, 'message_filter', None) is None or
+                behaviour.message_filter.filter(message)]
+
+    def _candidates(self, message):
+        if not self.index:
+            return list(self.catch_all)
+        fields = ((message.protocol, None),
+                  (message.performative, None),
+                  (message.conversation_id, None))
+        found = dict()
+        for key in product(*fields):
+            for behaviour in self.index.get(key, ()):
+                found[id(behaviour)] = behaviour
+        if not found:
+            return list(self.catch_all)
+        for behaviour in self.catch_all:
+            found[id(behaviour)] = behaviour
+        if len(found) == 1:
+            return list(found.values())
+        return sorted(found.values(), key=lambda b: self._order[id(b)])
+
+    def append(self, behaviour):
+        super(BehaviourDispatcher, self).append(behaviour)
+        self._add(behaviour, len(self) - 1)
+
+    def extend(self, behaviours):
+        for behaviour in behaviours:
+            self.append(behaviour)
+
+    def __iadd__(self, behaviours):
+        self.extend(behaviours)
+        return self
+
+    def insert(self, i, behaviour):
+        super(BehaviourDispatcher, self).insert(i, behaviour)
+        self._reindex()
+
+    def remove(self, behaviour):
+        super(BehaviourDispatcher, self).remove(behaviour)
+        self._reindex()
+
+    def pop(self, *args):
+        behaviour = super(BehaviourDispatcher, self).pop(*args)
+        self._reindex()
+        return behaviour
+
+    def clear(self):
+        super(BehaviourDispatcher, self).clear()
+        self._reindex()
+
+    def __setitem__(self, i, value):
+        super(BehaviourDispatcher, self).__setitem__(i, value)
+        self._reindex()
+
+    def __delitem__(self, i):
+        super(BehaviourDispatcher, self).__delitem__(i)
+        self._reindex()
+
+    def reindex(self):
+        """Rebuilds the index, to be called when the dispatch
+        keys of a behaviour in the list change.
+        """
+        self._reindex()
+
+    def _reindex(self):
+        self.index = dict()
+        self.catch_all = list()
+        self._order = dict()
+        for i, behaviour in enumerate(self):
+            self._add(behaviour, i)
+
+    def _add(self, behaviour, position):
+        self._order.setdefault(id(behaviour), position)
+        dispatch_keys = getattr(behaviour, 'dispatch_keys', None)
+        keys = dispatch_keys() if dispatch_keys is not None else None
+        if keys is None:
+            if behaviour not in self.catch_all:
+                self.catch_all.append(behaviour)
+            return
+        for key in keys:
+            behaviours = self.index.setdefault(tuple(key), list())
+            if behaviour not in behaviours:
+                behaviours.append(behaviour)
@@ -37,7 +37,9 @@ THE SOFTWARE.
 from twisted.internet import reactor
 from pade.acl.messages import ACLMessage
 from pade.acl.filters import Filter
-from pade.misc.utility import print_progress_bar
+from pade.behaviours.conversations import ConversationStore
+from pade.core.timers import timer_wheel
+from pade.misc.utility import display_message, print_progress_bar
 from time import time
 
 
@@ -56,6 +58,28 @@ class Behaviour(object):
         """
         self.agent = agent
         self.timeout = 5
+        self.message_filter = None
+
+    def set_message_filter(self, message_filter):
+        """Restricts the messages executed by the behaviour to the
+            ones selected by a filter, see pade.acl.filters. The
+            agent finds the behaviour by the keys of the filter.
+
+            :param message_filter: Filter, or a combination of filters
+        """
+        self.message_filter = message_filter
+        for behaviours in (self.agent.behaviours, self.agent.system_behaviours):
+            if self in behaviours:
+                behaviours.reindex()
+
+    def dispatch_keys(self):
+        """Returns the (protocol, performative, conversation_id) keys
+            of the messages this behaviour executes, None in a position
+            matches any value. None means every message is executed.
+        """
+        if self.message_filter is not None:
+            return self.message_filter.keys()
+        return None
 
     def execute(self, message):
         """Executes the actual behaviour of the protocol
@@ -83,6 +107,8 @@ class TimedBehaviour(Behaviour):
         """
         super(TimedBehaviour, self).__init__(agent)
         self.time = time
+        self.periodic_call = None
+        self._rearmed = False
 
     def on_start(self):
         """This method overrides the on_start method from Behaviour class
@@ -94,19 +120,31 @@ class TimedBehaviour(Behaviour):
     def timed_behaviour(self):
         """This method is always used when the implemented behaviour 
             needs timed restrictions.
-            In this case, it uses the twisted callLater method, which
-            receives a method and delay as parameters to be executed
+            In this case, it joins the periodic calls of the timer
+            wheel of the process, the behaviours with the same time
+            are woken up together and do not drift.
 
         """
         super(TimedBehaviour, self).timed_behaviour()
 
-        reactor.callLater(self.time, self.on_time)
+        if self.periodic_call is not None:
+            self.periodic_call.cancel()
+        self.periodic_call = timer_wheel().call_every(self.time, self._tick)
+
+    def _tick(self):
+        # the behaviour stays in the periodic calls while
+        # on_time keeps calling TimedBehaviour.on_time
+        self._rearmed = False
+        self.on_time()
+        if not self._rearmed and self.periodic_call is not None:
+            self.periodic_call.cancel()
+            self.periodic_call = None
 
     def on_time(self):
-        """This method executes the handle_all_proposes method if any 
-            FIPA_CFP message sent by the agent does not get an answer.
+        """This method is executed every self.time seconds, while
+            the overriding methods call it.
         """
-        reactor.callLater(self.time, self.on_time)
+        self._rearmed = True
 
 
 class FipaProtocol(Behaviour):
@@ -115,6 +153,9 @@ class FipaProtocol(Behaviour):
         protocols
     """
 
+    dispatch_protocol = None
+    dispatch_performatives = ()
+
     def __init__(self, agent, message, is_initiator):
         """Inicializes the class that implements a FipaProtocol
 
@@ -130,6 +171,7 @@ class FipaProtocol(Behaviour):
 
         self.is_initiator = is_initiator
         self.message = message
+        self.conversations = ConversationStore(self.on_conversation_timeout)
 
         self.filter_not_undestood = Filter()
         self.filter_not_undestood.set_performative(ACLMessage.NOT_UNDERSTOOD)
@@ -138,6 +180,27 @@ class FipaProtocol(Behaviour):
             self.filter_conversation_id = Filter()
             self.filter_conversation_id.set_conversation_id(self.message.conversation_id)
 
+    def dispatch_keys(self):
+        """This method overrides the dispatch_keys method from Behaviour class.
+            The protocol receives its performatives and every
+            FIPA_NOT_UNDERSTOOD message.
+        """
+        if self.dispatch_protocol is None:
+            return None
+        keys = [(self.dispatch_protocol, performative, None)
+                for performative in self.dispatch_performatives]
+        keys.append((None, ACLMessage.NOT_UNDERSTOOD, None))
+        return keys
+
+    def on_conversation_timeout(self, conversation):
+        """This method should be overridden when implementing a protocol.
+            This method is executed when an open conversation of the
+            protocol reaches its deadline.
+
+            :param conversation: expired Conversation
+        """
+        pass
+
     def handle_not_understood(self , message):
         """This method should be overridden when implementing a protocol.
             This method is always executed when the agent receives a 
@@ -167,6 +230,11 @@ class FipaRequestProtocol(FipaProtocol):
         inheriting from the Behaviour class and implementing its methods.
     """
 
+    dispatch_protocol = ACLMessage.FIPA_REQUEST_PROTOCOL
+    dispatch_performatives = (ACLMessage.REQUEST, ACLMessage.REFUSE,
+                              ACLMessage.AGREE, ACLMessage.FAILURE,
+                              ACLMessage.INFORM)
+
     def __init__(self, agent, message=None, is_initiator=True):
         """Inicializes the class that implements FipaRequestProtocol protocol
 
@@ -294,6 +362,12 @@ class FipaContractNetProtocol(FipaProtocol):
         inheriting from the Behaviour class and implementing its methods.
     """
 
+    dispatch_protocol = ACLMessage.FIPA_CONTRACT_NET_PROTOCOL
+    dispatch_performatives = (ACLMessage.CFP, ACLMessage.PROPOSE,
+                              ACLMessage.REFUSE, ACLMessage.ACCEPT_PROPOSAL,
+                              ACLMessage.REJECT_PROPOSAL, ACLMessage.FAILURE,
+                              ACLMessage.INFORM)
+
     def __init__(self, agent, message=None, is_initiator=True):
         """
         Inicializes the class that implements FipaContractNetProtocol protocol.
@@ -309,8 +383,12 @@ class FipaContractNetProtocol(FipaProtocol):
 
         self.received_qty = 0
 
+        self.cfp_qty = 0
+
         self.proposes = []
 
+        self.conversation = None
+
         self.filter_protocol = Filter()
         self.filter_protocol.set_protocol(ACLMessage.FIPA_CONTRACT_NET_PROTOCOL)
 
@@ -346,12 +424,33 @@ class FipaContractNetProtocol(FipaProtocol):
 
             if self.message.performative == ACLMessage.CFP:
 
-                self.cfp_qty = len(self.message.receivers)
-                self.received_qty = 0
-                self.proposes = []
+                self.open_round(self.message)
                 self.agent.send(self.message)
 
-                self.timed_behaviour()
+    def open_round(self, message):
+        """Opens the conversation of a CFP round. Each round keeps
+            its own answers, so many rounds can be open at the same
+            time. The round ends when every receiver answers or when
+            self.timeout seconds have passed.
+
+            :param message: FIPA_CFP message of the round
+        """
+        conversation = self.conversations.open(message.conversation_id,
+                                               message,
+                                               expected=len(message.receivers),
+                                               timeout=self.timeout)
+        self._activate(conversation)
+        self.timed_behaviour()
+        return conversation
+
+    def _activate(self, conversation):
+        """Exposes the state of a round in conversation, cfp_qty,
+            received_qty and proposes, the attributes used by the handlers.
+        """
+        self.conversation = conversation
+        self.cfp_qty = conversation.expected
+        self.received_qty = conversation.received
+        self.proposes = conversation.proposes
 
     def handle_cfp(self, message):
         """This method should be overridden when implementing a protocol.
@@ -370,7 +469,8 @@ class FipaContractNetProtocol(FipaProtocol):
             :param message: FIPA-ACL message
         """
         self.received_qty += 1
-        print_progress_bar(self.received_qty, self.cfp_qty, fill='#', length=50, prefix='CFP responses received')
+        if self.cfp_qty:
+            print_progress_bar(self.received_qty, self.cfp_qty, fill='#', length=50, prefix='CFP responses received')
         if self.received_qty == self.cfp_qty:
             pass
             # delayed_calls = reactor.getDelayedCalls()
@@ -385,7 +485,8 @@ class FipaContractNetProtocol(FipaProtocol):
             :param message: FIPA-ACL message
         """
         self.received_qty += 1
-        print_progress_bar(self.received_qty, self.cfp_qty, fill='#', length=50, prefix='CFP responses received')
+        if self.cfp_qty:
+            print_progress_bar(self.received_qty, self.cfp_qty, fill='#', length=50, prefix='CFP responses received')
         if self.received_qty == self.cfp_qty:
             pass
             # delayed_calls = reactor.getDelayedCalls()
@@ -448,15 +549,49 @@ class FipaContractNetProtocol(FipaProtocol):
         """
         super(FipaContractNetProtocol, self).timed_behaviour()
 
-        #reactor.callLater(self.timeout, self.execute_on_timeout)
+        # the deadline of each round is kept by self.conversations
 
-    def execute_on_timeout(self):
+    def on_conversation_timeout(self, conversation):
+        """This method overrides the on_conversation_timeout method
+            from FipaProtocol class. A round that reaches its deadline
+            ends with the answers received so far.
+        """
+        self.execute_on_timeout(conversation)
+
+    def execute_on_timeout(self, conversation=None):
         """This method executes the handle_all_proposes method if any 
             FIPA_CFP message sent by the agent does not get an answer.
-        """
 
+            :param conversation: expired round, the last active
+            round when None
+        """
+        if conversation is not None:
+            self._activate(conversation)
         self.handle_all_proposes(self.proposes)
 
+    def _answer_received(self, message, handler):
+        """Stores an answer of a round and ends the round when
+            every receiver has answered. Answers of rounds that are
+            not open, late answers of expired rounds or answers of
+            CFPs sent without open_round, are only passed to the
+            handler.
+        """
+        conversation = self.conversations.get(message.conversation_id)
+        if conversation is None:
+            if self.agent.debug:
+                display_message(self.agent.aid.localname,
+                                'Answer of a round that is not open: {}'.format(
+                                    message.conversation_id))
+            handler(message)
+            return
+        self._activate(conversation)
+        self.proposes.append(message)
+        handler(message)
+        conversation.received = self.received_qty
+        if conversation.complete():
+            self.conversations.close(conversation.conversation_id)
+            self.handle_all_proposes(conversation.proposes)
+
     def execute(self, message):
         """This method overrides the execute method from FipaProtocol class.
             The selection of the method to be executed after the receival
@@ -474,19 +609,11 @@ class FipaContractNetProtocol(FipaProtocol):
 
             elif self.filter_propose.filter(self.message):
                 if self.is_initiator:
-                    self.proposes.append(message)
-                    self.handle_propose(message)
-
-                    if self.received_qty == self.cfp_qty:
-                        self.handle_all_proposes(self.proposes)
+                    self._answer_received(message, self.handle_propose)
 
             elif self.filter_refuse.filter(self.message):
                 if self.is_initiator:
-                    self.proposes.append(message)
-                    self.handle_refuse(message)
-
-                    if self.received_qty == self.cfp_qty:
-                        self.handle_all_proposes(self.proposes)
+                    self._answer_received(message, self.handle_refuse)
 
             elif self.filter_accept_propose.filter(self.message):
                 if not self.is_initiator:
@@ -518,10 +645,7 @@ class FipaContractNetProtocol(FipaProtocol):
 
             if message.performative == ACLMessage.CFP:
 
-                self.cfp_qty = len(message.receivers)
-                self.received_qty = 0
-                self.proposes = []
-                self.timed_behaviour()
+                self.open_round(message)
                 self.agent.send(message)
 
 
@@ -530,6 +654,11 @@ class FipaSubscribeProtocol(FipaProtocol):
         inheriting from the Behaviour class and implementing its methods.
     """
 
+    dispatch_protocol = ACLMessage.FIPA_SUBSCRIBE_PROTOCOL
+    dispatch_performatives = (ACLMessage.SUBSCRIBE, ACLMessage.CANCEL,
+                              ACLMessage.INFORM, ACLMessage.AGREE,
+                              ACLMessage.FAILURE)
+
     def __init__(self, agent, message=None, is_initiator=True):
         """Initialize method
         """
@@ -32,6 +32,9 @@ import time
 import json
 import datetime
 import sys
+import os
+import shutil
+import tempfile
 
 
 class FlaskServerProcess(multiprocessing.Process):
@@ -116,6 +119,10 @@ def main(config):
 
     secure = config.get('secure')
 
+    workers = config.get('workers')
+    if workers is None:
+        workers = 1
+
     processes = list()
     # -------------------------------------------------------------
     # inicializa o servico web de gerenciamento de agentes do PADE
@@ -202,8 +209,14 @@ def main(config):
 
     # -------------------------------------------------------------
     # inicializa os agentes PADE
+    # with more than one worker, every agent file is launched
+    # once per worker and each process starts only its shard
+    # of the agents, see pade.core.runtime
     # -------------------------------------------------------------
     time.sleep(3.0)
+    socket_dir = None
+    if workers > 1 and sys.platform != 'win32':
+        socket_dir = tempfile.mkdtemp(prefix='pade-')
     port_ = port
     for agent_file in agent_files:
         for i in range(num):
@@ -212,8 +225,15 @@ def main(config):
                 commands = shlex.split(commands, posix=False)
             else:
                 commands = shlex.split(commands)
-            p = subprocess.Popen(commands, stdin=subprocess.PIPE)
-            processes.append(p)
+            for worker in range(workers):
+                env = None
+                if workers > 1:
+                    env = dict(os.environ)
+                    env['PADE_SHARD'] = '{}/{}'.format(worker, workers)
+                    if socket_dir is not None:
+                        env['PADE_SOCKET_DIR'] = socket_dir
+                p = subprocess.Popen(commands, stdin=subprocess.PIPE, env=env)
+                processes.append(p)
             time.sleep(0.5)
             port_ += 1 
 
@@ -224,6 +244,8 @@ def main(config):
             click.echo(click.style('\nStoping PADE...', fg='red'))
             for p in processes:
                 p.kill()
+            if socket_dir is not None:
+                shutil.rmtree(socket_dir, ignore_errors=True)
             break
 
 @click.group()
@@ -234,6 +256,7 @@ def cmd():
 @click.argument('agent_files', nargs=-1)
 @click.option('--num', default=1)
 @click.option('--port', default=2000)
+@click.option('--workers', default=1)
 @click.option('--secure', is_flag=True)
 @click.option('--pade_ams/--no_pade_ams', default=True)
 @click.option('--pade_web/--no_pade_web', default=True)
@@ -241,11 +264,12 @@ def cmd():
 @click.option('--username', prompt='please enter a username', default='pade_user')
 @click.option('--password', prompt=True, hide_input=True, default='12345')
 @click.option('--config_file', is_eager=True, expose_value=False, callback=run_config_file)
-def start_runtime(num, agent_files, port, secure, pade_ams, pade_web, pade_sniffer, username, password):
+def start_runtime(num, agent_files, port, workers, secure, pade_ams, pade_web, pade_sniffer, username, password):
     config = dict()
     config['agent_files'] = agent_files
     config['num'] = num
     config['port'] = port
+    config['workers'] = workers
     config['secure'] = secure
     config['session'] = dict()
     config['session']['username'] = username
@@ -281,6 +305,22 @@ def drop_pade_db():
     click.echo(click.style('[ok_] Tables droped in selected data base', fg='green'))
 
 
+@cmd.command()
+@click.option('--full', is_flag=True, help='Index every message again.')
+@click.option('--chunk_size', default=10000)
+def reindex_messages(full, chunk_size):
+    click.echo(click.style('[...] Indexing the messages for the full-text search.', fg='red'))
+    from pade.web.flask_server import db, Message
+    from pade.core.search import MessageSearchIndex
+    search = MessageSearchIndex(db.engine, Message.__table__, chunk_size=chunk_size)
+    if not search.supported():
+        click.echo(click.style('The selected data base does not support the full-text index', fg='red'))
+        return
+    indexed = search.reindex(full=full,
+                             progress=lambda last: click.echo('      messages checked up to id {}'.format(last)))
+    click.echo(click.style('[ok_] {} messages indexed'.format(indexed), fg='green'))
+
+
 @cmd.command()
 def start_web_interface():
     create_tables()
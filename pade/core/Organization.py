@@ -1,5 +1,6 @@
 from twisted.internet import threads
 from twisted.internet.endpoints import TCP4ServerEndpoint
+from pade.core.runtime import THREAD_POOL_SIZE, shard_agents, listen_unix
 
 class Organization:
     def __init__(self, reactor):
@@ -19,13 +20,14 @@ class Organization:
 
     def start_loop(self, agents):
         """Start reactor thread main loop"""
-        self.reactor.suggestThreadPoolSize(30)
-        for agent in agents:
+        self.reactor.suggestThreadPoolSize(THREAD_POOL_SIZE)
+        for agent in shard_agents(agents):
             agent.update_ams(agent.ams)
             agent.on_start()
             endpoint = TCP4ServerEndpoint(self.reactor, agent.aid.port)
             node = Node(endpoint, self.reactor, agent.agentInstance)
             node.listen()
+            listen_unix(agent)
             agent.ILP = node
             agent.node_number = self.node_number
             self.nodes.append(node)
@@ -36,9 +36,18 @@ library to implement distributed systems.
 from twisted.internet import protocol, reactor
 
 from pade.core.peer import PeerProtocol
+from pade.core.pool import ConnectionPool
+from pade.core.directory import AgentDirectory, SNAPSHOT
+from pade.core.local import LOCAL_AGENTS, register_local_agent, unregister_local_agent, deliver_local
+from pade.core.timers import timer_wheel
+from pade.core.pending import PendingRequests
+from pade.core.liveness import HEARTBEAT, HEARTBEAT_INTERVAL
+from pade.core.tap import MessageTap
 from pade.acl.messages import ACLMessage
+from pade.acl.codec import encode, DEFAULT_CODEC
 from pade.behaviours.protocols import Behaviour
-from pade.behaviours.protocols import FipaRequestProtocol, FipaSubscribeProtocol
+from pade.behaviours.dispatch import BehaviourDispatcher
+from pade.behaviours.protocols import FipaSubscribeProtocol, TimedBehaviour
 from pade.acl.aid import AID
 from pade.misc.utility import display_message
 
@@ -91,12 +100,24 @@ class AgentProtocol(PeerProtocol):
         reason : twisted exception
             Identifies the problem in the lost connection.
         """
-        if self.message is not None:
-            message = PeerProtocol.connectionLost(self, reason)
-            self.message = None
+        message = PeerProtocol.connectionLost(self, reason)
+        self.message = None
+        if message is not None:
             # executes the behaviour Agent.react to the received message.
             self.fact.react(message)
 
+    def message_received(self, message):
+        """This method is executed for every message received
+        on a pooled connection.
+
+        Parameters
+        ----------
+        message : ACLMessage
+            Message object in the FIPA-ACL standard
+        """
+        # executes the behaviour Agent.react to the received message.
+        self.fact.react(message)
+
     def send_message(self, message):
         """This method call the functionality send_message from
         the peer protocol 
@@ -141,17 +162,17 @@ class AgentFactory(protocol.ClientFactory):
         Number of active connections
     debug : Boolean
         If True activate the debug mode
-    messages : list
-        List of messages to be sent to another agents
     on_start : method
         method that executes the agent's behaviour defined both
         by the user and by the System-PADE when the agent is initialised
+    pool : ConnectionPool
+        pooled connections used to send messages to another agents
     react : method
         method that executes the agent's behaviour defined 
         both by the user and by the System-PADE.
-    table : dictionary
+    table : AgentDirectory
         table stores the active agents, a dictionary with keys: name and
-        values: AID
+        values: AID, indexed by the local name of the agents
     """
 
     def __init__(self, agent_ref):
@@ -168,11 +189,26 @@ class AgentFactory(protocol.ClientFactory):
         self.debug = agent_ref.debug
         self.aid = agent_ref.aid  # stores the agent's identity.
         self.ams = agent_ref.ams  # stores the  ams agent's identity.
-        self.messages = []
+        self.pool = ConnectionPool(self)
         self.react = agent_ref.react
         self.on_start = agent_ref.on_start
         self.ams_aid = AID('ams@' + self.ams['name'] + ':' + str(self.ams['port']))
-        self.table = dict([('ams', self.ams_aid)])
+        self.table = AgentDirectory([('ams', self.ams_aid)])
+
+    @property
+    def table(self):
+        """Table of active agents
+        """
+        return self.__table
+
+    @table.setter
+    def table(self, value):
+        """Table setter, plain dictionaries are indexed
+        """
+        if isinstance(value, AgentDirectory):
+            self.__table = value
+        else:
+            self.__table = AgentDirectory(value)
 
     def buildProtocol(self, addr):
         """This method initializes the Agent protocol
@@ -190,6 +226,19 @@ class AgentFactory(protocol.ClientFactory):
         protocol = AgentProtocol(self)
         return protocol
 
+    def startFactory(self):
+        """This method is called when the agent starts
+        listening, the agent becomes reachable by the other
+        agents of this process without the TCP connections.
+        """
+        register_local_agent(self)
+
+    def stopFactory(self):
+        """This method is called when the agent stops
+        listening, its messages go through the network again.
+        """
+        unregister_local_agent(self)
+
     def clientConnectionFailed(self, connector, reason):
         """This method is called upon a failure 
         in the connection between client and server.
@@ -237,18 +286,35 @@ class Agent_(object):
         Agent AID
     ams : dictionary
         A dictionary with AMS information {'name': ams_IP, 'port': ams_port}
-    behaviours : list
-        Agent's behaviours list
+    behaviours : BehaviourDispatcher
+        Agent's behaviours list, indexed by the messages they handle
+    codec : Codec
+        codec used to encode the messages sent by the agent
     debug : boollean
         if True activate the debug mode
+    ams_contact : float
+        time of the timer wheel at which the agent last sent a
+        message to the AMS, None if it never did
+    heartbeat_interval : float
+        longest time without sending a message to the AMS, a
+        heartbeat is sent when it runs out. None to send no
+        heartbeats, the AMS then never removes the agent on its own
     ILP : TYPE
         Description
+    local_copy : boolean
+        if True the agents of the same process receive a clone
+        of the message instead of the sent object
+    local_delivery : boolean
+        if True the messages to agents listening in the same process
+        are handed to them directly instead of using TCP
     mosaik_connection : mosaik conn class object
         an object that is instantiated if a mosaik session is implemented
+    pending_requests : PendingRequests
+        requests sent by Agent_.request waiting for a reply
     sniffer : dictionary
         Sniffer address
-    system_behaviours : list
-        List of PADE system's behaviours
+    system_behaviours : BehaviourDispatcher
+        List of PADE system's behaviours, indexed by the messages they handle
     """
 
     def __init__(self, aid, debug=False):
@@ -273,6 +339,12 @@ class Agent_(object):
         self.__messages = list()
         self.ILP = None
         self.node_number = None
+        self.codec = DEFAULT_CODEC
+        self.local_delivery = True
+        self.local_copy = True
+        self.heartbeat_interval = HEARTBEAT_INTERVAL
+        self.ams_contact = None
+        self.pending_requests = PendingRequests(self.aid.localname)
 
     @property
     def aid(self):
@@ -394,7 +466,10 @@ class Agent_(object):
                 raise ValueError(
                     'behaviour must be a subclass of the Behaviour class!')
         else:
-            self.__behaviours = value
+            if isinstance(value, BehaviourDispatcher):
+                self.__behaviours = value
+            else:
+                self.__behaviours = BehaviourDispatcher(value)
 
     @property
     def system_behaviours(self):
@@ -426,12 +501,20 @@ class Agent_(object):
                 raise ValueError(
                     'behaviour must be a subclass of the Behaviour class!')
         else:
-            self.__system_behaviours = value
+            if isinstance(value, BehaviourDispatcher):
+                self.__system_behaviours = value
+            else:
+                self.__system_behaviours = BehaviourDispatcher(value)
 
     def react(self, message):
         """This method should be overriden and will
         be executed all the times the agent receives
         any kind of message.
+
+        The message is only executed by the behaviours
+        indexed for its protocol, performative and conversation
+        and by the catch-all behaviours. Replies to the requests
+        sent by Agent_.request fire their Deferred instead.
                 
         Parameters
         ----------
@@ -439,11 +522,14 @@ class Agent_(object):
             receive message 
         """
 
+        if self.pending_requests.resolve(message):
+            return
+
         if message.system_message:
-            for system_behaviour in self.system_behaviours:
+            for system_behaviour in self.system_behaviours.dispatch(message):
                 system_behaviour.execute(message)
         else:
-            for behaviour in self.behaviours:
+            for behaviour in self.behaviours.dispatch(message):
                 behaviour.execute(message)
 
     def send(self, message):
@@ -451,9 +537,10 @@ class Agent_(object):
         an ACL message to the agents specified in the receivers
         parameter of the ACL message.
 
-        If the number of receivers is greater than 20, than a split
-        will be done. 
-        
+        The frames are queued on the pooled connections and
+        written by the send scheduler of the pool, so a message
+        with many receivers goes out as fast as the peers take it.
+
         Parameters
         ----------
         message : ACLMessage
@@ -463,18 +550,21 @@ class Agent_(object):
         message.set_message_id()
         message.set_datetime_now()
 
-        c = 0.0
-        if len(message.receivers) >= 20:
-            receivers = [message.receivers[i:i+20] for i in range(0, len(message.receivers), 20)]
-            for r in receivers:
-                reactor.callLater(c, self._send, message, r)
-                c += 0.5
-        else:
-            self._send(message, message.receivers)
+        self._send(message, message.receivers)
 
     def _send(self, message, receivers):
         """This method effectively sends the message to receivers
-        by connecting the receiver and sender sockets in a network
+        using the pooled connections of the agent.
+
+        The receivers are resolved first and the message is
+        encoded only once, the same bytes are queued for every
+        destination. Receivers registered at the same address
+        get a single frame. Receivers listening in the same
+        process get the message object in the next reactor turn
+        and the message is only encoded for the remote ones.
+        Receivers of the same host listen on different ports,
+        their frames share the encoded bytes but not the
+        connection, see pade.core.pool.
         
         Parameters
         ----------
@@ -483,31 +573,33 @@ class Agent_(object):
         receivers : list
             List of receivers agents
         """
+        pool = self.agentInstance.pool
+        ams_name = self.agentInstance.ams_aid.name
+        destinations = list()
+        addresses = set()
         # "for" iterates on the message receivers
         for receiver in receivers:
-            for name in self.agentInstance.table:
-                # "if" verifies if the receiver name is among the available agents
-                if receiver.localname in name and receiver.localname != self.aid.localname:
-                    # corrects the port and host parameters randomly generated when only a name
-                    # is given as a identifier of a receiver.
-                    receiver.setPort(self.agentInstance.table[name].port)
-                    receiver.setHost(self.agentInstance.table[name].host)
-                    # makes a connection to the agent and sends the message.
-                    self.agentInstance.messages.append((receiver, message))
-                    if self.debug:
-                        print(('[MESSAGE DELIVERY]',
-                               message.performative,
-                               'FROM',
-                               message.sender.name,
-                               'TO',
-                               receiver.name))
-                    try:
-                        reactor.connectTCP(self.agentInstance.table[
-                                           name].host, self.agentInstance.table[name].port, self.agentInstance)
-                    except:
-                        self.agentInstance.messages.pop()
-                        display_message(self.aid.name, 'Error delivery message!')
-                    break
+            # looks for the receiver among the available agents
+            registered = self.agentInstance.table.resolve(receiver)
+            if registered is not None and receiver.localname != self.aid.localname:
+                # corrects the port and host parameters randomly generated when only a name
+                # is given as a identifier of a receiver.
+                receiver.setPort(registered.port)
+                receiver.setHost(registered.host)
+                if self.debug:
+                    print(('[MESSAGE DELIVERY]',
+                           message.performative,
+                           'FROM',
+                           message.sender.name,
+                           'TO',
+                           receiver.name))
+                if registered.name == ams_name:
+                    # the AMS counts every message as a heartbeat
+                    self.ams_contact = timer_wheel().seconds()
+                address = (pool.resolve(registered.host), int(registered.port))
+                if address not in addresses:
+                    addresses.add(address)
+                    destinations.append(address)
             else:
                 if self.debug:
                     display_message(
@@ -515,6 +607,68 @@ class Agent_(object):
                 else:
                     pass
 
+        if self.local_delivery:
+            remote = list()
+            for address in destinations:
+                factory = LOCAL_AGENTS.get(address)
+                if factory is None:
+                    remote.append(address)
+                else:
+                    deliver_local(factory, message, self.local_copy)
+            destinations = remote
+
+        if not destinations:
+            return
+
+        # sends the same encoded message using the pooled connection to each agent.
+        try:
+            data = encode(message, self.codec)
+        except:
+            display_message(self.aid.name, 'Error delivery message!')
+            return
+        for host, port in destinations:
+            try:
+                pool.send(host, port, data)
+            except:
+                display_message(self.aid.name, 'Error delivery message!')
+
+    def request(self, message, timeout=None):
+        """Sends a request and returns a Deferred that fires
+        with the reply, matched by the in-reply-to of the reply
+        and the reply-with of the request, and sent by one of the
+        receivers of the request. Agree replies are
+        skipped, refuse, failure and not-understood replies fail
+        the Deferred with RequestError. In a coroutine started
+        with twisted.internet.defer.ensureDeferred the reply is
+        received with: reply = await agent.request(message)
+
+        The performative, protocol and reply-with of the message
+        are filled in when they are not set.
+
+        Parameters
+        ----------
+        message : ACLMessage
+            Message to be sent
+        timeout : float, optional
+            seconds to wait for the reply, the Deferred fails
+            with defer.TimeoutError when they run out
+
+        Returns
+        -------
+        Deferred
+            fired with the reply message
+        """
+        if message.performative is None:
+            message.set_performative(ACLMessage.REQUEST)
+        if message.protocol is None:
+            message.set_protocol(ACLMessage.FIPA_REQUEST_PROTOCOL)
+        if message.reply_with is None:
+            message.set_reply_with(self.pending_requests.new_key())
+        deferred = self.pending_requests.add(message.reply_with, timeout,
+                                             message.receivers)
+        self.send(message)
+        return deferred
+
     def call_later(self, time, method, *args):
         """Call a method after some time delay
         
@@ -652,42 +806,69 @@ class SubscribeBehaviour(FipaSubscribeProtocol):
         """
         if self.agent.debug:
             display_message(self.agent.aid.name, 'Table update')
-        self.agent.agentInstance.table = loads(message.content)
+        if not self.agent.agentInstance.table.apply(loads(message.content)):
+            self.request_snapshot()
 
+    def request_snapshot(self):
+        """Asks the AMS for the whole table of agents, after
+        an update of the table was missed.
+        """
+        message = ACLMessage(ACLMessage.SUBSCRIBE)
+        message.set_protocol(ACLMessage.FIPA_SUBSCRIBE_PROTOCOL)
+        message.add_receiver(self.agent.agentInstance.ams_aid)
+        message.set_content(SNAPSHOT)
+        message.set_system_message(is_system_message=True)
+        self.agent.send(message)
 
-class CompConnection(FipaRequestProtocol):
+
+class HeartbeatBehaviour(TimedBehaviour):
     """
-    This class implements the agent's behaviour
-    that answers the solicitations the AMS
-    makes to detect if the agent is connected or not. 
+    This class implements the behaviour of the agent
+    that tells the AMS it is still active. The heartbeats
+    go through the pooled connection to the AMS.
+
+    The AMS counts every message of the agent as a heartbeat,
+    so a heartbeat is only sent when the agent sent nothing
+    to the AMS during the interval: the timer waits for the
+    interval to run out since the last message. The first
+    heartbeat is always sent, the AMS only watches the agents
+    that sent one.
     """
-    def __init__(self, agent):
-        """Summary
-        
-        Parameters
-        ----------
-        agent : TYPE
-            Description
-        """
-        super(CompConnection, self).__init__(agent=agent,
-                                             message=None,
-                                             is_initiator=False)
-
-    def handle_request(self, message):
-        """Summary
-        
-        Parameters
-        ----------
-        message : TYPE
-            Description
-        """
-        super(CompConnection, self).handle_request(message)
-        if self.agent.debug:
-            display_message(self.agent.aid.localname, 'request message received')
-        reply = message.create_reply()
-        reply.set_performative(ACLMessage.INFORM)
-        reply.set_content('Im Live')
-        reactor.callLater(random.uniform(0.0, 1.0), self.agent.send, reply)
+    def __init__(self, agent, ams_aid, time):
+        super(HeartbeatBehaviour, self).__init__(agent, time)
+        self.message = ACLMessage(ACLMessage.INFORM)
+        self.message.set_protocol(ACLMessage.FIPA_SUBSCRIBE_PROTOCOL)
+        self.message.add_receiver(ams_aid)
+        self.message.set_content(HEARTBEAT)
+        self.message.set_system_message(is_system_message=True)
+        self.sent = 0
+
+    def timed_behaviour(self):
+        """Waits for the first heartbeat, a single timer
+        is moved to the next deadline instead of joining the
+        periodic calls of the timer wheel.
+        """
+        if self.periodic_call is not None:
+            self.periodic_call.cancel()
+        self.periodic_call = timer_wheel().call_later(self.time, self._tick)
+
+    def _tick(self):
+        self.periodic_call = None
+        contact = self.agent.ams_contact
+        if self.sent and contact is not None:
+            remaining = contact + self.time - timer_wheel().seconds()
+            if remaining > 0:
+                self.periodic_call = timer_wheel().call_later(remaining, self._tick)
+                return
+        self._rearmed = False
+        self.on_time()
+        if self._rearmed:
+            self.periodic_call = timer_wheel().call_later(self.time, self._tick)
+
+    def on_time(self):
+        super(HeartbeatBehaviour, self).on_time()
+        self.agent.send(self.message)
+        self.sent += 1
 
 
 # Main Agent Class
@@ -698,8 +879,6 @@ class Agent(Agent_):
     
     Attributes
     ----------
-    comport_connection : TYPE
-        Description
     comport_ident : TYPE
         Description
     """
@@ -715,9 +894,9 @@ class Agent(Agent_):
             Description
         """
         super(Agent, self).__init__(aid=aid, debug=debug)
-        
-        self.comport_connection = CompConnection(self)        
-        self.system_behaviours.append(self.comport_connection)
+
+        # received messages are traced to the Sniffer in batches
+        self.tap = MessageTap(self)
 
     def update_ams(self, ams):
         """Summary
@@ -736,6 +915,10 @@ class Agent(Agent_):
         message.set_system_message(is_system_message=True)
         self.comport_ident = SubscribeBehaviour(self, message)
         self.system_behaviours.append(self.comport_ident)
+        if self.heartbeat_interval is not None:
+            self.comport_heartbeat = HeartbeatBehaviour(self, ams_aid,
+                                                        self.heartbeat_interval)
+            self.system_behaviours.append(self.comport_heartbeat)
 
     def cancle_ams(self, ams):
         """Summary
@@ -752,7 +935,7 @@ class Agent(Agent_):
         message.add_receiver(ams_aid)
         message.set_content('DISC')
         message.set_system_message(is_system_message=True)
-        reactor.callLater(random.uniform(0.0, 1.0), self.agent.send, message)
+        timer_wheel().call_later(random.uniform(0.0, 1.0), self.agent.send, message)
 
 
     def react(self, message):
@@ -766,13 +949,5 @@ class Agent(Agent_):
         super(Agent, self).react(message)
 
         if 'ams' not in message.sender.name and 'sniffer' not in self.aid.name:
-            # sends the received message to Sniffer
-            # building of the message to be sent to Sniffer.
-            _message = ACLMessage(ACLMessage.INFORM)
-            sniffer_aid = AID('sniffer@' + self.sniffer['name'] + ':' + str(self.sniffer['port']))
-            _message.add_receiver(sniffer_aid)
-            _message.set_content(dumps({
-            'ref' : 'MESSAGE',
-            'message' : message}))
-            _message.set_system_message(is_system_message=True)
-            self.send(_message)
+            # traces the received message to the Sniffer
+            self.tap.record(message)
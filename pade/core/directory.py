@@ -0,0 +1,234 @@
+"""Framework for Intelligent Agents Development - PADE
+
+The MIT License (MIT)
+
+Copyright (c) 2019 Lucas S Melo
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+Agent Directory Module
+----------------------
+
+This Python module implements the table of active agents kept
+by every agent. The table is still a dictionary with keys: name
+and values: AID, and it also keeps an index by the local name of
+the agents, so the receivers of a message are resolved by exact
+match instead of scanning the whole table. Prefix and wildcard
+searches are explicit methods.
+
+The AMS keeps the tables up to date with versioned updates: a
+delta with the agents added and removed since a base version, or
+a snapshot with the whole table. A delta whose base is newer than
+the version of the table means updates were lost, and the table
+asks the AMS for a snapshot.
+"""
+
+from bisect import bisect_left, insort
+from fnmatch import fnmatchcase
+
+
+DELTA = 'DIRECTORY_DELTA'
+SNAPSHOT = 'DIRECTORY_SNAPSHOT'
+
+
+class AgentDirectory(dict):
+    """Table of active agents indexed by full name and by local name.
+
+    Attributes
+    ----------
+    localnames : dictionary
+        keys: local name and values: list of table keys, in
+        registration order
+    version : int
+        version of the AMS table the directory is equal to
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(AgentDirectory, self).__init__()
+        self.localnames = dict()
+        self._sorted_localnames = list()
+        self.version = 0
+        self.update(*args, **kwargs)
+
+    def __setitem__(self, name, aid):
+        if name in self:
+            self._unindex(name, dict.__getitem__(self, name))
+        super(AgentDirectory, self).__setitem__(name, aid)
+        self._index(name, aid)
+
+    def __delitem__(self, name):
+        aid = dict.__getitem__(self, name)
+        super(AgentDirectory, self).__delitem__(name)
+        self._unindex(name, aid)
+
+    def __reduce__(self):
+        # the table is sent to other agents as a plain dictionary
+        # and the indexes are rebuilt on arrival.
+        return (self.__class__, (dict(self),))
+
+    def pop(self, name, *default):
+        if name not in self:
+            return super(AgentDirectory, self).pop(name, *default)
+        aid = dict.__getitem__(self, name)
+        del self[name]
+        return aid
+
+    def popitem(self):
+        name, aid = super(AgentDirectory, self).popitem()
+        self._unindex(name, aid)
+        return name, aid
+
+    def setdefault(self, name, aid=None):
+        if name not in self:
+            self[name] = aid
+        return dict.__getitem__(self, name)
+
+    def update(self, *args, **kwargs):
+        for name, aid in dict(*args, **kwargs).items():
+            self[name] = aid
+
+    def clear(self):
+        super(AgentDirectory, self).clear()
+        self.localnames = dict()
+        self._sorted_localnames = list()
+
+    def copy(self):
+        return self.__class__(self)
+
+    def replace(self, table):
+        """Makes the directory equal to another table, changing
+        only the entries that differ.
+
+        Parameters
+        ----------
+        table : dictionary
+            keys: name and values: AID
+        """
+        for name in [name for name in self if name not in table]:
+            del self[name]
+        for name, aid in table.items():
+            if name not in self or dict.__getitem__(self, name) != aid:
+                self[name] = aid
+
+    def apply(self, update):
+        """Applies an update sent by the AMS.
+
+        Parameters
+        ----------
+        update : dictionary
+            a delta, {'ref': DELTA, 'base': int, 'version': int,
+            'added': dictionary, 'removed': list}, a snapshot,
+            {'ref': SNAPSHOT, 'version': int, 'table': dictionary},
+            or a whole table sent by an AMS without versions
+
+        Returns
+        -------
+        bool
+            False if the delta starts after the version of the
+            directory and a snapshot is needed
+        """
+        ref = update.get('ref') if isinstance(update, dict) else None
+        if ref == SNAPSHOT:
+            self.replace(update['table'])
+            self.version = update['version']
+        elif ref == DELTA:
+            if update['base'] > self.version:
+                return False
+            if update['version'] <= self.version:
+                # already in the directory
+                return True
+            for name in update['removed']:
+                self.pop(name, None)
+            self.update(update['added'])
+            self.version = update['version']
+        else:
+            self.replace(update)
+        return True
+
+    def resolve(self, aid):
+        """Returns the registered AID of an agent, searching its
+        full name first and then its local name.
+
+        Parameters
+        ----------
+        aid : AID
+            Identifier of the agent, the host and port may be unknown
+
+        Returns
+        -------
+        AID
+            registered AID or None if the agent is not active
+        """
+        registered = self.get(aid.name)
+        if registered is not None:
+            return registered
+        names = self.localnames.get(aid.localname)
+        if names:
+            return dict.__getitem__(self, names[0])
+        return None
+
+    def lookup(self, localname):
+        """Returns every registered AID with the local name.
+        """
+        return [dict.__getitem__(self, name) for name in self.localnames.get(localname, ())]
+
+    def with_prefix(self, prefix):
+        """Returns the registered AIDs whose local name
+        starts with the prefix.
+        """
+        aids = list()
+        i = bisect_left(self._sorted_localnames, prefix)
+        while i < len(self._sorted_localnames) and \
+                self._sorted_localnames[i].startswith(prefix):
+            aids.extend(self.lookup(self._sorted_localnames[i]))
+            i += 1
+        return aids
+
+    def match(self, pattern):
+        """Returns the registered AIDs whose full name matches
+        a shell-style wildcard pattern, for instance 'machine_*@*'.
+        """
+        return [aid for name, aid in self.items()
+                if fnmatchcase(getattr(aid, 'name', None) or name, pattern)]
+
+    def _localname(self, name, aid):
+        localname = getattr(aid, 'localname', None)
+        if localname is None:
+            localname = name.split('@')[0]
+        return localname
+
+    def _index(self, name, aid):
+        localname = self._localname(name, aid)
+        names = self.localnames.get(localname)
+        if names is None:
+            self.localnames[localname] = [name]
+            insort(self._sorted_localnames, localname)
+        else:
+            names.append(name)
+
+    def _unindex(self, name, aid):
+        localname = self._localname(name, aid)
+        names = self.localnames.get(localname)
+        if names is None:
+            return
+        names.remove(name)
+        if not names:
+            del self.localnames[localname]
+            i = bisect_left(self._sorted_localnames, localname)
+            del self._sorted_localnames[i]
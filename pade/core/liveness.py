@@ -0,0 +1,232 @@
+"""Framework for Intelligent Agents Development - PADE
+
+The MIT License (MIT)
+
+Copyright (c) 2019 Lucas S Melo
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+Liveness Module
+---------------
+
+This Python module implements the failure detection of the agents
+registered in the AMS. The agents send heartbeats to the AMS over
+their pooled connection, and any other message received by the AMS
+also counts as a heartbeat, so the AMS never has to ask the agents
+whether they are alive.
+
+The detector is a phi accrual failure detector: the intervals
+between heartbeats of each agent are assumed to follow a normal
+distribution, and phi is -log10 of the probability of a heartbeat
+arriving later than now. An agent fails when its phi reaches the
+threshold. Since phi only grows between heartbeats, the time at
+which it reaches the threshold is known in advance, and a single
+timer of the timer wheel waits for it. Heartbeats only update the
+intervals, the timer is moved when it runs early.
+"""
+
+from pade.core.timers import timer_wheel
+
+from collections import deque
+import math
+
+
+HEARTBEAT = 'HEARTBEAT'
+HEARTBEAT_INTERVAL = 5.0
+PHI_THRESHOLD = 8.0
+
+
+def _tail(y):
+    """Probability of a standard normal variable above y."""
+    return 0.5 * math.erfc(y / math.sqrt(2.0))
+
+
+def phi_deviations(threshold):
+    """Returns the number of standard deviations above the mean
+    interval at which phi reaches the threshold.
+    """
+    low, high = 0.0, 40.0
+    target = 10.0 ** -threshold
+    for _ in range(100):
+        middle = (low + high) / 2.0
+        if _tail(middle) > target:
+            low = middle
+        else:
+            high = middle
+    return high
+
+
+class ArrivalWindow(object):
+    """Last intervals between the heartbeats of an agent.
+
+    Attributes
+    ----------
+    intervals : deque
+        last intervals, in seconds
+    last : float
+        reactor time of the last heartbeat
+    """
+
+    def __init__(self, now, first_interval, size=100):
+        self.last = now
+        self.intervals = deque(maxlen=size)
+        self._sum = 0.0
+        self._squares = 0.0
+        # the window starts with two intervals around the expected
+        # one, a mean of first_interval and a standard deviation of
+        # a quarter of it, until the real intervals are learnt.
+        self._append(first_interval * 0.75)
+        self._append(first_interval * 1.25)
+
+    def add(self, now):
+        interval = now - self.last
+        self.last = now
+        self._append(interval)
+
+    def _append(self, interval):
+        if len(self.intervals) == self.intervals.maxlen:
+            old = self.intervals[0]
+            self._sum -= old
+            self._squares -= old ** 2
+        self.intervals.append(interval)
+        self._sum += interval
+        self._squares += interval ** 2
+
+    def mean(self):
+        return self._sum / len(self.intervals)
+
+    def std_deviation(self):
+        mean = self.mean()
+        variance = max(self._squares / len(self.intervals) - mean ** 2, 0.0)
+        return math.sqrt(variance)
+
+
+class LivenessMonitor(object):
+    """Phi accrual failure detector of the agents of the AMS.
+
+    Attributes
+    ----------
+    acceptable_pause : float
+        seconds of missing heartbeats added to the mean interval
+        before phi starts to grow, for garbage collection or
+        network pauses
+    first_interval : float
+        heartbeat interval assumed before the first heartbeat
+    min_std_deviation : float
+        lower bound of the standard deviation of the intervals,
+        very regular heartbeats would otherwise fail an agent
+        after a minimal delay
+    on_failure : method
+        called with the name of an agent whose phi reached the
+        threshold, the agent is no longer watched
+    threshold : float
+        phi at which an agent fails
+    windows : dictionary
+        keys: agent name and values: ArrivalWindow
+    """
+
+    def __init__(self, on_failure, threshold=PHI_THRESHOLD,
+                 first_interval=HEARTBEAT_INTERVAL, min_std_deviation=0.5,
+                 acceptable_pause=3.0, window_size=100):
+        self.on_failure = on_failure
+        self.threshold = threshold
+        self.first_interval = first_interval
+        self.min_std_deviation = min_std_deviation
+        self.acceptable_pause = acceptable_pause
+        self.window_size = window_size
+        self.windows = dict()
+        self._timers = dict()
+        self._deviations = phi_deviations(threshold)
+
+    def __len__(self):
+        return len(self.windows)
+
+    def __contains__(self, name):
+        return name in self.windows
+
+    def watch(self, name):
+        """Starts watching an agent, as if a heartbeat was
+        just received from it.
+        """
+        self.forget(name)
+        self.windows[name] = ArrivalWindow(timer_wheel().seconds(),
+                                           self.first_interval,
+                                           self.window_size)
+        self._schedule(name)
+
+    def forget(self, name):
+        """Stops watching an agent."""
+        self.windows.pop(name, None)
+        timer = self._timers.pop(name, None)
+        if timer is not None:
+            timer.cancel()
+
+    def heard(self, name):
+        """Registers a heartbeat, or another message, of an agent.
+
+        Returns
+        -------
+        bool
+            True if the agent is watched
+        """
+        window = self.windows.get(name)
+        if window is None:
+            return False
+        window.add(timer_wheel().seconds())
+        return True
+
+    def phi(self, name):
+        """Returns the current phi of an agent, None if it is
+        not watched.
+        """
+        window = self.windows.get(name)
+        if window is None:
+            return None
+        elapsed = timer_wheel().seconds() - window.last - self.acceptable_pause
+        y = (elapsed - window.mean()) / self._std_deviation(window)
+        tail = _tail(y)
+        if tail <= 0.0:
+            return float('inf')
+        return -math.log10(tail)
+
+    def deadline(self, name):
+        """Returns the reactor time at which an agent fails if no
+        heartbeat is received before.
+        """
+        window = self.windows[name]
+        return (window.last + self.acceptable_pause + window.mean() +
+                self._deviations * self._std_deviation(window))
+
+    def _std_deviation(self, window):
+        return max(window.std_deviation(), self.min_std_deviation)
+
+    def _schedule(self, name):
+        self._timers[name] = timer_wheel().call_at(self.deadline(name),
+                                                   self._check, name)
+
+    def _check(self, name):
+        self._timers.pop(name, None)
+        if name not in self.windows:
+            return
+        if timer_wheel().seconds() < self.deadline(name):
+            # heartbeats arrived since the timer was scheduled
+            self._schedule(name)
+            return
+        del self.windows[name]
+        self.on_failure(name)
@@ -0,0 +1,89 @@
+"""Framework for Intelligent Agents Development - PADE
+
+The MIT License (MIT)
+
+Copyright (c) 2019 Lucas S Melo
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+Local Transport Module
+----------------------
+
+This Python module keeps the agents that listen in the current
+process, keyed by the address they listen on. A message sent to
+one of them is handed to its react method in the next reactor
+turn, without being encoded or written to a loopback socket. The
+pooled TCP connections are only used for agents in other processes.
+"""
+
+from twisted.internet import reactor
+
+from copy import deepcopy
+
+
+LOCAL_AGENTS = dict()
+# contents that are not changed in place, shared with the receiver
+IMMUTABLE_CONTENTS = (str, bytes, int, float, bool, type(None))
+
+
+def register_local_agent(factory):
+    """Makes the agent of a factory reachable by the
+    other agents of this process.
+
+    :param factory: AgentFactory of an agent listening in this process
+    """
+    LOCAL_AGENTS[local_address(factory)] = factory
+
+
+def unregister_local_agent(factory):
+    """Removes the agent of a factory from the local agents,
+    its messages go through the pooled connections again.
+
+    :param factory: AgentFactory registered by register_local_agent
+    """
+    key = local_address(factory)
+    if LOCAL_AGENTS.get(key) is factory:
+        del LOCAL_AGENTS[key]
+
+
+def local_address(factory):
+    """Returns the key of a factory in the local agents, the
+    same (host, port) key used by its pool for the outboxes.
+
+    :param factory: AgentFactory
+    """
+    return (factory.pool.resolve(factory.aid.host), int(factory.aid.port))
+
+
+def deliver_local(factory, message, copy=True):
+    """Hands a message to the agent of a factory in the
+    next reactor turn, as if it had arrived from the network.
+
+    :param factory: AgentFactory of the receiver
+    :param message: ACLMessage to be delivered
+    :param copy: if True the receiver gets a clone of the message,
+        with a deep copy of a mutable content, an XML element or a
+        dictionary for instance, so changes made by the sender
+        afterwards are not seen by it
+    """
+    if copy:
+        message = message.clone()
+        if not isinstance(message.content, IMMUTABLE_CONTENTS):
+            message.content = deepcopy(message.content)
+    reactor.callLater(0, factory.react, message)
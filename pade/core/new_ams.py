@@ -25,8 +25,12 @@ THE SOFTWARE.
 from pade.core.agent import Agent_
 from pade.acl.messages import ACLMessage
 from pade.acl.aid import AID
-from pade.behaviours.protocols import TimedBehaviour, FipaRequestProtocol, FipaSubscribeProtocol
+from pade.behaviours.protocols import FipaRequestProtocol, FipaSubscribeProtocol
 from pade.misc.utility import display_message
+from pade.core.timers import timer_wheel
+from pade.core.registry import AgentRegistry
+from pade.core.directory import SNAPSHOT
+from pade.core.liveness import LivenessMonitor, HEARTBEAT, PHI_THRESHOLD
 
 from pade.web import flask_server
 from pade.web.flask_server import db, Session, User, basedir
@@ -34,96 +38,15 @@ from pade.web.flask_server import db, Session, User, basedir
 from pickle import dumps, loads
 from datetime import datetime
 import uuid
-from terminaltables import AsciiTable
 
 from alchimia import wrap_engine
 from sqlalchemy import create_engine, Table, MetaData
 
-from twisted.internet.defer import inlineCallbacks
 from twisted.internet import reactor
 
-import random
 import os
 import sys
 
-# Behaviour that sends the connection verification messages.
-
-class ComportSendConnMessages(TimedBehaviour):
-    def __init__(self, agent, message, time):
-        super(ComportSendConnMessages, self).__init__(agent, time)
-        self.message = message
-
-    def on_time(self):
-        super(ComportSendConnMessages, self).on_time()
-        self.agent.add_all(self.message)
-        self.agent.send(self.message)
-        if self.agent.debug:
-            display_message(self.agent.aid.name, 'Checking connection...')
-
-# Behaviour that verifies the answer time of the agents
-# and decides whether to disconnect them or not.
-
-class ComportVerifyConnTimed(TimedBehaviour):
-    def __init__(self, agent, time):
-        super(ComportVerifyConnTimed, self).__init__(agent, time)
-
-    def on_time(self):
-        super(ComportVerifyConnTimed, self).on_time()
-        desconnect_agents = list()
-        table = list([['agent', 'delta']])
-        for agent_name, date in self.agent.agents_conn_time.items():
-            now = datetime.now()
-            delta = now - date
-            table.append([agent_name, str(delta.total_seconds())])
-            if delta.total_seconds() > 10.0:
-                desconnect_agents.append(agent_name)
-                self.agent.agentInstance.table.pop(agent_name)
-                display_message(self.agent.aid.name, 'Agent {} disconnected.'.format(agent_name))
-
-        # print(TWISTED_ENGINE.execute("SELECT * FROM AGENTS"))
-        # # conn.commit()
-        # result = TWISTED_ENGINE.fetchall()
-        # for row in result:
-        #     print(row)
-        #     print("\n")
-
-        for agent_name in desconnect_agents:
-            self.agent.agents_conn_time.pop(agent_name)
-            sql_act = "DELETE FROM AGENTS WHERE name = ?"
-            # print(agent_name)
-            # print(AGENTS.get_children())
-            # insert_obj = AGENTS.delete()
-            # col = AGENTS.columns.name
-            # sql_act = insert_obj.where(whereclause=agent_name)
-            # yield TWISTED_ENGINE.execute(sql_act)
-            reactor.callLater(0.1, self.deregister_agent_in_db, sql_act, agent_name)
-
-        if self.agent.debug:
-            display_message(self.agent.aid.name, 'Calculating response time of the agents...')
-            table = AsciiTable(table)
-            print(table.table)
-
-    @inlineCallbacks
-    def deregister_agent_in_db(self, sql_act, agent_name):
-        print("deregister" + agent_name)
-        yield TWISTED_ENGINE.execute(sql_act, agent_name)
-
-
-class CompConnectionVerify(FipaRequestProtocol):
-    """FIPA Request Behaviour of the Clock agent.
-    """
-    def __init__(self, agent, message):
-        super(CompConnectionVerify, self).__init__(agent=agent,
-                                           message=message,
-                                           is_initiator=True)
-        
-
-    def handle_inform(self, message):
-        # if self.agent.debug:
-        #     display_message(self.agent.aid.localname, message.content)
-        date = datetime.now()
-        self.agent.agents_conn_time[message.sender.name] = date
-
 
 class PublisherBehaviour(FipaSubscribeProtocol):
     """
@@ -137,7 +60,12 @@ class PublisherBehaviour(FipaSubscribeProtocol):
         - The second one is the updating procedure, which updates the
           distributed tables that contain the adresses of the agents 
           in the pleteform. It is updated every time that an agent 
-          enters or leaves the network."""
+          enters or leaves the network.
+
+    The updates are versioned: the agents already subscribed receive
+    only the agents added and removed since the previous update, and
+    the agents that joined since then receive the whole table. An
+    agent that misses an update asks for the whole table again."""
 
     STATE = 0
 
@@ -145,12 +73,16 @@ class PublisherBehaviour(FipaSubscribeProtocol):
         super(PublisherBehaviour, self).__init__(agent,
                                                  message=None,
                                                  is_initiator=False)
+        self.joined = set()
 
     def handle_subscribe(self, message):
 
         sender = message.sender
 
-        if sender in self.agent.agentInstance.table.values():
+        if message.content == SNAPSHOT and self.agent.registry.is_registered(sender):
+            # a subscriber missed an update and asks for the table.
+            self.send_update(self.agent.registry.snapshot(), [sender])
+        elif self.agent.registry.is_registered(sender):
             display_message(self.agent.aid.name,
                             'Failure when Identifying agent ' + sender.name)
 
@@ -161,23 +93,13 @@ class PublisherBehaviour(FipaSubscribeProtocol):
             # sends the message
             self.agent.send(reply)
         else:
-            # registers the agent in the database.
-
-            insert_obj = AGENTS.insert()
-            print(sender.name)
-            sql_act = insert_obj.values(name=sender.name,
-                                        session_id=self.agent.session.id,
-                                        date=datetime.now(),
-                                        state='Active')
-
-            reactor.callLater(random.uniform(0.1, 0.5), self.register_agent_in_db, sql_act)
-
-            # registers the agent in the table of agents
-            self.agent.agentInstance.table[sender.name] = sender
+            # registers the agent in the table of agents, the
+            # registry writes it in the database with the other
+            # agents identified at the same time.
+            self.agent.registry.register(sender)
             # registers the agent as a subscriber in the protocol.
             self.register(message.sender)
-            # registers the agent in the table of time.
-            self.agent.agents_conn_time[message.sender.name] = datetime.now()
+            self.joined.add(message.sender)
 
             display_message(
                 self.agent.aid.name, 'Agent ' + sender.name + ' successfully identified.')
@@ -191,13 +113,15 @@ class PublisherBehaviour(FipaSubscribeProtocol):
 
             # prepares and sends the update message to
             # all registered agents.
-            if self.STATE == 0:
-                reactor.callLater(1.0, self.notify)
-                self.STATE = 1
+            self.schedule_notify()
 
-    @inlineCallbacks
-    def register_agent_in_db(self, sql_act):
-        yield TWISTED_ENGINE.execute(sql_act)
+    def schedule_notify(self):
+        """Sends the update of the table to the subscribers in one
+        second, with the other changes made until then.
+        """
+        if self.STATE == 0:
+            timer_wheel().call_later(1.0, self.notify)
+            self.STATE = 1
 
     def handle_cancel(self, message):
         self.deregister(self, message.sender)
@@ -205,12 +129,27 @@ class PublisherBehaviour(FipaSubscribeProtocol):
         print("AGENT CANCELLED")
 
     def notify(self):
+        self.STATE = 0
+        registry = self.agent.registry
+        joined = self.joined & self.subscribers
+        self.joined = set()
+        delta = registry.delta()
+        if delta is not None:
+            self.send_update(delta, self.subscribers - joined)
+        if joined:
+            self.send_update(registry.snapshot(), joined)
+
+    def send_update(self, update, receivers):
+        """Sends a delta or a snapshot of the table of agents."""
+        if not receivers:
+            return
         message = ACLMessage(ACLMessage.INFORM)
         message.set_protocol(ACLMessage.FIPA_SUBSCRIBE_PROTOCOL)
-        message.set_content(dumps(self.agent.agentInstance.table))
+        message.set_content(dumps(update))
         message.set_system_message(is_system_message=True)
-        self.STATE = 0
-        super(PublisherBehaviour, self).notify(message)
+        for receiver in receivers:
+            message.add_receiver(receiver)
+        self.agent.send(message)
 
 
 class CompVerifyRegister(FipaRequestProtocol):
@@ -276,7 +215,8 @@ class AMS(Agent_):
     user_login = dict()
     ams_debug = False
 
-    def __init__(self, host='localhost', port=8000, main_ams=True, debug=False):
+    def __init__(self, host='localhost', port=8000, main_ams=True, debug=False,
+                 phi_threshold=PHI_THRESHOLD):
 
         self.session_name = str(uuid.uuid1())[:13]
         self.ams = {'name': host, 'port': port}
@@ -289,31 +229,40 @@ class AMS(Agent_):
         self.port = port
         self.main_ams = main_ams
 
-        self.agents_conn_time = dict()
+        self.registry = AgentRegistry(self)
+        # the agents are not asked whether they are active, their
+        # heartbeats and other messages are watched instead.
+        self.liveness = LivenessMonitor(self.agent_failed, threshold=phi_threshold)
         self.comport_ident = PublisherBehaviour(self)
-
-        # message to check the connection.
-        message = ACLMessage(ACLMessage.REQUEST)
-        message.set_protocol(ACLMessage.FIPA_REQUEST_PROTOCOL)
-        self.add_all(message)
-        message.set_content('CONNECTION')
-        message.set_system_message(is_system_message=True)
-
-        self.comport_conn_verify = CompConnectionVerify(self, message)
-        self.comport_send_conn_messages = ComportSendConnMessages(self, message, 10.0)
-        self.comport_conn_verify_timed = ComportVerifyConnTimed(self, 20.0)
         self.comport_conn_verify_reg = CompVerifyRegister(self)
 
         self.system_behaviours.append(self.comport_ident)
-        self.system_behaviours.append(self.comport_conn_verify)
-        self.system_behaviours.append(self.comport_send_conn_messages)
-        self.system_behaviours.append(self.comport_conn_verify_timed)
         self.system_behaviours.append(self.comport_conn_verify_reg)
         self.on_start()
 
     def react(self, message):
+        sender = message.sender
+        if sender is not None and not self.liveness.heard(sender.name):
+            # only the agents that send heartbeats are watched, the
+            # ones with heartbeat_interval None and agents of older
+            # versions stay registered until they cancel.
+            if message.content == HEARTBEAT and self.registry.is_registered(sender):
+                self.liveness.watch(sender.name)
         super(AMS, self).react(message)
 
+    def agent_failed(self, name):
+        """Removes an agent whose heartbeats stopped and
+        announces it to the other agents. An agent that
+        identifies itself again is watched from a new window.
+        """
+        self.liveness.forget(name)
+        aid = self.registry.unregister(name)
+        if aid is None:
+            return
+        self.comport_ident.subscribers.discard(aid)
+        display_message(self.aid.name, 'Agent {} disconnected.'.format(name))
+        self.comport_ident.schedule_notify()
+
     def register_user(self, username, email, password):
         self.users.append(
             {'username': username, 'email': email, 'password': password})
@@ -357,6 +306,8 @@ class AMS(Agent_):
         else:
             self._verify_user_in_session(self.session)
 
+        self.registry.session_id = self.session.id
+
 if __name__ == '__main__':
 
     display_message('AMS', 'creating tables in database...')
@@ -372,6 +323,7 @@ if __name__ == '__main__':
     AGENTS = Table('agents', METADATA, autoload=True, autoload_with=ENGINE)
     
     ams = AMS(port=int(sys.argv[4]))
+    ams.registry.bind(TWISTED_ENGINE, AGENTS)
     # instantiates AMS agent and calls listenTCP method
     # from Twisted to launch the agent
     ams_agent = AMS() # TODO: precisa implementar a passagem de parametros
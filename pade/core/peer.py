@@ -26,7 +26,87 @@ THE SOFTWARE.
 #from twisted.protocols.basic import LineReceiver
 from twisted.internet.protocol import Protocol
 from pade.acl.messages import ACLMessage
+from pade.acl.codec import decode
 import pickle
+import struct
+
+# Sent by the client side of a pooled connection before the
+# first frame. It tells ACL connections apart from Mosaik ones.
+PREAMBLE = b'PADE'
+
+# Every ACL and Mosaik frame starts with the length of its payload.
+FRAME_HEADER = struct.Struct('!I')
+
+# Frames larger than this are refused and the connection is closed.
+MAX_FRAME_LENGTH = 64 * 1024 * 1024
+
+ACL_MODE = 'acl'
+MOSAIK_MODE = 'mosaik'
+LEGACY_MODE = 'legacy'
+
+
+class FrameError(Exception):
+    """Raised when a peer sends a frame that cannot be accepted."""
+    pass
+
+
+class FrameDecoder(object):
+    """Splits a stream of bytes into length-prefixed frames.
+
+    The received bytes are appended to a single bytearray and the
+    frames are sliced out of it through a memoryview, so a payload
+    is copied once no matter how many chunks it arrives in.
+    """
+
+    def __init__(self, max_length=MAX_FRAME_LENGTH):
+        self.buffer = bytearray()
+        self.max_length = max_length
+
+    def feed(self, data):
+        """Adds data to the buffer and returns the list
+        of payloads of every frame completed by it."""
+        self.buffer += data
+        frames = list()
+        offset = 0
+        size = len(self.buffer)
+        view = memoryview(self.buffer)
+        try:
+            while size - offset >= FRAME_HEADER.size:
+                length, = FRAME_HEADER.unpack_from(view, offset)
+                if length > self.max_length:
+                    raise FrameError('frame of {} bytes exceeds the limit of {} bytes'.format(
+                        length, self.max_length))
+                end = offset + FRAME_HEADER.size + length
+                if end > size:
+                    break
+                frames.append(view[offset + FRAME_HEADER.size:end].tobytes())
+                offset = end
+        finally:
+            view.release()
+        if offset:
+            del self.buffer[:offset]
+        return frames
+
+
+def detect_mode(data):
+    """Identifies the kind of connection from its first bytes.
+
+    Returns None while there are not enough bytes to decide.
+    """
+    if data[:len(PREAMBLE)] == PREAMBLE:
+        return ACL_MODE
+    if PREAMBLE.startswith(data):
+        return None
+    # pickled messages sent by peers without pooled connections
+    if data[:1] == b'\x80':
+        return LEGACY_MODE
+    if len(data) <= FRAME_HEADER.size:
+        return None
+    # Mosaik frames carry a JSON list after the length header
+    if data[FRAME_HEADER.size:FRAME_HEADER.size + 1] == b'[':
+        return MOSAIK_MODE
+    return LEGACY_MODE
+
 
 class PeerProtocol(Protocol):
     """docstring for PeerProtocol"""
@@ -34,26 +114,26 @@ class PeerProtocol(Protocol):
     message = None
     mosaik_msg_id = None
     await_gen = None
+    pooled_connection = None
+    mode = None
+    decoder = None
 
     def __init__(self, fact):
         self.fact = fact
 
     def connectionMade(self):
-        peer = self.transport.getPeer()
-        sended_message = None
-
-        for message in self.fact.messages:
-            if int(message[0].port) == int(peer.port):
-                if str(message[0].host) == 'localhost' and str(peer.host) == '127.0.0.1' or \
-                   str(message[0].host) == str(peer.host):
-                    self.send_message(pickle.dumps(message[1]))
-                    sended_message = message
-                    break
-        if sended_message is not None:
-            self.fact.messages.remove(sended_message)
+        if self.pooled_connection is not None:
+            self.transport.write(PREAMBLE)
+            self.mode = ACL_MODE
+            self.decoder = FrameDecoder()
+            self.pooled_connection.connection_made(self)
 
     def connectionLost(self, reason):
-        if self.message is not None:
+        if self.pooled_connection is not None:
+            self.pooled_connection.connection_lost(self, reason)
+        if self.mode not in (None, LEGACY_MODE):
+            return
+        if self.message:
             try:
                 message = pickle.loads(self.message)
             except:
@@ -62,70 +142,132 @@ class PeerProtocol(Protocol):
                 return
             return message
 
+    def message_received(self, message):
+        """Called for every ACL message received on
+        a framed connection."""
+        pass
+
     def dataReceived(self, data):
-        # receives part of the sent message.
-        if self.message is not None:
-            self.message += data
-        else:
-            self.message = data
         # ------------------------------------
-        # make a verification if the message
-        # is a MOSAIK message
+        # the first bytes tell whether this is
+        # a pooled ACL connection, a MOSAIK
+        # connection or a legacy connection
         # ------------------------------------
-        header = int.from_bytes(self.message[:4], byteorder='big')
-        if header == len(self.message[4:]):
-            # get mosaik connection for assync
-            if self.fact.agent_ref.mosaik_connection is None:
-                self.fact.agent_ref.mosaik_connection = self
+        if self.mode is None:
+            if self.message is not None:
+                data = self.message + data
+            mode = detect_mode(data)
+            if mode is None:
+                self.message = data
+                return
+            self.message = None
+            self.mode = mode
+            if mode == ACL_MODE:
+                data = data[len(PREAMBLE):]
+                self.decoder = FrameDecoder()
+            elif mode == MOSAIK_MODE:
+                self.decoder = FrameDecoder()
+            else:
+                self.message = bytearray()
 
-            # recebe o gerador retornado pelo método _process_message()
-            gen = self.fact.agent_ref.mosaik_sim._process_message(self.message,
-                                                                  self.mosaik_msg_id)
+        if self.mode == ACL_MODE:
+            self.acl_data_received(data)
+        elif self.mode == MOSAIK_MODE:
+            self.mosaik_data_received(data)
+        else:
+            # legacy peers close the connection after the message
+            self.message += data
 
-            # o gerador retornado por _process_message é ativado
+    def acl_data_received(self, data):
+        try:
+            frames = self.decoder.feed(data)
+        except FrameError as e:
+            print('[WARNING]: {}. CLOSING CONNECTION.'.format(e))
+            self.transport.loseConnection()
+            return
+        for frame in frames:
             try:
-                message = next(gen)
-            except StopIteration as e:
-                message = e.value
-
-            # se o valor retornado pelo gerador for uma mensagem
-            # no padrão Mosaik, isso é, não é nem um inteiro, nem
-            # um valor None, então a mensagem é transmitida para 
-            # o Mosaik
-            if message is not None and not isinstance(message, int):
-                self.transport.write(message)
-                self.message = None
-            else:
-                # Caso a variável self.mosaik_msg_id não tenha o valor
-                # None, significa que ela está armazenando o ID da 
-                # mensagem step que originou a requisição assíncrona
-                # e que o método step() está aguardando a finalização
-                # da mensagem assíncrona. Entrar neste if significa
-                # que a resposta da requisição assíncrona foi recebida
-                if self.mosaik_msg_id:
-                    try:
-                        message = next(self.await_gen)    
-                    except StopIteration as e:
-                        message = e.value
-                    if message is not None:
-                        self.transport.write(message)
-                        self.message = None
-                        self.mosaik_msg_id = None
-                        self.await_gen = None
-                else:
-                    # Caso o valor retornado por _process_message()
-                    # seja um inteiro, representando o ID da mensagem
-                    # Mosaik que está pausada aguardando o resultado
-                    # da requisição assíncrona, esse valor é armazenado
-                    # na variável self.mosaik_msg_id, e o gerador que retornou
-                    # este valor é armazenado na variável self.await_gen
-                    self.mosaik_msg_id = message
-                    self.await_gen = gen
-                    self.message = None
+                message = decode(frame)
+            except:
+                print('Message not understood')
+                continue
+            self.message_received(message)
 
+    def mosaik_data_received(self, data):
+        try:
+            frames = self.decoder.feed(data)
+        except FrameError as e:
+            print('[WARNING]: {}. CLOSING CONNECTION.'.format(e))
+            self.transport.loseConnection()
+            return
+        for frame in frames:
+            # the Mosaik driver expects the length header in the frame
+            self.mosaik_frame_received(FRAME_HEADER.pack(len(frame)) + frame)
+
+    def mosaik_frame_received(self, frame):
+        # get mosaik connection for assync
+        if self.fact.agent_ref.mosaik_connection is None:
+            self.fact.agent_ref.mosaik_connection = self
+
+        # recebe o gerador retornado pelo método _process_message()
+        gen = self.fact.agent_ref.mosaik_sim._process_message(frame,
+                                                              self.mosaik_msg_id)
+
+        # o gerador retornado por _process_message é ativado
+        try:
+            message = next(gen)
+        except StopIteration as e:
+            message = e.value
+
+        # se o valor retornado pelo gerador for uma mensagem
+        # no padrão Mosaik, isso é, não é nem um inteiro, nem
+        # um valor None, então a mensagem é transmitida para 
+        # o Mosaik
+        if message is not None and not isinstance(message, int):
+            self.transport.write(message)
+        else:
+            # Caso a variável self.mosaik_msg_id não tenha o valor
+            # None, significa que ela está armazenando o ID da 
+            # mensagem step que originou a requisição assíncrona
+            # e que o método step() está aguardando a finalização
+            # da mensagem assíncrona. Entrar neste if significa
+            # que a resposta da requisição assíncrona foi recebida
+            if self.mosaik_msg_id:
+                try:
+                    message = next(self.await_gen)    
+                except StopIteration as e:
+                    message = e.value
+                if message is not None:
+                    self.transport.write(message)
+                    self.mosaik_msg_id = None
+                    self.await_gen = None
+            else:
+                # Caso o valor retornado por _process_message()
+                # seja um inteiro, representando o ID da mensagem
+                # Mosaik que está pausada aguardando o resultado
+                # da requisição assíncrona, esse valor é armazenado
+                # na variável self.mosaik_msg_id, e o gerador que retornou
+                # este valor é armazenado na variável self.await_gen
+                self.mosaik_msg_id = message
+                self.await_gen = gen
+    
     def got_mosaik_message(self, message):
         self.transport.write(message)
 
+    def send_frame(self, data):
+        """Writes a length-prefixed frame without
+        closing the connection."""
+        self.transport.writeSequence([FRAME_HEADER.pack(len(data)), data])
+
+    def send_frames(self, frames):
+        """Writes several length-prefixed frames in a
+        single write of the transport."""
+        parts = list()
+        for data in frames:
+            parts.append(FRAME_HEADER.pack(len(data)))
+            parts.append(data)
+        self.transport.writeSequence(parts)
+
     def send_message(self, message):
         l = len(message)
         if l > 1024:
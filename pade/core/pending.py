@@ -0,0 +1,151 @@
+"""Framework for Intelligent Agents Development - PADE
+
+The MIT License (MIT)
+
+Copyright (c) 2019 Lucas S Melo
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+Pending Requests Module
+-----------------------
+
+This Python module keeps the requests sent with Agent_.request
+that are waiting for a reply. Each request is keyed by the
+reply-with of its message, and a received message whose
+in-reply-to is one of these keys, sent by one of the receivers
+of the request, fires the Deferred returned to the caller, so any number of requests can be outstanding
+without a behaviour for each one.
+"""
+
+from twisted.internet import defer
+
+from pade.acl.messages import ACLMessage
+from pade.core.timers import timer_wheel
+
+from uuid import uuid4
+
+
+class RequestError(Exception):
+    """Raised in the Deferred of a request answered with
+    refuse, failure or not-understood.
+
+    Attributes
+    ----------
+    message : ACLMessage
+        the received answer
+    """
+
+    def __init__(self, message):
+        super(RequestError, self).__init__(
+            '{} from {}'.format(message.performative,
+                                getattr(message.sender, 'name', message.sender)))
+        self.message = message
+
+
+class PendingRequests(object):
+    """Table of the requests waiting for a reply.
+
+    Attributes
+    ----------
+    requests : dictionary
+        keys: reply-with of the request and values: Deferred
+    receivers : dictionary
+        keys: reply-with of the request and values: set with the
+        names of the agents expected to answer
+    """
+
+    # answers that end the request with an error, an agree
+    # only tells the request was accepted and keeps it pending.
+    errors = frozenset((ACLMessage.REFUSE, ACLMessage.FAILURE,
+                        ACLMessage.NOT_UNDERSTOOD))
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.requests = dict()
+        self.receivers = dict()
+        self._timers = dict()
+
+    def __len__(self):
+        return len(self.requests)
+
+    def new_key(self):
+        """Returns a reply-with not used by another request, of
+        this agent or of another agent with the same localname."""
+        return '{}-{}'.format(self.prefix, uuid4().hex)
+
+    def add(self, key, timeout=None, receivers=None):
+        """Registers a request and returns its Deferred.
+
+        Parameters
+        ----------
+        key : str
+            reply-with of the request message
+        timeout : float, optional
+            seconds to wait for the reply, the Deferred fails with
+            defer.TimeoutError when they run out
+        receivers : list, optional
+            AIDs or names of the agents the request was sent to,
+            replies of other agents are not matched. Replies of
+            any agent are matched when None
+        """
+        deferred = defer.Deferred(lambda d: self._discard(key))
+        self.requests[key] = deferred
+        if receivers:
+            self.receivers[key] = set(getattr(r, 'name', r) for r in receivers)
+        if timeout is not None:
+            self._timers[key] = timer_wheel().call_later(timeout, self._timeout, key)
+        return deferred
+
+    def resolve(self, message):
+        """Fires the request answered by the message.
+
+        Returns
+        -------
+        bool
+            True if the message answers a pending request
+        """
+        key = message.in_reply_to
+        if key is None or key not in self.requests:
+            return False
+        expected = self.receivers.get(key)
+        if expected is not None and \
+                getattr(message.sender, 'name', message.sender) not in expected:
+            return False
+        if message.performative == ACLMessage.AGREE:
+            return True
+        deferred = self._discard(key)
+        if message.performative in self.errors:
+            deferred.errback(RequestError(message))
+        else:
+            deferred.callback(message)
+        return True
+
+    def _discard(self, key):
+        self.receivers.pop(key, None)
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        return self.requests.pop(key, None)
+
+    def _timeout(self, key):
+        self._timers.pop(key, None)
+        self.receivers.pop(key, None)
+        deferred = self.requests.pop(key, None)
+        if deferred is not None:
+            deferred.errback(defer.TimeoutError(key))
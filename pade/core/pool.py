@@ -0,0 +1,417 @@
+"""Framework for Intelligent Agents Development - PADE
+
+The MIT License (MIT)
+
+Copyright (c) 2019 Lucas S Melo
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+Connection Pool Module
+----------------------
+
+This Python module keeps one long-lived TCP connection for each
+peer address an agent talks to. Every ACL message sent to that
+peer is written as a length-prefixed frame on the same connection,
+so a message no longer costs a connection setup and a socket left
+in TIME_WAIT. Broken connections are re-established on demand and
+connections that stay idle for too long are closed.
+
+The connections are kept per address and not per host. Every agent
+listens on its own port, most of the time in its own process, so
+agents of the same host cannot share a socket: what they share is
+the encoded message, the same bytes are queued for each of them,
+and the frames queued for an address are written together. Agents
+of the same process are reached without a connection, see
+pade.core.local, and the workers of a sharded runtime on the same
+machine through Unix sockets, see pade.core.runtime.
+"""
+
+from twisted.internet import protocol, reactor
+from twisted.internet.interfaces import IPushProducer
+from zope.interface import implementer
+
+from pade.core.scheduler import SendScheduler
+from pade.core.runtime import unix_socket_path
+from pade.misc.utility import display_message
+
+from collections import deque
+import ipaddress
+
+
+LOOPBACK = '127.0.0.1'
+LOOPBACK_NAMES = frozenset(('', 'localhost', 'localhost.localdomain', 'ip6-localhost'))
+
+
+@implementer(IPushProducer)
+class PooledConnection(object):
+    """This class stores the state of the connection
+    kept by the pool for a single peer address.
+
+    The connection is registered as a producer of its transport,
+    Twisted pauses it while the transport write buffer is full.
+
+    Attributes
+    ----------
+    host : str
+        Peer host
+    paused : bool
+        True while the transport does not accept more data
+    port : int
+        Peer port
+    pool : ConnectionPool
+        Pool that owns this connection
+    protocol : AgentProtocol
+        Connected protocol instance, None while not connected
+    queue : deque
+        Frames waiting to be written, in sending order
+    retries : int
+        Number of consecutive failed connection attempts
+    """
+
+    def __init__(self, pool, host, port):
+        """Init the PooledConnection class
+
+        Parameters
+        ----------
+        pool : ConnectionPool
+            Pool that owns this connection
+        host : str
+            Peer host
+        port : int
+            Peer port
+        """
+        self.pool = pool
+        self.host = host
+        self.port = port
+        self.protocol = None
+        self.connector = None
+        self.queue = deque()
+        self.paused = False
+        self.retries = 0
+        self.last_used = reactor.seconds()
+        self.idle_call = None
+        self.retry_call = None
+
+    def connect(self):
+        """Starts a new connection attempt to the peer,
+        unless one is already in progress. Peers of a sharded
+        runtime on the same machine are reached by their Unix
+        socket.
+        """
+        if self.protocol is not None or self.connector is not None:
+            return
+        factory = PoolClientFactory(self)
+        path = unix_socket_path(self.host, self.port)
+        if path is not None:
+            self.connector = reactor.connectUNIX(path, factory)
+        else:
+            self.connector = reactor.connectTCP(self.host, self.port, factory)
+
+    def send(self, data):
+        """Queues the data to be written by the send scheduler.
+
+        Parameters
+        ----------
+        data : bytes
+            Serialized ACL message
+        """
+        self.last_used = reactor.seconds()
+        self.queue.append(data)
+        self.pool.scheduler.schedule(self)
+
+    def write_frames(self, limit):
+        """Writes up to limit queued frames in a single write
+        of the transport, nothing if the transport is paused.
+
+        Returns
+        -------
+        int
+            number of frames written
+        """
+        if self.paused:
+            return 0
+        frames = list()
+        while self.queue and len(frames) < limit:
+            frames.append(self.queue.popleft())
+        if frames:
+            self.protocol.send_frames(frames)
+        self.last_used = reactor.seconds()
+        return len(frames)
+
+    def pauseProducing(self):
+        self.paused = True
+
+    def resumeProducing(self):
+        self.paused = False
+        if self.queue:
+            self.pool.scheduler.schedule(self)
+
+    def stopProducing(self):
+        self.paused = False
+
+    def connection_made(self, protocol):
+        """Called by the protocol when the connection is
+        established. The queued frames are written by the
+        scheduler, in order.
+
+        Parameters
+        ----------
+        protocol : AgentProtocol
+            Connected protocol instance
+        """
+        self.protocol = protocol
+        self.connector = None
+        self.retries = 0
+        self.paused = False
+        protocol.transport.registerProducer(self, True)
+        self.pool.scheduler.connection_finished(self)
+        if self.queue:
+            self.pool.scheduler.schedule(self)
+        self._schedule_idle_check(self.pool.idle_timeout)
+
+    def connection_lost(self, protocol, reason):
+        """Called by the protocol when an established
+        connection is lost.
+
+        Parameters
+        ----------
+        protocol : AgentProtocol
+            Protocol instance that lost its connection
+        reason : twisted failure
+            Identifies the problem in the lost connection.
+        """
+        if protocol is not self.protocol:
+            return
+        self.protocol = None
+        self.connector = None
+        self.paused = False
+        self._cancel_idle_check()
+        if self.queue:
+            self._retry(reason)
+        else:
+            self.pool.discard(self)
+
+    def connection_failed(self, reason):
+        """Called when a connection attempt fails.
+
+        Parameters
+        ----------
+        reason : twisted failure
+            Identifies the problem in the connection.
+        """
+        self.connector = None
+        self.pool.scheduler.connection_finished(self)
+        self._retry(reason)
+
+    def close(self):
+        """Closes the connection and drops the queued frames.
+        """
+        self._cancel_idle_check()
+        if self.retry_call is not None and self.retry_call.active():
+            self.retry_call.cancel()
+        self.retry_call = None
+        self.queue.clear()
+        if self.protocol is not None:
+            self.protocol.transport.loseConnection()
+        elif self.connector is not None:
+            self.connector.disconnect()
+
+    def _retry(self, reason):
+        """Schedules a new connection attempt with
+        exponential backoff, or gives up after the
+        configured number of retries.
+        """
+        self.retries += 1
+        if self.retries > self.pool.max_retries:
+            if self.pool.factory.debug:
+                display_message(self.pool.factory.aid.name,
+                                'Error delivery message to {}:{}: {}'.format(
+                                    self.host, self.port, reason.getErrorMessage()))
+            self.queue.clear()
+            self.pool.discard(self)
+            return
+        delay = self.pool.retry_delay * 2 ** (self.retries - 1)
+        self.retry_call = reactor.callLater(delay, self._reconnect)
+
+    def _reconnect(self):
+        self.retry_call = None
+        if self.queue:
+            self.pool.scheduler.schedule(self)
+
+    def _schedule_idle_check(self, delay):
+        self.idle_call = reactor.callLater(delay, self._check_idle)
+
+    def _cancel_idle_check(self):
+        if self.idle_call is not None and self.idle_call.active():
+            self.idle_call.cancel()
+        self.idle_call = None
+
+    def _check_idle(self):
+        """Closes the connection if no frame was written
+        during the idle timeout, otherwise checks again
+        when the remaining time runs out.
+        """
+        self.idle_call = None
+        idle = reactor.seconds() - self.last_used
+        if idle >= self.pool.idle_timeout and not self.queue:
+            self.pool.discard(self)
+            if self.protocol is not None:
+                self.protocol.transport.loseConnection()
+        else:
+            self._schedule_idle_check(max(self.pool.idle_timeout - idle, 1.0))
+
+
+class PoolClientFactory(protocol.ClientFactory):
+    """Client factory used by a pooled connection. It
+    builds the agent protocol and reports connection
+    failures back to the pooled connection.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def buildProtocol(self, addr):
+        protocol = self.connection.pool.factory.buildProtocol(addr)
+        protocol.pooled_connection = self.connection
+        return protocol
+
+    def clientConnectionFailed(self, connector, reason):
+        self.connection.connection_failed(reason)
+
+
+class ConnectionPool(object):
+    """This class keeps the pooled connections of an
+    agent, one per peer address.
+
+    Attributes
+    ----------
+    addresses : dictionary
+        Cache of resolved hosts, keys: host as given and values: host
+        used as key of the connections
+    connections : dictionary
+        Pooled connections, keys: (host, port) and values: PooledConnection.
+        Every connection is the outbox of its address, its frames are
+        written in the order they were sent
+    factory : AgentFactory
+        Factory of the agent that owns the pool
+    idle_timeout : float
+        Seconds without traffic after which a connection is closed
+    max_retries : int
+        Connection attempts made before queued frames are dropped
+    retry_delay : float
+        Delay before the first reconnection attempt, doubled on each retry
+    scheduler : SendScheduler
+        Scheduler that writes the queued frames of the connections
+    """
+
+    def __init__(self, factory, idle_timeout=60.0, max_retries=5, retry_delay=0.5,
+                 max_connecting=32, batch_size=64):
+        """Init the ConnectionPool class
+
+        Parameters
+        ----------
+        factory : AgentFactory
+            Factory of the agent that owns the pool
+        idle_timeout : float, optional
+            Seconds without traffic after which a connection is closed
+        max_retries : int, optional
+            Connection attempts made before queued frames are dropped
+        retry_delay : float, optional
+            Delay before the first reconnection attempt
+        max_connecting : int, optional
+            Maximum number of connection attempts at the same time
+        batch_size : int, optional
+            Frames written to a peer before moving to the next one
+        """
+        self.factory = factory
+        self.idle_timeout = idle_timeout
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.connections = dict()
+        self.addresses = dict()
+        self.scheduler = SendScheduler(max_connecting, batch_size)
+
+    def send(self, host, port, data):
+        """Sends the data to the peer using its pooled
+        connection, creating the connection if needed.
+
+        Parameters
+        ----------
+        host : str
+            Peer host
+        port : int
+            Peer port
+        data : bytes
+            Serialized ACL message
+        """
+        key = (self.resolve(host), int(port))
+        connection = self.connections.get(key)
+        if connection is None:
+            connection = PooledConnection(self, key[0], key[1])
+            self.connections[key] = connection
+        connection.send(data)
+
+    def resolve(self, host):
+        """Returns the host used to key the connections, so
+        the names of the same address share one outbox, for
+        instance localhost and 127.0.0.1. Names are not looked
+        up in the DNS to keep the reactor thread free.
+
+        Parameters
+        ----------
+        host : str
+            Peer host
+        """
+        resolved = self.addresses.get(host)
+        if resolved is None:
+            name = str(host).strip().lower()
+            try:
+                address = ipaddress.ip_address(name)
+            except ValueError:
+                resolved = LOOPBACK if name in LOOPBACK_NAMES else name
+            else:
+                resolved = LOOPBACK if address.is_loopback else str(address)
+            self.addresses[host] = resolved
+        return resolved
+
+    def discard(self, connection):
+        """Removes a connection from the pool.
+
+        Parameters
+        ----------
+        connection : PooledConnection
+            Connection to be removed
+        """
+        key = (connection.host, connection.port)
+        if self.connections.get(key) is connection:
+            del self.connections[key]
+        self.scheduler.discard(connection)
+
+    def close(self):
+        """Closes every pooled connection.
+        """
+        for connection in list(self.connections.values()):
+            connection.close()
+        self.connections = dict()
+
+    def stats(self):
+        """Returns the queue depths, connection attempts and
+        drain rate of the pool.
+        """
+        return self.scheduler.stats()
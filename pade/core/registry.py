@@ -0,0 +1,221 @@
+"""Framework for Intelligent Agents Development - PADE
+
+The MIT License (MIT)
+
+Copyright (c) 2019 Lucas S Melo
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+AMS Registry Module
+-------------------
+
+This Python module implements the registry of the agents
+identified by the AMS. The agents are kept in the table of the
+AMS, an AgentDirectory, so checking whether an agent is already
+registered is a lookup by name.
+
+The database is written behind the table: registrations and
+removals are queued and written by a single flush, in one
+transaction, a short time after the first change. Agents that
+join or leave at the same time share the same transaction.
+
+Every change also increases the version of the registry and is
+kept until the next update sent to the subscribers, which only
+carries the agents changed since the previous one.
+"""
+
+from twisted.internet.defer import inlineCallbacks, succeed
+from twisted.python import log
+
+from pade.core.directory import DELTA, SNAPSHOT
+from pade.core.timers import timer_wheel
+
+from datetime import datetime
+
+
+class AgentRegistry(object):
+    """Agents registered in the AMS, with write-behind
+    persistence in the agents table of the database.
+
+    Attributes
+    ----------
+    added : dictionary
+        keys: name and values: row waiting to be inserted
+    changes : dictionary
+        keys: name and values: AID, or None for a removed agent,
+        of the agents changed since the last delta
+    removed : set
+        names waiting to be deleted
+    delay : float
+        seconds between the first queued change and the flush
+    engine : TwistedEngine
+        alchimia engine of the database, None keeps the registry
+        only in memory
+    table : Table
+        SQLAlchemy table of the agents
+    session_id : int
+        database id of the session of the AMS
+    version : int
+        number of changes made to the registry
+    """
+
+    def __init__(self, agent, engine=None, table=None, delay=0.2):
+        self.agent = agent
+        self.engine = engine
+        self.table = table
+        self.session_id = None
+        self.delay = delay
+        self.added = dict()
+        self.removed = set()
+        self.version = 0
+        self.changes = dict()
+        self._delta_base = 0
+        self._flush_call = None
+
+    @property
+    def directory(self):
+        """Table of active agents of the AMS."""
+        return self.agent.agentInstance.table
+
+    def __len__(self):
+        return len(self.directory)
+
+    def __contains__(self, aid):
+        return self.is_registered(aid)
+
+    def bind(self, engine, table):
+        """Sets the database written by the registry."""
+        self.engine = engine
+        self.table = table
+
+    def is_registered(self, aid):
+        """Returns True if an agent equal to aid is registered."""
+        registered = self.directory.get(aid.name)
+        return registered is not None and registered == aid
+
+    def register(self, aid):
+        """Adds the agent to the table and queues its row.
+
+        Returns
+        -------
+        bool
+            False if the agent was already registered
+        """
+        if self.is_registered(aid):
+            return False
+        self.directory[aid.name] = aid
+        # a queued removal of the same name is kept, the deletes
+        # of a flush run before its inserts.
+        self.added[aid.name] = dict(name=aid.name,
+                                    date=datetime.now(),
+                                    state='Active')
+        self._changed(aid.name, aid)
+        self._schedule_flush()
+        return True
+
+    def unregister(self, name):
+        """Removes the agent from the table and queues the
+        removal of its row.
+
+        Returns
+        -------
+        AID
+            the removed agent, None if it was not registered
+        """
+        aid = self.directory.pop(name, None)
+        if aid is None:
+            return None
+        self._changed(name, None)
+        if self.added.pop(name, None) is None:
+            # the row was already written, it must be deleted
+            self.removed.add(name)
+            self._schedule_flush()
+        return aid
+
+    def delta(self):
+        """Returns the update with the agents changed since the
+        previous delta, None if nothing changed.
+        """
+        if not self.changes:
+            return None
+        update = {'ref': DELTA,
+                  'base': self._delta_base,
+                  'version': self.version,
+                  'added': {name: aid for name, aid in self.changes.items()
+                            if aid is not None},
+                  'removed': [name for name, aid in self.changes.items()
+                              if aid is None]}
+        self.changes = dict()
+        self._delta_base = self.version
+        return update
+
+    def snapshot(self):
+        """Returns the update with the whole table."""
+        return {'ref': SNAPSHOT,
+                'version': self.version,
+                'table': dict(self.directory)}
+
+    def flush(self):
+        """Writes the queued changes in one transaction.
+
+        Returns
+        -------
+        Deferred
+            fired when the transaction is committed
+        """
+        if self._flush_call is not None and self._flush_call.active():
+            self._flush_call.cancel()
+        self._flush_call = None
+        added = [dict(row, session_id=self.session_id)
+                 for row in self.added.values()]
+        removed = list(self.removed)
+        self.added = dict()
+        self.removed = set()
+        if self.engine is None or self.table is None or not (added or removed):
+            return succeed(None)
+        d = self._write(added, removed)
+        d.addErrback(log.err)
+        return d
+
+    @inlineCallbacks
+    def _write(self, added, removed):
+        conn = yield self.engine.connect()
+        try:
+            trans = yield conn.begin()
+            try:
+                if removed:
+                    yield conn.execute(self.table.delete().where(
+                        self.table.c.name.in_(removed)))
+                if added:
+                    yield conn.execute(self.table.insert(), added)
+            except Exception:
+                yield trans.rollback()
+                raise
+            else:
+                yield trans.commit()
+        finally:
+            yield conn.close()
+
+    def _changed(self, name, aid):
+        self.version += 1
+        self.changes[name] = aid
+
+    def _schedule_flush(self):
+        if self._flush_call is None or not self._flush_call.active():
+            self._flush_call = timer_wheel().call_later(self.delay, self.flush)
@@ -0,0 +1,281 @@
+"""Framework for Intelligent Agents Development - PADE
+
+The MIT License (MIT)
+
+Copyright (c) 2019 Lucas S Melo
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+Retention Module
+----------------
+
+This Python module keeps the messages table of the database
+small. Periodically the messages older than a cutoff are moved
+out of the table: they are appended to the segment files of an
+archive directory, see pade.core.tracestore, counted in the per
+minute aggregates table, by sender, performative and protocol,
+and deleted. Each chunk of messages is aggregated and deleted in
+one transaction.
+
+The cutoff is the most recent of three limits: the age of the
+messages, the number of rows and the size of the database.
+The cutoff is rounded down to a minute, so the messages of a
+minute are aggregated in the same run. The size of a sqlite
+database is the size of its used pages, the pages freed by the
+deleted messages only leave the file at the next VACUUM.
+
+The archive is written after the transaction of its chunk is
+committed, so a chunk rolled back is not archived twice. If the
+process stops in between, the chunk is only kept in the
+aggregates.
+
+The runs and the VACUUM of the database are done in the thread
+pool of the reactor.
+"""
+
+from twisted.internet import threads
+from twisted.internet.defer import succeed
+from twisted.python import log
+
+from pade.core.timers import timer_wheel
+from pade.core.tracestore import SegmentTraceStore, timestamp
+
+from sqlalchemy import and_, func, select
+
+from datetime import datetime, timedelta
+import threading
+
+
+class MessageRetention(object):
+    """Rollover of the messages table into archive files
+    and aggregates.
+
+    Attributes
+    ----------
+    archive : SegmentTraceStore
+        archive of the removed messages, None to only keep
+        the aggregates
+    chunk_size : int
+        messages moved in each transaction
+    interval : float
+        seconds between two runs
+    max_age : float
+        seconds after which a message is moved, None for no limit
+    max_bytes : int
+        size of the used pages of the database above which the
+        oldest messages are moved, None for no limit
+    max_rows : int
+        number of messages above which the oldest are moved,
+        None for no limit
+    moved : int
+        number of messages moved since the start
+    vacuum_rows : int
+        messages moved between two VACUUM of the database
+    """
+
+    # fraction of max_bytes the database is brought back to
+    low_water = 0.8
+
+    def __init__(self, engine, messages, agents, aggregates, archive_dir=None,
+                 max_age=None, max_rows=None, max_bytes=None, interval=600.0,
+                 chunk_size=10000, vacuum_rows=100000, lock=None):
+        """Init the MessageRetention class
+
+        Parameters
+        ----------
+        engine : Engine
+            SQLAlchemy engine of the database, used in the threads
+        messages : Table
+            table of the messages
+        agents : Table
+            table of the agents
+        aggregates : Table
+            table of the per minute aggregates
+        archive_dir : str, optional
+            directory of the archive segments
+        lock : Lock, optional
+            lock held by the other writers of the messages table,
+            the lock of the TraceWriter of the Sniffer
+        """
+        self.engine = engine
+        self.messages = messages
+        self.agents = agents
+        self.aggregates = aggregates
+        self.archive = None
+        if archive_dir is not None:
+            self.archive = SegmentTraceStore(archive_dir, segment_seconds=86400.0)
+        self.max_age = max_age
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.interval = interval
+        self.chunk_size = chunk_size
+        self.vacuum_rows = vacuum_rows
+        self.lock = lock if lock is not None else threading.Lock()
+        self.moved = 0
+        self._unvacuumed = 0
+        self._running = None
+        self._periodic_call = None
+
+    def start(self):
+        """Runs the retention every interval seconds."""
+        if self._periodic_call is None:
+            self._periodic_call = timer_wheel().call_every(self.interval, self.run)
+
+    def stop(self):
+        if self._periodic_call is not None:
+            self._periodic_call.cancel()
+            self._periodic_call = None
+
+    def run(self):
+        """Moves the old messages in the thread pool, nothing is
+        done while the previous run is not finished.
+
+        Returns
+        -------
+        Deferred
+            fired with the number of messages moved
+        """
+        if self._running is not None:
+            return succeed(0)
+        self._running = threads.deferToThread(self._run)
+        self._running.addErrback(log.err)
+        self._running.addBoth(self._finished)
+        return self._running
+
+    def _finished(self, result):
+        self._running = None
+        return result
+
+    # the methods below run in the thread pool
+
+    def cutoff(self, conn, now=None):
+        """Returns the date before which messages are moved,
+        None if no limit is exceeded.
+        """
+        cutoffs = list()
+        if now is None:
+            now = datetime.now()
+        if self.max_age is not None:
+            cutoffs.append(now - timedelta(seconds=self.max_age))
+        keep = None
+        if self.max_rows is not None:
+            keep = self.max_rows
+        if self.max_bytes is not None:
+            size = self._database_size(conn)
+            if size is not None and size > self.max_bytes:
+                count = conn.execute(select([func.count()]).select_from(self.messages)).scalar()
+                by_size = int(count * self.max_bytes * self.low_water / size)
+                keep = by_size if keep is None else min(keep, by_size)
+        if keep is not None:
+            date = conn.execute(select([self.messages.c.date])
+                                .order_by(self.messages.c.date.desc())
+                                .limit(1).offset(keep)).scalar()
+            if date is not None:
+                cutoffs.append(date)
+        if not cutoffs:
+            return None
+        return max(cutoffs).replace(second=0, microsecond=0)
+
+    def _run(self):
+        moved = 0
+        with self.lock:
+            # the table is missing in databases created before it
+            self.aggregates.create(self.engine, checkfirst=True)
+            with self.engine.connect() as conn:
+                cutoff = self.cutoff(conn)
+            if cutoff is not None:
+                while True:
+                    count = self._move_chunk(cutoff)
+                    moved += count
+                    if count < self.chunk_size:
+                        break
+            self.moved += moved
+            self._unvacuumed += moved
+            if self._unvacuumed >= self.vacuum_rows:
+                self.vacuum()
+        return moved
+
+    def _move_chunk(self, cutoff):
+        m = self.messages
+        query = select([m, self.agents.c.name.label('agent_name')]) \
+            .select_from(m.outerjoin(self.agents, m.c.agent_id == self.agents.c.id)) \
+            .where(m.c.date < cutoff).order_by(m.c.id).limit(self.chunk_size)
+        with self.engine.begin() as conn:
+            rows = conn.execute(query).fetchall()
+            if not rows:
+                return 0
+            self._aggregate(conn, rows)
+            conn.execute(m.delete().where(and_(m.c.id <= rows[-1]['id'],
+                                               m.c.date < cutoff)))
+        if self.archive is not None:
+            self._archive(rows)
+        return len(rows)
+
+    def _archive(self, rows):
+        columns = dict((column, list()) for column in
+                       ('timestamp', 'agent', 'sender', 'receivers', 'performative',
+                        'protocol', 'conversation_id', 'message_id', 'ontology',
+                        'language'))
+        contents = list()
+        for row in rows:
+            columns['timestamp'].append(timestamp(row['date']))
+            columns['agent'].append(row['agent_name'])
+            for column in ('sender', 'receivers', 'performative', 'protocol',
+                           'conversation_id', 'message_id', 'ontology', 'language'):
+                columns[column].append(row[column])
+            contents.append(row['content'])
+        self.archive.append(columns, contents)
+
+    def _aggregate(self, conn, rows):
+        counts = dict()
+        for row in rows:
+            key = (row['date'].replace(second=0, microsecond=0), row['sender'],
+                   row['performative'], row['protocol'])
+            counts[key] = counts.get(key, 0) + 1
+        a = self.aggregates
+        for (minute, sender, performative, protocol), count in counts.items():
+            where = and_(a.c.minute == minute, a.c.sender == sender,
+                         a.c.performative == performative, a.c.protocol == protocol)
+            result = conn.execute(a.update().where(where)
+                                  .values(count=a.c.count + count))
+            if not result.rowcount:
+                conn.execute(a.insert().values(minute=minute, sender=sender,
+                                               performative=performative,
+                                               protocol=protocol, count=count))
+
+    def vacuum(self):
+        """Gives the space of the deleted messages back to the
+        file system, only for sqlite databases.
+        """
+        self._unvacuumed = 0
+        if self.engine.dialect.name != 'sqlite':
+            return
+        with self.engine.connect() as conn:
+            conn.execute('VACUUM')
+
+    def _database_size(self, conn):
+        """Returns the size of the used pages of a sqlite
+        database, None for other databases.
+        """
+        if self.engine.dialect.name != 'sqlite':
+            return None
+        pages = conn.execute('PRAGMA page_count').scalar()
+        free = conn.execute('PRAGMA freelist_count').scalar()
+        size = conn.execute('PRAGMA page_size').scalar()
+        return (pages - free) * size
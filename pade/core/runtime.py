@@ -0,0 +1,203 @@
+"""Framework for Intelligent Agents Development - PADE
+
+The MIT License (MIT)
+
+Copyright (c) 2019 Lucas S Melo
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+Sharded Runtime Module
+----------------------
+
+This Python module runs a list of agents on several worker
+processes, each one with its own reactor, so the agents of a
+simulation use every CPU core of the machine.
+
+Every worker builds the same list of agents and starts only its
+shard of it, the agents at positions index, index + count, ...
+The shard of a process is given by the PADE_SHARD environment
+variable, in the form index/count, and read by start_loop.
+
+Agents of the same machine also listen on a Unix socket named
+after their port, inside the directory given by PADE_SOCKET_DIR.
+The pooled connections use these sockets instead of TCP loopback
+when they exist.
+"""
+
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+
+SHARD_ENV = 'PADE_SHARD'
+SOCKET_DIR_ENV = 'PADE_SOCKET_DIR'
+LOOPBACK = '127.0.0.1'
+# threads of the reactor pool, used by deferToThread for the
+# database writes of the Sniffer, the retention and the search index
+THREAD_POOL_SIZE = 30
+
+# the workers are spawned, a forked child would share the
+# reactor created by the parent when pade.core.agent was imported.
+SpawnProcess = multiprocessing.get_context('spawn').Process
+
+
+def current_shard():
+    """Returns the shard of the current process as a
+    tuple (index, count), (0, 1) when it is not a worker.
+    """
+    value = os.environ.get(SHARD_ENV)
+    if not value:
+        return 0, 1
+    index, count = value.split('/')
+    return int(index), int(count)
+
+
+def shard_agents(agents, index=None, count=None):
+    """Returns the agents started by a shard.
+
+    :param agents: list with every agent of the runtime, in the
+        same order in all workers
+    :param index: shard index, the current shard when None
+    :param count: number of shards, the current count when None
+    """
+    if index is None or count is None:
+        index, count = current_shard()
+    return agents[index::count]
+
+
+def assign_addresses(agents, base_port, host='localhost'):
+    """Gives the agents consecutive ports starting at base_port,
+    following their order in the list, so each worker knows the
+    address of the agents started by the other workers.
+
+    :param agents: list with every agent of the runtime
+    :param base_port: port of the first agent
+    :param host: host of the agents
+    """
+    for i, agent in enumerate(agents):
+        agent.aid.host = host
+        agent.aid.setPort(base_port + i)
+
+
+def unix_socket_path(host, port):
+    """Returns the Unix socket of the agent listening on
+    host:port, or None if it is not a local agent of a
+    sharded runtime.
+
+    :param host: host resolved by the connection pool
+    :param port: agent port
+    """
+    directory = os.environ.get(SOCKET_DIR_ENV)
+    if directory is None or host != LOOPBACK:
+        return None
+    path = os.path.join(directory, '{}.sock'.format(port))
+    if not os.path.exists(path):
+        return None
+    return path
+
+
+def listen_unix(agent):
+    """Makes the agent listen on its Unix socket, when
+    the process belongs to a sharded runtime.
+
+    :param agent: agent whose factory is already created
+    """
+    directory = os.environ.get(SOCKET_DIR_ENV)
+    if directory is None:
+        return None
+    from twisted.internet import reactor
+    path = os.path.join(directory, '{}.sock'.format(agent.aid.port))
+    if os.path.exists(path):
+        os.remove(path)
+    return reactor.listenUNIX(path, agent.agentInstance)
+
+
+class AgentWorker(SpawnProcess):
+    """This class implements the process that runs
+    one shard of the agents with its own reactor.
+    """
+
+    def __init__(self, build_agents, index, count, socket_dir, base_port=None):
+        """Init the AgentWorker class
+
+        Parameters
+        ----------
+        build_agents : function
+            importable function that returns the list with every
+            agent of the runtime, called in the worker process
+        index : int
+            shard index
+        count : int
+            number of shards
+        socket_dir : str
+            directory of the Unix sockets of the agents
+        base_port : int, optional
+            port of the first agent, the ports of the agents are
+            kept when None
+        """
+        SpawnProcess.__init__(self)
+        self.build_agents = build_agents
+        self.index = index
+        self.count = count
+        self.socket_dir = socket_dir
+        self.base_port = base_port
+
+    def run(self):
+        os.environ[SHARD_ENV] = '{}/{}'.format(self.index, self.count)
+        os.environ[SOCKET_DIR_ENV] = self.socket_dir
+        from pade.misc.utility import start_loop
+        agents = self.build_agents()
+        if self.base_port is not None:
+            assign_addresses(agents, self.base_port)
+        start_loop(agents)
+
+
+def start_sharded(build_agents, workers=None, base_port=None):
+    """Starts the agents on several worker processes and
+    waits for them. The workers are stopped on Ctrl-C.
+
+    The workers are spawned, not forked, so each one creates
+    its own reactor. For the same reason the agents are built
+    inside the workers by build_agents, which must be a module
+    level function.
+
+    :param build_agents: function that returns the list of agents
+    :param workers: number of workers, the number of CPUs when None
+    :param base_port: port of the first agent, see assign_addresses
+    """
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    socket_dir = tempfile.mkdtemp(prefix='pade-')
+    processes = list()
+    for index in range(workers):
+        p = AgentWorker(build_agents, index, workers, socket_dir, base_port)
+        p.start()
+        processes.append(p)
+    try:
+        while any(p.is_alive() for p in processes):
+            time.sleep(1.0)
+    except KeyboardInterrupt:
+        for p in processes:
+            p.terminate()
+    finally:
+        for p in processes:
+            p.join()
+        shutil.rmtree(socket_dir, ignore_errors=True)
@@ -0,0 +1,196 @@
+"""Framework for Intelligent Agents Development - PADE
+
+The MIT License (MIT)
+
+Copyright (c) 2019 Lucas S Melo
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+Send Scheduler Module
+---------------------
+
+This Python module decides when the frames queued on the pooled
+connections of an agent are written. Each destination has its own
+queue. A destination is drained only while its transport accepts
+more data: the pooled connection is registered as a producer of
+its transport, so Twisted pauses it when the write buffer fills
+up and resumes it when the buffer drains. The number of connection
+attempts running at the same time and the number of frames written
+to one destination per reactor turn are limited, so a broadcast to
+many agents goes out as fast as the network takes it, without
+fixed delays.
+"""
+
+from collections import OrderedDict, deque
+
+from twisted.internet import reactor
+
+
+class SendScheduler(object):
+    """Scheduler of the outbound queues of a connection pool.
+
+    Attributes
+    ----------
+    batch_size : int
+        Frames written to a destination before the scheduler
+        moves to the next one
+    connecting : set
+        Connections with a connection attempt in progress
+    max_connecting : int
+        Maximum number of connection attempts at the same time
+    rate_window : float
+        Window, in seconds, used to compute the drain rate
+    sent : int
+        Total number of frames written
+    """
+
+    def __init__(self, max_connecting=32, batch_size=64, rate_window=5.0):
+        """Init the SendScheduler class
+
+        Parameters
+        ----------
+        max_connecting : int, optional
+            Maximum number of connection attempts at the same time
+        batch_size : int, optional
+            Frames written to a destination per reactor turn
+        rate_window : float, optional
+            Window, in seconds, used to compute the drain rate
+        """
+        self.max_connecting = max_connecting
+        self.batch_size = batch_size
+        self.rate_window = rate_window
+        self.connections = set()
+        self.ready = OrderedDict()
+        self.connecting = set()
+        self.waiting = deque()
+        # same connections as waiting, to test membership
+        self.waiting_set = set()
+        self.drain_call = None
+        self.sent = 0
+        self.samples = deque()
+
+    def schedule(self, connection):
+        """Marks a connection as having frames to write.
+
+        Parameters
+        ----------
+        connection : PooledConnection
+            Connection with queued frames
+        """
+        self.connections.add(connection)
+        self.ready[connection] = None
+        if self.drain_call is None:
+            self.drain_call = reactor.callLater(0, self.drain)
+
+    def drain(self):
+        """Writes the queued frames of the ready connections,
+        at most batch_size frames per connection.
+        """
+        self.drain_call = None
+        ready, self.ready = self.ready, OrderedDict()
+        written = 0
+
+        for connection in ready:
+            if not connection.queue:
+                continue
+            if connection.protocol is None:
+                self._connect(connection)
+                continue
+            if connection.paused:
+                # resumeProducing schedules the connection again
+                continue
+            written += connection.write_frames(self.batch_size)
+            if connection.queue and not connection.paused:
+                self.ready[connection] = None
+
+        if written:
+            self.sent += written
+            self.samples.append((reactor.seconds(), written))
+            self._prune_samples()
+        if self.ready and self.drain_call is None:
+            self.drain_call = reactor.callLater(0, self.drain)
+
+    def connection_finished(self, connection):
+        """Called when a connection attempt succeeds or fails.
+        Starts the attempts waiting for a free slot.
+
+        Parameters
+        ----------
+        connection : PooledConnection
+            Connection whose attempt finished
+        """
+        self.connecting.discard(connection)
+        while self.waiting and len(self.connecting) < self.max_connecting:
+            waiting = self.waiting.popleft()
+            self.waiting_set.discard(waiting)
+            if waiting.queue and waiting.protocol is None:
+                self._connect(waiting)
+
+    def discard(self, connection):
+        """Forgets a connection removed from the pool.
+        """
+        self.connections.discard(connection)
+        self.ready.pop(connection, None)
+        self.connection_finished(connection)
+
+    def _connect(self, connection):
+        if connection.connector is not None or connection.retry_call is not None:
+            # connection_made or the retry schedules it again
+            return
+        if len(self.connecting) < self.max_connecting:
+            self.connecting.add(connection)
+            connection.connect()
+        elif connection not in self.waiting_set:
+            self.waiting.append(connection)
+            self.waiting_set.add(connection)
+
+    def queue_depth(self, connection=None):
+        """Returns the number of queued frames of a
+        connection or of every connection.
+        """
+        if connection is not None:
+            return len(connection.queue)
+        return sum(len(c.queue) for c in self.connections)
+
+    def drain_rate(self):
+        """Returns the number of frames written per second
+        during the last rate_window seconds.
+        """
+        self._prune_samples()
+        return sum(n for _, n in self.samples) / self.rate_window
+
+    def _prune_samples(self):
+        limit = reactor.seconds() - self.rate_window
+        while self.samples and self.samples[0][0] < limit:
+            self.samples.popleft()
+
+    def stats(self):
+        """Returns a dictionary with the scheduler metrics.
+        """
+        depths = dict()
+        for connection in self.connections:
+            if connection.queue:
+                depths['{}:{}'.format(connection.host, connection.port)] = len(connection.queue)
+        return {'queued': sum(depths.values()),
+                'queues': depths,
+                'connecting': len(self.connecting),
+                'waiting': len(self.waiting),
+                'paused': sum(1 for c in self.connections if c.paused),
+                'sent': self.sent,
+                'drain_rate': self.drain_rate()}
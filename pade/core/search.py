@@ -0,0 +1,268 @@
+"""Framework for Intelligent Agents Development - PADE
+
+The MIT License (MIT)
+
+Copyright (c) 2019 Lucas S Melo
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+Message Search Module
+---------------------
+
+This Python module implements the full-text index of the messages
+table, a SQLite FTS5 table with the content, ontology and language
+of every message, keyed by the id of the message.
+
+The index is kept up to date by triggers of the messages table, so
+the rows inserted by the Sniffer are indexed in the same transaction
+and the rows deleted by the retention leave the index with them.
+The messages stored before the index was created are indexed by
+reindex, in chunks, from the position where the last call stopped,
+and the index is only complete, and used by the searches, when
+reindex has reached them all.
+
+The methods block on the database, the Sniffer calls them in the
+thread pool of the reactor.
+"""
+
+from sqlalchemy import and_, column, func, literal_column, select, table, text
+
+
+FTS_TABLE = 'messages_fts'
+STATE_TABLE = 'messages_fts_state'
+FIELDS = ('content', 'ontology', 'language')
+# bm25 weights of the fields, a match in the content
+# ranks higher than a match in the ontology or language
+WEIGHTS = (10.0, 2.0, 1.0)
+
+
+def match_expression(words):
+    """Returns the FTS5 query of the words typed by the user.
+
+    Every word is quoted, so quotes and operators of the FTS5
+    syntax are searched as text, and the last word also matches
+    as a prefix. The words must all be found, in any field.
+
+    Parameters
+    ----------
+    words : str
+        text of the search
+
+    Returns
+    -------
+    str
+        the query, None if there are no words
+    """
+    terms = ['"{}"'.format(word.replace('"', '""')) for word in words.split()]
+    if not terms:
+        return None
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+class MessageSearchIndex(object):
+    """Full-text index of the messages table.
+
+    Attributes
+    ----------
+    chunk_size : int
+        messages indexed in each transaction of reindex
+    engine : Engine
+        SQLAlchemy engine of the database
+    messages : Table
+        table of the messages
+    """
+
+    def __init__(self, engine, messages, chunk_size=10000):
+        self.engine = engine
+        self.messages = messages
+        self.chunk_size = chunk_size
+        self.fts = table(FTS_TABLE, column('rowid'), *[column(f) for f in FIELDS])
+
+    def supported(self):
+        """Returns True if the database is SQLite and has FTS5."""
+        if self.engine.dialect.name != 'sqlite':
+            return False
+        with self.engine.connect() as conn:
+            options = [row[0] for row in conn.execute(text('PRAGMA compile_options'))]
+        return 'ENABLE_FTS5' in options
+
+    def exists(self):
+        """Returns True if the index was created."""
+        if self.engine.dialect.name != 'sqlite':
+            return False
+        with self.engine.connect() as conn:
+            found = conn.execute(text("SELECT name FROM sqlite_master "
+                                      "WHERE type = 'table' AND name = :name"),
+                                 name=FTS_TABLE).first()
+        return found is not None
+
+    def create(self):
+        """Creates the index and the triggers that maintain it,
+        nothing happens if they exist.
+
+        Returns
+        -------
+        bool
+            False if the database does not support the index
+        """
+        if not self.supported():
+            return False
+        name = self.messages.name
+        fields = ', '.join(FIELDS)
+        values = ', '.join('new.' + f for f in FIELDS)
+        statements = [
+            'CREATE VIRTUAL TABLE IF NOT EXISTS {} USING fts5({})'.format(FTS_TABLE, fields),
+            # position of reindex, every message with a lower id was
+            # checked, and id of the last message stored before the triggers
+            'CREATE TABLE IF NOT EXISTS {} (indexed_id INTEGER NOT NULL, '
+            'created_id INTEGER NOT NULL)'.format(STATE_TABLE),
+            'CREATE TRIGGER IF NOT EXISTS {0}_insert AFTER INSERT ON {1} BEGIN '
+            'INSERT INTO {0} (rowid, {2}) VALUES (new.id, {3}); END'.format(
+                FTS_TABLE, name, fields, values),
+            'CREATE TRIGGER IF NOT EXISTS {0}_delete AFTER DELETE ON {1} BEGIN '
+            'DELETE FROM {0} WHERE rowid = old.id; END'.format(FTS_TABLE, name),
+            'CREATE TRIGGER IF NOT EXISTS {0}_update AFTER UPDATE OF {2} ON {1} BEGIN '
+            'DELETE FROM {0} WHERE rowid = old.id; '
+            'INSERT INTO {0} (rowid, {2}) VALUES (new.id, {3}); END'.format(
+                FTS_TABLE, name, fields, values),
+        ]
+        with self.engine.begin() as conn:
+            for statement in statements:
+                conn.execute(text(statement))
+            if conn.execute(text('SELECT count(*) FROM ' + STATE_TABLE)).scalar() == 0:
+                conn.execute(text('INSERT INTO {} (indexed_id, created_id) '
+                                  'SELECT 0, coalesce(max(id), 0) FROM {}'.format(
+                                      STATE_TABLE, name)))
+        return True
+
+    def complete(self):
+        """Returns True if the index has every message, the
+        messages stored before it was created are only found
+        after reindex has indexed them.
+        """
+        if not self.exists():
+            return False
+        with self.engine.connect() as conn:
+            row = conn.execute(text('SELECT indexed_id, created_id FROM ' + STATE_TABLE)).first()
+        return row is not None and row[0] >= row[1]
+
+    def reindex(self, full=False, progress=None):
+        """Indexes the messages not indexed yet, starting where
+        the last call stopped. Each chunk is committed, so an
+        interrupted reindex goes on from the last chunk.
+
+        Parameters
+        ----------
+        full : bool, optional
+            empties the index and indexes every message again
+        progress : method, optional
+            called with the id of the last message checked
+            after each chunk
+
+        Returns
+        -------
+        int
+            number of messages indexed
+        """
+        if not self.create():
+            return 0
+        if full:
+            with self.engine.begin() as conn:
+                conn.execute(text('DELETE FROM ' + FTS_TABLE))
+                conn.execute(text('UPDATE {} SET indexed_id = 0, created_id = '
+                                  '(SELECT coalesce(max(id), 0) FROM {})'.format(
+                                      STATE_TABLE, self.messages.name)))
+        messages = self.messages
+        indexed = 0
+        while True:
+            with self.engine.begin() as conn:
+                after, created = conn.execute(
+                    text('SELECT indexed_id, created_id FROM ' + STATE_TABLE)).first()
+                # the messages stored after created_id were
+                # indexed by the triggers
+                chunk = select([messages.c.id]).where(and_(messages.c.id > after,
+                                                           messages.c.id <= created)) \
+                    .order_by(messages.c.id).limit(self.chunk_size).alias()
+                last = conn.execute(select([func.max(chunk.c.id)])).scalar()
+                if last is None:
+                    if after < created:
+                        # the last messages were deleted meanwhile
+                        conn.execute(text('UPDATE {} SET indexed_id = created_id'.format(
+                            STATE_TABLE)))
+                    return indexed
+                # rows updated after the triggers are already indexed
+                result = conn.execute(text(
+                    'INSERT INTO {0} (rowid, {1}) SELECT id, {1} FROM {2} m '
+                    'WHERE id > :after AND id <= :last AND NOT EXISTS '
+                    '(SELECT 1 FROM {0} WHERE rowid = m.id)'.format(
+                        FTS_TABLE, ', '.join(FIELDS), messages.name)),
+                    after=after, last=last)
+                indexed += result.rowcount
+                conn.execute(text('UPDATE {} SET indexed_id = :last'.format(STATE_TABLE)),
+                             last=last)
+            if progress is not None:
+                progress(last)
+
+    def search(self, words, sender=None, performative=None, start=None, stop=None,
+               limit=50, offset=0):
+        """Returns the messages that match the words, the best
+        match first.
+
+        Parameters
+        ----------
+        words : str
+            text searched in the content, ontology and language
+        sender : str, optional
+            name of the sender
+        performative : str, optional
+            performative of the messages
+        start : datetime, optional
+            messages sent after this date
+        stop : datetime, optional
+            messages sent before this date
+        limit : int, optional
+            number of messages returned
+        offset : int, optional
+            number of best matches skipped
+
+        Returns
+        -------
+        list
+            (message id, score) tuples, a lower score is a better match
+        """
+        query = match_expression(words)
+        if query is None:
+            return list()
+        messages = self.messages
+        rank = func.bm25(literal_column(FTS_TABLE), *WEIGHTS).label('rank')
+        conditions = [literal_column(FTS_TABLE).match(query)]
+        if sender is not None:
+            conditions.append(messages.c.sender == sender)
+        if performative is not None:
+            conditions.append(messages.c.performative == performative)
+        if start is not None:
+            conditions.append(messages.c.date > start)
+        if stop is not None:
+            conditions.append(messages.c.date < stop)
+        statement = select([messages.c.id, rank]).select_from(
+            self.fts.join(messages, messages.c.id == self.fts.c.rowid)
+        ).where(and_(*conditions)).order_by(rank, messages.c.id.desc()).limit(limit).offset(offset)
+        with self.engine.connect() as conn:
+            return [(row[0], row[1]) for row in conn.execute(statement)]
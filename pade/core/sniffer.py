@@ -28,106 +28,105 @@ from pade.acl.aid import AID
 from pade.misc.utility import display_message, start_loop
 
 from pade.web import flask_server
-from pade.web.flask_server import AgentModel, basedir
+from pade.web.flask_server import AgentModel, MessageAggregate, basedir
 from pade.core.Organization import Organization
+from pade.core.tap import TRACE, trace_record
+from pade.core.tracedb import TraceWriter
+from pade.core.tracestore import SegmentTraceWriter, TRACE_DIR_ENV
+from pade.core.retention import MessageRetention
+from pade.core.search import MessageSearchIndex
 
 
-from alchimia import wrap_engine
-from twisted.internet.defer import inlineCallbacks
-from twisted.internet import reactor
+from twisted.internet import reactor, threads
+from twisted.python import log
 from sqlalchemy import create_engine, MetaData, Table
 
 from pickle import loads, dumps
-import xml.etree.ElementTree as ET
-import random
 import os
 import sys
 
 ENGINE = create_engine('sqlite:///' + os.path.join(basedir, 'data.sqlite'))
-TWISTED_ENGINE = wrap_engine(reactor, ENGINE)
-TWISTED_ENGINE.run_callable = ENGINE.run_callable
 
 METADATA = MetaData()
 METADATA.bind = ENGINE
 MESSAGES = Table('messages', METADATA, autoload=True, autoload_with=ENGINE)
 AGENTS = Table('agents', METADATA, autoload=True, autoload_with=ENGINE)
+AGGREGATES = MessageAggregate.__table__
 
 class Sniffer(Agent):
     """This is the class that implements the Sniffer agent."""
 
-    def __init__(self, host='localhost', port=8001, debug=False):
+    def __init__(self, host='localhost', port=8001, debug=False,
+                 flush_size=1000, flush_interval=5.0, trace_dir=None,
+                 retention=None):
         self.sniffer_aid = AID('sniffer@' + str(host) + ':' + str(port))
         super(Sniffer, self).__init__(self.sniffer_aid, debug=debug)
         self.sniffer = {'name':str(host),'port':str(port)}      
         self.host = host
         self.port = port
-        self.messages_buffer = dict()
-        self.buffer_control = True
-        self.agent_db_id = dict()
-
-    def handle_store_messages(self):
-        for sender, messages in self.messages_buffer.items():
-            if self.agent_db_id.get(sender) == None:
-                r = ENGINE.execute(AGENTS.select(AGENTS.c.name.is_(sender)))
-                a = r.fetchall()
-                if a != []:
-                    agent_id = a[0][0]
-                    self.agent_db_id[sender] = agent_id
-                else:
-                    print('Agent does not exist in database: {}'.format(sender))
-                r.close()
-            else:
-                pass
-
-            for message in messages:
-                receivers = ';'.join([i.localname for i in message.receivers])
-                content = message.content
-                if isinstance(content, ET.Element):
-                    content = ET.tostring(content)
-
-                insert_obj = MESSAGES.insert()
-                sql_act = insert_obj.values(agent_id=self.agent_db_id[sender],
-                                            sender=message.sender.name,
-                                            date=message.datetime,
-                                            performative=message.performative,
-                                            protocol=message.protocol,
-                                            content=content,
-                                            conversation_id=message.conversation_id,
-                                            message_id=message.messageID,
-                                            ontology=message.ontology,
-                                            language=message.language,
-                                            receivers=receivers)
-
-                #reactor.callInThread(ENGINE.execute, sql_act)
-                reactor.callLater(random.uniform(0.1, 0.5), self.register_message_in_db, sql_act)
-
-                if self.debug:
-                    display_message(self.aid.name, 'Message stored')
-
-        self.messages_buffer = dict()
-        self.buffer_control = True
-
-    @inlineCallbacks
-    def register_message_in_db(self, sql_act):
-        yield TWISTED_ENGINE.execute(sql_act)
+        # the records are written in batches, off the reactor thread,
+        # in the messages table or in the segment files of trace_dir.
+        if trace_dir is None:
+            self.writer = TraceWriter(ENGINE, MESSAGES, AGENTS,
+                                      flush_size=flush_size,
+                                      flush_interval=flush_interval)
+        else:
+            self.writer = SegmentTraceWriter(trace_dir,
+                                             flush_size=flush_size,
+                                             flush_interval=flush_interval)
+        # rollover of the old messages of the messages table, a
+        # dictionary with the options of MessageRetention.
+        self.retention = None
+        if retention is not None and trace_dir is None:
+            self.retention = MessageRetention(ENGINE, MESSAGES, AGENTS, AGGREGATES,
+                                              lock=self.writer.lock, **retention)
+        # full-text index of the messages table, maintained by
+        # triggers as the writer inserts the rows.
+        self.search = None
+        if trace_dir is None:
+            self.search = MessageSearchIndex(ENGINE, MESSAGES)
+
+    def on_start(self):
+        super(Sniffer, self).on_start()
+        if self.search is not None:
+            # the index is created before the first batch of the
+            # writer, and under its lock like the retention
+            d = threads.deferToThread(self._create_search_index)
+            d.addErrback(log.err)
+            d.addCallback(lambda _: self.writer.start())
+            # the messages stored before the index are indexed
+            # meanwhile, the searches use it once they all are
+            d.addCallback(lambda _: threads.deferToThread(self.search.reindex))
+            d.addErrback(log.err)
+        else:
+            self.writer.start()
+        if self.retention is not None:
+            self.retention.start()
+
+    def _create_search_index(self):
+        # runs in the thread pool
+        with self.writer.lock:
+            return self.search.create()
 
     def react(self, message):
         super(Sniffer, self).react(message)
         if 'ams' not in message.sender.name:
             content = loads(message.content)
-            if content['ref'] == 'MESSAGE':
-                _message = content['message']
-                if self.messages_buffer.get(message.sender.name) == None:
-                    self.messages_buffer[message.sender.name] = [_message]
-                else:
-                    messages = self.messages_buffer[message.sender.name]
-                    messages.append(_message) 
-
-                if self.buffer_control:
-                    reactor.callLater(5.0, self.handle_store_messages)
-                    self.buffer_control = False
+            if content['ref'] == TRACE:
+                records = content['records']
+                if content.get('dropped') and self.debug:
+                    display_message(self.aid.name, '{} trace records dropped by {}'.format(
+                        content['dropped'], message.sender.name))
+            elif content['ref'] == 'MESSAGE':
+                # message mirrored by an agent without a tap
+                records = [trace_record(content['message'])]
+            else:
+                return
+            self.writer.add(message.sender.name, records)
 
 if __name__ == '__main__':
-    sniffer = Sniffer(port=8001)
+    sniffer = Sniffer(port=8001, trace_dir=os.environ.get(TRACE_DIR_ENV),
+                      retention={'archive_dir': os.path.join(basedir, 'archive'),
+                                 'max_bytes': 1 << 30})
     Org = Organization(reactor)
     Org.start_loop([sniffer])
@@ -0,0 +1,192 @@
+"""Framework for Intelligent Agents Development - PADE
+
+The MIT License (MIT)
+
+Copyright (c) 2019 Lucas S Melo
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+Message Tap Module
+------------------
+
+This Python module implements the tap through which an agent
+mirrors its received messages to the Sniffer. A received message
+only becomes a small trace record, a tuple with the fields stored
+by the Sniffer, appended to a bounded buffer. The buffer is sent
+to the Sniffer in batches, one message per batch, over the pooled
+connection of the agent.
+
+Tracing never holds up the agent: the messages can be sampled,
+and when the buffer is full the oldest records are dropped and
+counted instead of waiting for the Sniffer. The capacity also
+bounds the records in flight: while the connection to the Sniffer
+is paused or already has max_queued batches waiting, the records
+stay in the buffer and the flush is tried again later.
+"""
+
+from pade.acl.messages import ACLMessage
+from pade.acl.aid import AID
+from pade.core.timers import timer_wheel
+
+from collections import deque
+from pickle import dumps
+import random
+
+
+TRACE = 'TRACE'
+TRACE_FIELDS = ('date', 'sender', 'receivers', 'performative', 'protocol',
+                'conversation_id', 'message_id', 'ontology', 'language',
+                'content')
+
+
+def trace_record(message):
+    """Returns the trace record of a message, a tuple with
+    the values of TRACE_FIELDS.
+    """
+    sender = message.sender
+    return (message.datetime,
+            sender.name if sender is not None else None,
+            ';'.join([receiver.localname for receiver in message.receivers]),
+            message.performative,
+            message.protocol,
+            message.conversation_id,
+            message.messageID,
+            message.ontology,
+            message.language,
+            message.content)
+
+
+class MessageTap(object):
+    """Bounded buffer of the trace records of an agent.
+
+    Attributes
+    ----------
+    batch_size : int
+        number of records that triggers a flush before
+        flush_interval
+    capacity : int
+        maximum number of buffered records
+    dropped : int
+        records dropped because the buffer was full
+    flush_interval : float
+        seconds between the first buffered record and the flush
+    max_queued : int
+        batches waiting on the connection to the Sniffer above
+        which the flush waits
+    records : deque
+        buffered records
+    sample_rate : float
+        fraction of the received messages that are traced,
+        0.0 turns the tap off
+    """
+
+    def __init__(self, agent, capacity=10000, batch_size=500,
+                 flush_interval=1.0, sample_rate=1.0, max_queued=2):
+        self.agent = agent
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.sample_rate = sample_rate
+        self.max_queued = max_queued
+        self.records = deque()
+        self.dropped = 0
+        self._flush_call = None
+        self._flush_delay = None
+        # True while the flush waits for the Sniffer connection
+        self._waiting = False
+
+    def __len__(self):
+        return len(self.records)
+
+    def record(self, message):
+        """Buffers the trace record of a received message.
+
+        Returns
+        -------
+        bool
+            True if the record was buffered
+        """
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return False
+        if len(self.records) >= self.capacity:
+            self.records.popleft()
+            self.dropped += 1
+        self.records.append(trace_record(message))
+        if self._waiting:
+            # the flush is already scheduled
+            pass
+        elif len(self.records) >= self.batch_size:
+            self._schedule_flush(0.0)
+        else:
+            self._schedule_flush(self.flush_interval)
+        return True
+
+    def flush(self):
+        """Sends the buffered records to the Sniffer, in
+        messages of at most batch_size records, while the
+        connection to the Sniffer takes them. The records left
+        are sent by a flush after flush_interval.
+        """
+        if self._flush_call is not None and self._flush_call.active():
+            self._flush_call.cancel()
+        self._flush_call = None
+        self._waiting = False
+        while self.records:
+            if self.backpressured():
+                self._waiting = True
+                self._schedule_flush(self.flush_interval)
+                return
+            count = min(len(self.records), self.batch_size)
+            batch = [self.records.popleft() for _ in range(count)]
+            self._send(batch)
+
+    def backpressured(self):
+        """Returns True if the pooled connection to the Sniffer
+        is paused or has max_queued batches waiting.
+        """
+        pool = self.agent.agentInstance.pool
+        sniffer = self.agent.sniffer
+        connection = pool.connections.get((pool.resolve(sniffer['name']),
+                                           int(sniffer['port'])))
+        if connection is None:
+            return False
+        return connection.paused or len(connection.queue) >= self.max_queued
+
+    def sniffer_aid(self):
+        sniffer = self.agent.sniffer
+        return AID('sniffer@' + sniffer['name'] + ':' + str(sniffer['port']))
+
+    def _send(self, batch):
+        message = ACLMessage(ACLMessage.INFORM)
+        message.add_receiver(self.sniffer_aid())
+        message.set_content(dumps({'ref': TRACE,
+                                   'records': batch,
+                                   'dropped': self.dropped}))
+        message.set_system_message(is_system_message=True)
+        self.dropped = 0
+        self.agent.send(message)
+
+    def _schedule_flush(self, delay):
+        call = self._flush_call
+        if call is not None and call.active():
+            if delay >= self._flush_delay:
+                return
+            call.cancel()
+        self._flush_delay = delay
+        self._flush_call = timer_wheel().call_later(delay, self.flush)
@@ -0,0 +1,350 @@
+"""Framework for Intelligent Agents Development - PADE
+
+The MIT License (MIT)
+
+Copyright (c) 2019 Lucas S Melo
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+Timer Wheel Module
+------------------
+
+This Python module implements the timers shared by all the agents
+of a process. Timers are kept in a hierarchical timer wheel: four
+levels of 256 slots, the first one with one slot per tick and each
+next level with one slot per turn of the level below. Adding or
+cancelling a timer does not depend on the number of timers, and
+the reactor only holds one delayed call, for the next tick with
+timers to run or to move down from an upper level.
+
+Periodic calls with the same period are grouped, the group wakes
+up once per period and calls all of its members. The times of a
+group are computed from its start, so the calls do not drift.
+"""
+
+from twisted.internet import reactor
+from twisted.python import log
+
+import math
+
+
+SLOT_BITS = 8
+SLOTS = 1 << SLOT_BITS
+SLOT_MASK = SLOTS - 1
+LEVELS = 4
+
+
+class Timer(object):
+    """Handle of a timer scheduled in a TimerWheel.
+
+    Attributes
+    ----------
+    tick : int
+        tick in which the timer runs
+    """
+
+    __slots__ = ('wheel', 'tick', 'method', 'args', 'slot', 'called', 'cancelled')
+
+    def __init__(self, wheel, tick, method, args):
+        self.wheel = wheel
+        self.tick = tick
+        self.method = method
+        self.args = args
+        self.slot = None
+        self.called = False
+        self.cancelled = False
+
+    def active(self):
+        """Returns True while the timer did not run and
+        was not cancelled.
+        """
+        return not (self.called or self.cancelled)
+
+    def cancel(self):
+        """Cancels the timer, nothing happens if it is not active."""
+        if not self.active():
+            return
+        self.cancelled = True
+        if self.slot is not None:
+            self.slot.discard(self)
+            self.slot = None
+        self.wheel.count -= 1
+
+
+class PeriodicCall(object):
+    """Handle of a method called periodically by a TimerWheel.
+    """
+
+    def __init__(self, group, method, args):
+        self.group = group
+        self.method = method
+        self.args = args
+
+    def active(self):
+        return self.group is not None
+
+    def cancel(self):
+        """Stops the periodic calls."""
+        if self.group is not None:
+            self.group.remove(self)
+            self.group = None
+
+
+class PeriodicGroup(object):
+    """Periodic calls with the same period, called in a
+    single wakeup of the wheel.
+
+    Attributes
+    ----------
+    members : dictionary
+        PeriodicCall objects of the group, in insertion order
+    period : float
+        seconds between two wakeups
+    start : float
+        time of the first wakeup, the n-th wakeup is at
+        start + n * period
+    """
+
+    def __init__(self, wheel, period):
+        self.wheel = wheel
+        self.period = period
+        self.start = wheel.seconds() + period
+        self.count = 0
+        self.members = dict()
+        self.timer = None
+
+    def add(self, call):
+        self.members[call] = None
+        if self.timer is None:
+            self.timer = self.wheel.call_at(self.start + self.count * self.period, self.run)
+
+    def remove(self, call):
+        self.members.pop(call, None)
+        if not self.members:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            self.wheel.groups.pop(self.period, None)
+
+    def run(self):
+        self.timer = None
+        # drift-free: the next wakeup follows the start of the
+        # group, late wakeups skip the periods already gone.
+        now = self.wheel.seconds()
+        self.count = max(self.count + 1,
+                         int(math.floor((now - self.start) / self.period)) + 1)
+        for call in list(self.members):
+            if call.group is self:
+                self.wheel.invoke(call.method, call.args)
+        if self.members and self.timer is None:
+            self.timer = self.wheel.call_at(self.start + self.count * self.period, self.run)
+
+
+class TimerWheel(object):
+    """Hierarchical timer wheel driven by the reactor.
+
+    Attributes
+    ----------
+    clock : IReactorTime
+        reactor, or another clock, used to read the time and
+        to schedule the wakeups of the wheel
+    count : int
+        number of active timers
+    groups : dictionary
+        keys: period and values: PeriodicGroup
+    resolution : float
+        seconds of a tick, timers run in the first tick after
+        their time
+    """
+
+    def __init__(self, resolution=0.01, clock=None):
+        self.clock = clock if clock is not None else reactor
+        self.resolution = resolution
+        self.origin = self.clock.seconds()
+        self.current = 0
+        self.count = 0
+        self.levels = [[set() for _ in range(SLOTS)] for _ in range(LEVELS)]
+        self.overflow = set()
+        self.groups = dict()
+        self.wakeup = None
+        self.wakeup_tick = None
+
+    def seconds(self):
+        return self.clock.seconds()
+
+    def call_later(self, delay, method, *args):
+        """Calls method(*args) after delay seconds.
+
+        Returns
+        -------
+        Timer
+            handle that cancels the call
+        """
+        return self.call_at(self.clock.seconds() + delay, method, *args)
+
+    def call_at(self, when, method, *args):
+        """Calls method(*args) at a reactor time.
+
+        Returns
+        -------
+        Timer
+            handle that cancels the call
+        """
+        if self.count == 0:
+            # the wheel is empty, it does not need to go
+            # through the ticks elapsed since it was last used
+            self.current = max(self.current, self._now_tick())
+        tick = int(math.ceil((when - self.origin) / self.resolution))
+        timer = Timer(self, max(tick, self.current + 1), method, args)
+        self.count += 1
+        self._place(timer)
+        self._schedule_wakeup()
+        return timer
+
+    def call_every(self, period, method, *args):
+        """Calls method(*args) every period seconds, in the same
+        wakeup as the other calls with the same period.
+
+        Returns
+        -------
+        PeriodicCall
+            handle that stops the calls
+        """
+        group = self.groups.get(period)
+        if group is None:
+            group = self.groups[period] = PeriodicGroup(self, period)
+        call = PeriodicCall(group, method, args)
+        group.add(call)
+        return call
+
+    def invoke(self, method, args):
+        try:
+            method(*args)
+        except Exception:
+            log.err()
+
+    def _now_tick(self):
+        return int(math.floor((self.clock.seconds() - self.origin) / self.resolution))
+
+    def _place(self, timer):
+        delta = timer.tick - self.current
+        for level in range(LEVELS):
+            if delta < 1 << (SLOT_BITS * (level + 1)):
+                slot = self.levels[level][(timer.tick >> (SLOT_BITS * level)) & SLOT_MASK]
+                break
+        else:
+            slot = self.overflow
+        slot.add(timer)
+        timer.slot = slot
+
+    def _next_tick(self):
+        """Returns the next tick with timers to run, or the tick
+        in which the first upper level slot with timers is moved
+        down, None when the wheel is empty.
+        """
+        if self.count == 0:
+            return None
+        ticks = list()
+        level0 = self.levels[0]
+        for tick in range(self.current + 1, self.current + SLOTS):
+            if level0[tick & SLOT_MASK]:
+                ticks.append(tick)
+                break
+        for level in range(1, LEVELS):
+            shift = SLOT_BITS * level
+            base = self.current >> shift
+            slots = self.levels[level]
+            for number in range(base + 1, base + SLOTS + 1):
+                if slots[number & SLOT_MASK]:
+                    ticks.append(number << shift)
+                    break
+        if self.overflow:
+            shift = SLOT_BITS * LEVELS
+            ticks.append(((self.current >> shift) + 1) << shift)
+        return min(ticks) if ticks else None
+
+    def _schedule_wakeup(self):
+        tick = self._next_tick()
+        if tick == self.wakeup_tick:
+            return
+        if self.wakeup is not None and self.wakeup.active():
+            self.wakeup.cancel()
+        self.wakeup = None
+        self.wakeup_tick = tick
+        if tick is not None:
+            delay = max(self.origin + tick * self.resolution - self.clock.seconds(), 0.0)
+            self.wakeup = self.clock.callLater(delay, self._advance)
+
+    def _advance(self):
+        woken = self.wakeup_tick
+        self.wakeup = None
+        self.wakeup_tick = None
+        # the wakeup is called at the time of its tick, but the
+        # floor of the elapsed time can round to the tick before
+        target = self._now_tick()
+        if woken is not None:
+            target = max(target, woken)
+        # jumps from one tick with timers to the next, the ticks
+        # in between have nothing to run or to move down
+        while self.count:
+            tick = self._next_tick()
+            if tick is None or tick > target:
+                break
+            self.current = tick
+            self._cascade()
+            slot = self.levels[0][self.current & SLOT_MASK]
+            if slot:
+                timers = list(slot)
+                slot.clear()
+                for timer in timers:
+                    timer.slot = None
+                    if timer.active():
+                        timer.called = True
+                        self.count -= 1
+                        self.invoke(timer.method, timer.args)
+        self.current = max(self.current, target)
+        self._schedule_wakeup()
+
+    def _cascade(self):
+        """Moves down the timers of the upper levels whose
+        slot starts in the current tick, the highest level first.
+        """
+        top = 0
+        while top < LEVELS and not self.current & ((1 << (SLOT_BITS * (top + 1))) - 1):
+            top += 1
+        for level in range(top, 0, -1):
+            if level == LEVELS:
+                slot = self.overflow
+            else:
+                slot = self.levels[level][(self.current >> (SLOT_BITS * level)) & SLOT_MASK]
+            timers = list(slot)
+            slot.clear()
+            for timer in timers:
+                self._place(timer)
+
+
+TIMERS = None
+
+
+def timer_wheel():
+    """Returns the timer wheel shared by the agents of the process."""
+    global TIMERS
+    if TIMERS is None:
+        TIMERS = TimerWheel()
+    return TIMERS
@@ -0,0 +1,202 @@
+"""Framework for Intelligent Agents Development - PADE
+
+The MIT License (MIT)
+
+Copyright (c) 2019 Lucas S Melo
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+Trace Database Module
+---------------------
+
+This Python module writes the trace records received by the
+Sniffer in the messages table of the database. The records are
+buffered and written in batches: every batch is a single
+executemany in one transaction, run in the thread pool of the
+reactor so the agents of the Sniffer process are never blocked
+by the database. Only one batch is written at a time.
+
+The ids of the agents are cached, the agents table is read once
+when the writer starts and then only for the agents not seen yet.
+
+The buffering is implemented by BatchWriter, which is shared with
+the segment files of pade.core.tracestore.
+"""
+
+from twisted.internet import threads
+from twisted.internet.defer import succeed
+from twisted.python import log
+
+from pade.core.tap import TRACE_FIELDS
+from pade.core.timers import timer_wheel
+
+from datetime import datetime
+import threading
+import xml.etree.ElementTree as ET
+
+
+class BatchWriter(object):
+    """Buffers trace records and writes them in batches, one at
+    a time, in the thread pool. Subclasses implement _write.
+
+    Attributes
+    ----------
+    flush_interval : float
+        seconds between the first buffered record and the flush
+    flush_size : int
+        number of buffered records that triggers a flush before
+        flush_interval
+    lock : Lock
+        held while a batch is written, other writers of the same
+        storage, as the retention, hold it too
+    pending : list
+        buffered (agent name, record) tuples
+    written : int
+        number of records written
+    """
+
+    def __init__(self, flush_size=1000, flush_interval=5.0):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.pending = list()
+        self.written = 0
+        self.lock = threading.Lock()
+        self._flush_call = None
+        self._writing = None
+
+    def start(self):
+        """Prepares the writer, called when the Sniffer starts."""
+        return succeed(None)
+
+    def add(self, agent_name, records):
+        """Buffers the records traced by an agent."""
+        self.pending.extend((agent_name, record) for record in records)
+        if len(self.pending) >= self.flush_size:
+            self.flush()
+        elif self._flush_call is None or not self._flush_call.active():
+            self._flush_call = timer_wheel().call_later(self.flush_interval, self.flush)
+
+    def flush(self):
+        """Writes the buffered records in one transaction.
+
+        Returns
+        -------
+        Deferred
+            fired when the records are written, or when the batch
+            being written is done if one is
+        """
+        if self._flush_call is not None and self._flush_call.active():
+            self._flush_call.cancel()
+        self._flush_call = None
+        if self._writing is not None:
+            # the records are written after the current batch
+            return self._writing
+        if not self.pending:
+            return succeed(None)
+        batch = self.pending
+        self.pending = list()
+        self._writing = threads.deferToThread(self._locked_write, batch)
+        self._writing.addErrback(log.err)
+        self._writing.addBoth(self._written)
+        return self._writing
+
+    def _written(self, result):
+        self._writing = None
+        if len(self.pending) >= self.flush_size:
+            self.flush()
+        elif self.pending and (self._flush_call is None or not self._flush_call.active()):
+            self._flush_call = timer_wheel().call_later(self.flush_interval, self.flush)
+        return result
+
+    def _locked_write(self, batch):
+        with self.lock:
+            return self._write(batch)
+
+    def _write(self, batch):
+        """Writes a list of (agent name, record) tuples, runs
+        in the thread pool and returns the number of records
+        written.
+        """
+        raise NotImplementedError
+
+
+class TraceWriter(BatchWriter):
+    """Bulk writer of trace records in the messages table.
+
+    Attributes
+    ----------
+    agent_ids : dictionary
+        keys: agent name and values: id in the agents table
+    """
+
+    def __init__(self, engine, messages, agents, flush_size=1000, flush_interval=5.0):
+        """Init the TraceWriter class
+
+        Parameters
+        ----------
+        engine : Engine
+            SQLAlchemy engine of the database, used in the threads
+        messages : Table
+            table of the messages
+        agents : Table
+            table of the agents
+        flush_size : int, optional
+            records that trigger a flush
+        flush_interval : float, optional
+            seconds that a record waits at most before a flush
+        """
+        super(TraceWriter, self).__init__(flush_size, flush_interval)
+        self.engine = engine
+        self.messages = messages
+        self.agents = agents
+        self.agent_ids = dict()
+
+    def start(self):
+        """Loads the ids of the agents already in the database."""
+        d = threads.deferToThread(self._load_agent_ids, None)
+        d.addErrback(log.err)
+        return d
+
+    # the methods below run in the thread pool
+
+    def _load_agent_ids(self, names):
+        query = self.agents.select()
+        if names is not None:
+            query = query.where(self.agents.c.name.in_(list(names)))
+        with self.engine.connect() as conn:
+            for row in conn.execute(query):
+                self.agent_ids[row['name']] = row['id']
+
+    def _write(self, batch):
+        unknown = set(name for name, _ in batch if name not in self.agent_ids)
+        if unknown:
+            self._load_agent_ids(unknown)
+        rows = list()
+        for agent_name, record in batch:
+            row = dict(zip(TRACE_FIELDS, record))
+            if isinstance(row['content'], ET.Element):
+                row['content'] = ET.tostring(row['content'], encoding='unicode')
+            if row['date'] is None:
+                row['date'] = datetime.now()
+            row['agent_id'] = self.agent_ids.get(agent_name)
+            rows.append(row)
+        with self.engine.begin() as conn:
+            conn.execute(self.messages.insert(), rows)
+        self.written += len(rows)
+        return len(rows)
@@ -0,0 +1,368 @@
+"""Framework for Intelligent Agents Development - PADE
+
+The MIT License (MIT)
+
+Copyright (c) 2019 Lucas S Melo
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+
+Trace Store Module
+------------------
+
+This Python module implements a trace backend for the Sniffer
+made of append-only segment files, an alternative to the messages
+table of the database.
+
+Every segment has two files. The .cols file is a sequence of
+compressed blocks, one for each batch written by the Sniffer, and
+each block keeps the records by column. The contents are stored
+apart, in compressed blocks of the .content file, and the records
+only keep a reference to them. A segment is closed when it has
+segment_records records or spans segment_seconds seconds.
+
+The index keeps, for every segment, its time range, the agents
+that sent its messages and the time range of each block, so a
+query only reads the blocks of the segments that match it. The
+entry of a closed segment never changes, it is written once in
+the .index.json file of the segment. Only the entry of the open
+segment is rewritten after every block, in the index.json file
+of the directory.
+
+The Sniffer uses this backend when it is given a directory, for
+instance with the PADE_TRACE_DIR environment variable.
+"""
+
+from pade.core.tap import TRACE_FIELDS
+from pade.core.tracedb import BatchWriter
+
+from datetime import datetime
+import json
+import os
+import pickle
+import time
+import zlib
+
+
+TRACE_DIR_ENV = 'PADE_TRACE_DIR'
+INDEX_FILE = 'index.json'
+SEGMENT_INDEX = '.index.json'
+COLUMNS = ('timestamp', 'agent', 'sender', 'receivers', 'performative',
+           'protocol', 'conversation_id', 'message_id', 'ontology',
+           'language', 'content_ref')
+
+
+def timestamp(value):
+    """Returns the POSIX time of a datetime, a number is
+    returned as it is and None is the current time.
+    """
+    if value is None:
+        return time.time()
+    if isinstance(value, datetime):
+        return time.mktime(value.timetuple()) + value.microsecond / 1e6
+    return float(value)
+
+
+class Segment(object):
+    """Index entry of a segment.
+
+    Attributes
+    ----------
+    blocks : list
+        [offset, length, content offset, content length, first, last]
+        of each block of the segment
+    count : int
+        number of records
+    first : float
+        timestamp of the oldest record
+    last : float
+        timestamp of the newest record
+    senders : set
+        senders of the records
+    """
+
+    def __init__(self, name, first=None, last=None, count=0, senders=(), blocks=()):
+        self.name = name
+        self.first = first
+        self.last = last
+        self.count = count
+        self.senders = set(senders)
+        self.blocks = [list(block) for block in blocks]
+
+    def to_dict(self):
+        return {'name': self.name, 'first': self.first, 'last': self.last,
+                'count': self.count, 'senders': sorted(self.senders),
+                'blocks': self.blocks}
+
+    def overlaps(self, start, end):
+        if self.first is None:
+            return False
+        return (start is None or self.last >= start) and \
+               (end is None or self.first <= end)
+
+
+class SegmentTraceStore(object):
+    """Directory of segment files.
+
+    The methods of this class do blocking file operations, the
+    Sniffer calls them in the thread pool.
+
+    Attributes
+    ----------
+    directory : str
+        directory of the segments
+    segments : list
+        Segment objects, the last one is open
+    segment_records : int
+        records after which a segment is closed
+    segment_seconds : float
+        time span after which a segment is closed
+    """
+
+    def __init__(self, directory, segment_records=100000, segment_seconds=3600.0,
+                 compression=6):
+        self.directory = directory
+        self.segment_records = segment_records
+        self.segment_seconds = segment_seconds
+        self.compression = compression
+        self.segments = list()
+        # same segments as segments, by name
+        self._by_name = dict()
+        self._content_cache = (None, None)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._load_index()
+
+    def path(self, segment, extension):
+        return os.path.join(self.directory, segment.name + extension)
+
+    def append(self, rows, contents):
+        """Appends a block to the open segment.
+
+        Parameters
+        ----------
+        rows : dictionary
+            keys: name in COLUMNS, except content_ref, and values:
+            list with the values of the records
+        contents : list
+            contents of the records
+        """
+        count = len(contents)
+        if not count:
+            return
+        times = rows['timestamp']
+        first, last = min(times), max(times)
+        segment = self._open_segment(first)
+        data = zlib.compress(pickle.dumps(rows, pickle.HIGHEST_PROTOCOL),
+                             self.compression)
+        content_data = zlib.compress(pickle.dumps(contents, pickle.HIGHEST_PROTOCOL),
+                                     self.compression)
+        offset = self._append_file(self.path(segment, '.cols'), data)
+        content_offset = self._append_file(self.path(segment, '.content'), content_data)
+        segment.blocks.append([offset, len(data), content_offset, len(content_data),
+                               first, last])
+        segment.count += count
+        segment.first = first if segment.first is None else min(segment.first, first)
+        segment.last = last if segment.last is None else max(segment.last, last)
+        # messages of agents unknown to the database have no agent
+        segment.senders.update(name for name in rows['agent'] if name is not None)
+        segment.senders.update(name for name in rows['sender'] if name is not None)
+        self._save_index()
+
+    def query(self, start=None, end=None, sender=None):
+        """Yields the records of a time range as dictionaries
+        with keys: COLUMNS, reading only the blocks that match.
+
+        Parameters
+        ----------
+        start : datetime or float, optional
+            oldest timestamp
+        end : datetime or float, optional
+            newest timestamp
+        sender : str, optional
+            name of the sender, or of the agent that traced
+            the message
+        """
+        start = timestamp(start) if start is not None else None
+        end = timestamp(end) if end is not None else None
+        for segment in self.select(start, end, sender):
+            for number, block in enumerate(segment.blocks):
+                if (start is not None and block[5] < start) or \
+                        (end is not None and block[4] > end):
+                    continue
+                rows = self._read_block(segment, block)
+                for i, value in enumerate(rows['timestamp']):
+                    if (start is not None and value < start) or \
+                            (end is not None and value > end):
+                        continue
+                    if sender is not None and sender != rows['sender'][i] and \
+                            sender != rows['agent'][i]:
+                        continue
+                    record = dict((column, rows[column][i]) for column in COLUMNS
+                                  if column != 'content_ref')
+                    record['content_ref'] = (segment.name, number, i)
+                    yield record
+
+    def select(self, start=None, end=None, sender=None):
+        """Returns the segments that may have records of the
+        time range and sender.
+        """
+        start = timestamp(start) if start is not None else None
+        end = timestamp(end) if end is not None else None
+        return [segment for segment in self.segments
+                if segment.overlaps(start, end) and
+                (sender is None or sender in segment.senders)]
+
+    def content(self, content_ref):
+        """Returns the content of a record."""
+        name, number, i = content_ref
+        key = (name, number)
+        cached_key, contents = self._content_cache
+        if cached_key != key:
+            segment = self._segment(name)
+            block = segment.blocks[number]
+            with open(self.path(segment, '.content'), 'rb') as f:
+                f.seek(block[2])
+                contents = pickle.loads(zlib.decompress(f.read(block[3])))
+            self._content_cache = (key, contents)
+        return contents[i]
+
+    def _segment(self, name):
+        return self._by_name[name]
+
+    def _read_block(self, segment, block):
+        with open(self.path(segment, '.cols'), 'rb') as f:
+            f.seek(block[0])
+            return pickle.loads(zlib.decompress(f.read(block[1])))
+
+    def _open_segment(self, first):
+        segment = self.segments[-1] if self.segments else None
+        if segment is None or segment.count >= self.segment_records or \
+                (segment.first is not None and
+                 first - segment.first >= self.segment_seconds):
+            number = len(self.segments) + 1
+            if segment is not None:
+                number = int(segment.name.split('-')[1]) + 1
+                self._save_segment(segment)
+            segment = Segment('segment-{:08d}'.format(number))
+            self._add_segment(segment)
+        return segment
+
+    def _add_segment(self, segment):
+        self.segments.append(segment)
+        self._by_name[segment.name] = segment
+
+    def _append_file(self, path, data):
+        with open(path, 'ab') as f:
+            offset = f.tell()
+            f.write(data)
+        return offset
+
+    def _load_index(self):
+        closed = sorted(name for name in os.listdir(self.directory)
+                        if name.endswith(SEGMENT_INDEX))
+        for name in closed:
+            with open(os.path.join(self.directory, name)) as f:
+                self._add_segment(Segment(**json.load(f)))
+        path = os.path.join(self.directory, INDEX_FILE)
+        if not os.path.exists(path):
+            return
+        with open(path) as f:
+            index = json.load(f)
+        if isinstance(index, list):
+            # index of older versions, with every segment
+            entries = index
+        else:
+            entries = [index['open']] if index['open'] is not None else []
+        for entry in entries:
+            # the index of the directory may be older than the
+            # file of a segment closed before a crash
+            if entry['name'] not in self._by_name:
+                self._add_segment(Segment(**entry))
+        if isinstance(index, list):
+            for segment in self.segments[:-1]:
+                if not os.path.exists(self.path(segment, SEGMENT_INDEX)):
+                    self._save_segment(segment)
+            self._save_index()
+        # blocks written after the last index update are dropped
+        if self.segments and self.segments[-1].blocks:
+            segment = self.segments[-1]
+            block = segment.blocks[-1]
+            self._truncate(self.path(segment, '.cols'), block[0] + block[1])
+            self._truncate(self.path(segment, '.content'), block[2] + block[3])
+
+    def _truncate(self, path, size):
+        if os.path.exists(path) and os.path.getsize(path) > size:
+            with open(path, 'r+b') as f:
+                f.truncate(size)
+
+    def _save_index(self):
+        segment = self.segments[-1] if self.segments else None
+        self._write_json(os.path.join(self.directory, INDEX_FILE),
+                         {'open': segment.to_dict() if segment is not None else None})
+
+    def _save_segment(self, segment):
+        self._write_json(self.path(segment, SEGMENT_INDEX), segment.to_dict())
+
+    def _write_json(self, path, value):
+        with open(path + '.tmp', 'w') as f:
+            json.dump(value, f)
+        os.replace(path + '.tmp', path)
+
+
+class SegmentTraceWriter(BatchWriter):
+    """Bulk writer of trace records in segment files.
+
+    Attributes
+    ----------
+    store : SegmentTraceStore
+        segment files of the traces
+    """
+
+    def __init__(self, directory, flush_size=1000, flush_interval=5.0, **options):
+        """Init the SegmentTraceWriter class
+
+        Parameters
+        ----------
+        directory : str
+            directory of the segments
+        flush_size : int, optional
+            records that trigger a flush
+        flush_interval : float, optional
+            seconds that a record waits at most before a flush
+        options : dictionary
+            segment_records, segment_seconds and compression
+            of the SegmentTraceStore
+        """
+        super(SegmentTraceWriter, self).__init__(flush_size, flush_interval)
+        self.store = SegmentTraceStore(directory, **options)
+
+    def _write(self, batch):
+        rows = dict((column, list()) for column in COLUMNS if column != 'content_ref')
+        contents = list()
+        for agent_name, record in batch:
+            values = dict(zip(TRACE_FIELDS, record))
+            rows['timestamp'].append(timestamp(values['date']))
+            rows['agent'].append(agent_name)
+            for column in ('sender', 'receivers', 'performative', 'protocol',
+                           'conversation_id', 'message_id', 'ontology', 'language'):
+                rows[column].append(values[column])
+            contents.append(values['content'])
+        self.store.append(rows, contents)
+        self.written += len(contents)
+        return len(contents)
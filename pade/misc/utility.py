@@ -25,6 +25,7 @@ THE SOFTWARE.
 
 from twisted.internet import reactor, threads
 from twisted.internet.endpoints import TCP4ServerEndpoint
+from pade.core.runtime import THREAD_POOL_SIZE, shard_agents, listen_unix
 # import pade.core.agent as N
 
 from datetime import datetime
@@ -70,9 +71,13 @@ def call_from_thread(method, *args):
 
 
 def start_loop(agents):
-    """Start reactor thread main loop"""
-    reactor.suggestThreadPoolSize(1)
-    for agent in agents:
+    """Start reactor thread main loop
+
+    In a worker of a sharded runtime only the shard of
+    the agents assigned to the process is started.
+    """
+    reactor.suggestThreadPoolSize(THREAD_POOL_SIZE)
+    for agent in shard_agents(agents):
         agent.update_ams(agent.ams)
         agent.on_start()
         endpoint = TCP4ServerEndpoint(reactor, agent.aid.port)
@@ -80,6 +85,7 @@ def start_loop(agents):
         # node.listen()
         endpoint.listen(agent.agentInstance)
         ILP = reactor.listenTCP(agent.aid.port, agent.agentInstance)
+        listen_unix(agent)
         agent.ILP = endpoint
     reactor.run()
 
@@ -0,0 +1,93 @@
+"""Fixtures shared by the tests of the PADE modules.
+
+The scripts of the v1 directory start agents and need a running
+AMS, they are not collected.
+"""
+
+from twisted.internet import task
+from twisted.internet.testing import MemoryReactorClock
+
+from pade.core import timers
+
+from sqlalchemy import (Column, DateTime, ForeignKey, Integer, MetaData, String,
+                        Table, create_engine)
+from sqlalchemy.pool import StaticPool
+
+import pytest
+
+
+collect_ignore = ['v1']
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Installs a timer wheel driven by a task.Clock as the
+    wheel of the process and returns the clock."""
+    clock = task.Clock()
+    monkeypatch.setattr(timers, 'TIMERS', timers.TimerWheel(clock=clock))
+    return clock
+
+
+@pytest.fixture
+def memory_reactor(monkeypatch):
+    """Replaces the reactor of the connection pool and of the
+    send scheduler by a MemoryReactorClock."""
+    from pade.core import pool, scheduler
+    reactor = MemoryReactorClock()
+    monkeypatch.setattr(pool, 'reactor', reactor)
+    monkeypatch.setattr(scheduler, 'reactor', reactor)
+    return reactor
+
+
+class TraceDatabase(object):
+    """In-memory sqlite database with the tables written by the
+    Sniffer, shared by the threads of the writers."""
+
+    def __init__(self):
+        self.engine = create_engine('sqlite://', poolclass=StaticPool,
+                                    connect_args={'check_same_thread': False})
+        metadata = MetaData()
+        self.agents = Table('agents', metadata,
+                            Column('id', Integer, primary_key=True),
+                            Column('session_id', Integer),
+                            Column('name', String(64), unique=True),
+                            Column('date', DateTime),
+                            Column('state', String(64)))
+        self.messages = Table('messages', metadata,
+                              Column('id', Integer, primary_key=True),
+                              Column('agent_id', Integer, ForeignKey('agents.id')),
+                              Column('conversation_id', String(64)),
+                              Column('message_id', String(64)),
+                              Column('date', DateTime),
+                              Column('performative', String(64)),
+                              Column('protocol', String(64)),
+                              Column('sender', String(64)),
+                              Column('receivers', String),
+                              Column('content', String),
+                              Column('ontology', String),
+                              Column('language', String))
+        self.aggregates = Table('message_aggregates', metadata,
+                                Column('id', Integer, primary_key=True),
+                                Column('minute', DateTime),
+                                Column('sender', String(64)),
+                                Column('performative', String(64)),
+                                Column('protocol', String(64)),
+                                Column('count', Integer))
+        self.agents.create(self.engine)
+        self.messages.create(self.engine)
+
+    def add_agent(self, name):
+        with self.engine.begin() as conn:
+            return conn.execute(self.agents.insert().values(name=name)).inserted_primary_key[0]
+
+    def rows(self, table=None, order_by=None):
+        table = self.messages if table is None else table
+        query = table.select().order_by(table.c.id if order_by is None else order_by)
+        with self.engine.connect() as conn:
+            return conn.execute(query).fetchall()
+
+
+@pytest.fixture
+def trace_database():
+    """Returns a TraceDatabase."""
+    return TraceDatabase()
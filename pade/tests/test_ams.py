@@ -0,0 +1,61 @@
+from pade.acl.aid import AID
+from pade.core.directory import AgentDirectory
+from pade.core.liveness import LivenessMonitor
+from pade.core.registry import AgentRegistry
+
+import pytest
+
+# the AMS imports the web interface and its dependencies
+pytest.importorskip('pagan')
+from pade.core.new_ams import AMS
+
+
+class Factory(object):
+
+    def __init__(self):
+        self.table = AgentDirectory()
+
+
+class Publisher(object):
+
+    def __init__(self):
+        self.subscribers = set()
+        self.notified = 0
+
+    def schedule_notify(self):
+        self.notified += 1
+
+
+class FakeAMS(object):
+    """State of the AMS used by agent_failed."""
+
+    agent_failed = AMS.agent_failed
+
+    def __init__(self):
+        self.aid = AID('ams@localhost:8000')
+        self.agentInstance = Factory()
+        self.registry = AgentRegistry(self)
+        self.liveness = LivenessMonitor(self.agent_failed)
+        self.comport_ident = Publisher()
+
+
+def test_failed_agent_is_removed_and_announced(clock):
+    ams = FakeAMS()
+    aid = AID('a@localhost:2000')
+    ams.registry.register(aid)
+    ams.comport_ident.subscribers.add(aid)
+    ams.liveness.watch(aid.name)
+
+    ams.agent_failed(aid.name)
+    assert aid.name not in ams.registry.directory
+    assert ams.comport_ident.subscribers == set()
+    assert ams.comport_ident.notified == 1
+    assert aid.name not in ams.liveness
+
+
+def test_agent_that_is_not_registered_is_only_forgotten(clock):
+    ams = FakeAMS()
+    ams.liveness.watch('a@localhost:2000')
+    ams.agent_failed('a@localhost:2000')
+    assert 'a@localhost:2000' not in ams.liveness
+    assert ams.comport_ident.notified == 0
@@ -0,0 +1,87 @@
+from pade.acl.aid import AID
+from pade.acl.codec import (CODECS, BinaryCodec, CodecError, PickleCodec,
+                            decode, encode)
+from pade.acl.messages import ACLMessage
+
+from datetime import datetime
+import xml.etree.ElementTree as ET
+
+import pytest
+
+
+def build_message(content):
+    message = ACLMessage(ACLMessage.REQUEST)
+    message.set_protocol(ACLMessage.FIPA_REQUEST_PROTOCOL)
+    message.set_conversation_id('conversation')
+    message.set_ontology('ontology')
+    message.set_sender(AID('sender@localhost:2000'))
+    message.add_receiver(AID('first@localhost:2001'))
+    message.add_receiver(AID('second@localhost:2002'))
+    message.reply_to.append(AID('other@localhost:2003'))
+    message.set_datetime(datetime(2020, 5, 17, 10, 30, 15, 123456))
+    message.set_content(content)
+    return message
+
+
+@pytest.mark.parametrize('content', ['texto com acentuação', b'\x00\x01', {'key': [1, 2]}, None])
+def test_binary_round_trip(content):
+    message = build_message(content)
+    data = encode(message)
+    assert data[0] == BinaryCodec.codec_id
+    decoded = decode(data)
+    assert decoded.performative == ACLMessage.REQUEST
+    assert decoded.protocol == ACLMessage.FIPA_REQUEST_PROTOCOL
+    assert decoded.conversation_id == 'conversation'
+    assert decoded.ontology == 'ontology'
+    assert decoded.sender.name == 'sender@localhost:2000'
+    assert [r.name for r in decoded.receivers] == ['first@localhost:2001',
+                                                   'second@localhost:2002']
+    assert [r.name for r in decoded.reply_to] == ['other@localhost:2003']
+    assert decoded.datetime == datetime(2020, 5, 17, 10, 30, 15, 123456)
+    assert decoded.content == content
+    assert decoded.language is None
+
+
+def test_xml_content():
+    element = ET.Element('value', attrib={'unit': 'kW'})
+    element.text = '10'
+    decoded = decode(encode(build_message(element)))
+    assert decoded.content.tag == 'value'
+    assert decoded.content.get('unit') == 'kW'
+    assert decoded.content.text == '10'
+
+
+def test_system_message_flag():
+    message = build_message('x')
+    message.set_system_message(True)
+    assert decode(encode(message)).system_message
+
+
+def test_fallback_to_pickle():
+    message = build_message('x')
+    message.set_ontology(42)
+    data = encode(message)
+    assert data[0] == PickleCodec.codec_id
+    assert decode(data).ontology == 42
+
+
+def test_fallback_to_pickle_for_many_receivers():
+    message = build_message('x')
+    for i in range(0x10000):
+        message.receivers.append(AID('agent{}@localhost:2000'.format(i)))
+    data = encode(message)
+    assert data[0] == PickleCodec.codec_id
+    assert len(decode(data).receivers) == 0x10002
+
+
+def test_pickle_codec():
+    data = encode(build_message('x'), CODECS[PickleCodec.codec_id])
+    assert data[0] == PickleCodec.codec_id
+    assert decode(data).content == 'x'
+
+
+def test_unknown_codec():
+    with pytest.raises(CodecError):
+        decode(b'\xff')
+    with pytest.raises(CodecError):
+        decode(b'')
@@ -0,0 +1,149 @@
+from pade.acl.aid import AID
+from pade.acl.messages import ACLMessage
+from pade.behaviours import contract_net
+from pade.behaviours.contract_net import (BatchedContractNetProtocol, ProposalTable,
+                                          best_indexes, highest_bid, lowest_bid)
+
+import pytest
+
+
+@pytest.fixture(params=['numpy', 'lists'])
+def columns(request, monkeypatch):
+    """Runs the test with the NumPy columns and with the
+    Python lists used when NumPy is not installed."""
+    if request.param == 'numpy':
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(contract_net, 'numpy', None)
+    return request.param
+
+
+class Agent(object):
+
+    def __init__(self):
+        self.aid = AID('initiator@localhost:2000')
+        self.debug = False
+        self.sent = list()
+
+    def send(self, message):
+        self.sent.append(message)
+
+
+class Initiator(BatchedContractNetProtocol):
+
+    def __init__(self, *args, **kwargs):
+        super(Initiator, self).__init__(*args, **kwargs)
+        self.results = list()
+
+    def handle_winners(self, winners, table):
+        self.results.append([message.sender.name for message in winners])
+
+
+def participants(count):
+    return ['p{}@localhost:{}'.format(i, 3000 + i) for i in range(count)]
+
+
+def cfp(receivers):
+    message = ACLMessage(ACLMessage.CFP)
+    message.set_protocol(ACLMessage.FIPA_CONTRACT_NET_PROTOCOL)
+    for receiver in receivers:
+        message.add_receiver(AID(receiver))
+    return message
+
+
+def answer(message, sender, bid=None):
+    reply = message.create_reply()
+    reply.set_sender(AID(sender))
+    if bid is None:
+        reply.set_performative(ACLMessage.REFUSE)
+    else:
+        reply.set_performative(ACLMessage.PROPOSE)
+        reply.set_content(bid)
+    return reply
+
+
+def answers(agent, performative):
+    return [[r.name for r in message.receivers]
+            for message in agent.sent if message.performative == performative]
+
+
+def test_proposal_table(columns):
+    table = ProposalTable()
+    message = answer(cfp([]), 'a@localhost:2001', '1')
+    table.add(message, 2.5)
+    table.add(message, 1.0)
+    assert len(table) == 2
+    assert list(table.values) == [2.5, 1.0]
+    assert type(table.values) is (list if columns == 'lists' else contract_net.numpy.ndarray)
+
+
+def test_scoring_functions(columns):
+    assert list(highest_bid([1.0, 3.0, 2.0])) == [1.0, 3.0, 2.0]
+    assert list(lowest_bid([1.0, 3.0, 2.0])) == [-1.0, -3.0, -2.0]
+
+
+def test_best_indexes(columns):
+    scores = [5.0, 1.0, 9.0, 3.0, 7.0]
+    assert best_indexes(scores, 1) == [2]
+    assert best_indexes(scores, 3) == [2, 4, 0]
+    assert best_indexes(scores, 10) == [2, 4, 0, 3, 1]
+    assert best_indexes(lowest_bid(scores), 2) == [1, 3]
+    assert best_indexes(scores, 0) == []
+    assert best_indexes([], 2) == []
+
+
+def test_round_answers_with_one_accept_and_one_reject(clock, columns):
+    agent = Agent()
+    names = participants(6)
+    message = cfp(names)
+    protocol = Initiator(agent, message, winners=2)
+    protocol.on_start()
+    assert agent.sent == [message]
+
+    bids = ['4', '9', None, '1', 'not a number', '7']
+    for name, bid in zip(names, bids):
+        protocol.execute(answer(message, name, bid))
+
+    assert answers(agent, ACLMessage.ACCEPT_PROPOSAL) == [[names[1], names[5]]]
+    assert answers(agent, ACLMessage.REJECT_PROPOSAL) == [[names[0], names[3]]]
+    assert len(agent.sent) == 3
+    assert protocol.results == [[names[1], names[5]]]
+    for sent in agent.sent[1:]:
+        assert sent.conversation_id == message.conversation_id
+
+
+def test_lowest_bid_round_ends_by_its_deadline(clock, columns):
+    agent = Agent()
+    names = participants(4)
+    message = cfp(names)
+    protocol = Initiator(agent, scoring=lowest_bid)
+    protocol.open_round(message)
+    protocol.execute(answer(message, names[0], '5'))
+    protocol.execute(answer(message, names[1], '2'))
+    protocol.execute(answer(message, names[2], '8'))
+    clock.advance(protocol.timeout + 0.2)
+
+    assert answers(agent, ACLMessage.ACCEPT_PROPOSAL) == [[names[1]]]
+    assert answers(agent, ACLMessage.REJECT_PROPOSAL) == [[names[0], names[2]]]
+    assert protocol.results == [[names[1]]]
+
+
+def test_rounds_are_answered_separately(clock, columns):
+    agent = Agent()
+    first = cfp(participants(2))
+    second = cfp(participants(2))
+    protocol = Initiator(agent)
+    protocol.open_round(first)
+    protocol.open_round(second)
+    names = participants(2)
+
+    protocol.execute(answer(first, names[0], '1'))
+    protocol.execute(answer(second, names[0], '3'))
+    protocol.execute(answer(second, names[1], '2'))
+    protocol.execute(answer(first, names[1], '4'))
+
+    assert protocol.results == [[names[0]], [names[1]]]
+    accepts = [m for m in agent.sent if m.performative == ACLMessage.ACCEPT_PROPOSAL]
+    assert [m.conversation_id for m in accepts] == \
+        [second.conversation_id, first.conversation_id]
+    assert len(agent.sent) == 4
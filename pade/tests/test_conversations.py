@@ -0,0 +1,166 @@
+from pade.acl.aid import AID
+from pade.acl.messages import ACLMessage
+from pade.behaviours.conversations import ConversationStore
+from pade.behaviours.protocols import FipaContractNetProtocol
+
+
+class Agent(object):
+
+    def __init__(self):
+        self.aid = AID('initiator@localhost:2000')
+        self.debug = False
+        self.sent = list()
+
+    def send(self, message):
+        self.sent.append(message)
+
+
+class Initiator(FipaContractNetProtocol):
+
+    def __init__(self, agent, message=None):
+        super(Initiator, self).__init__(agent, message, is_initiator=True)
+        self.answers = list()
+        self.rounds = list()
+
+    def handle_propose(self, message):
+        super(Initiator, self).handle_propose(message)
+        self.answers.append(message.content)
+
+    def handle_refuse(self, message):
+        super(Initiator, self).handle_refuse(message)
+        self.answers.append(message.content)
+
+    def handle_all_proposes(self, proposes):
+        super(Initiator, self).handle_all_proposes(proposes)
+        self.rounds.append([message.content for message in proposes])
+
+
+def cfp(*receivers):
+    message = ACLMessage(ACLMessage.CFP)
+    message.set_protocol(ACLMessage.FIPA_CONTRACT_NET_PROTOCOL)
+    for receiver in receivers:
+        message.add_receiver(AID(receiver))
+    return message
+
+
+def answer(message, performative, content):
+    reply = message.create_reply()
+    reply.set_performative(performative)
+    reply.set_content(content)
+    return reply
+
+
+def test_open_and_close(clock):
+    expired = list()
+    store = ConversationStore(expired.append)
+    conversation = store.open('c1', expected=2, timeout=1.0)
+    assert 'c1' in store and len(store) == 1
+    assert store.get('c1') is conversation
+    assert conversation.deadline == 1.0
+    assert not conversation.complete()
+    conversation.received = 2
+    assert conversation.complete()
+
+    assert store.close('c1') is conversation
+    assert store.close('c1') is None
+    assert store.slots == {}
+    clock.advance(2.0)
+    assert expired == []
+    assert not clock.getDelayedCalls()
+
+
+def test_conversations_expire_with_their_slot(clock):
+    expired = list()
+    store = ConversationStore(expired.append, resolution=0.5)
+    first = store.open('c1', timeout=1.1)
+    second = store.open('c2', timeout=1.3)
+    store.open('c3', timeout=3.0)
+    store.open('c4')
+    # both deadlines fall in the same slot, one timer is used
+    assert first.slot == second.slot
+    assert len(store.slots) == 2
+
+    clock.advance(1.0)
+    assert expired == []
+    clock.advance(0.6)
+    assert expired == [first, second]
+    assert sorted(store.conversations) == ['c3', 'c4']
+    clock.advance(2.0)
+    assert [c.conversation_id for c in expired] == ['c1', 'c2', 'c3']
+    assert list(store.conversations) == ['c4']
+
+
+def test_opening_again_replaces_the_deadline(clock):
+    expired = list()
+    store = ConversationStore(expired.append)
+    store.open('c1', timeout=1.0)
+    conversation = store.open('c1', timeout=5.0)
+    clock.advance(2.0)
+    assert expired == []
+    clock.advance(3.2)
+    assert expired == [conversation]
+
+
+def test_clear_does_not_expire(clock):
+    expired = list()
+    store = ConversationStore(expired.append)
+    store.open('c1', timeout=1.0)
+    store.open('c2', timeout=2.0)
+    store.clear()
+    clock.advance(3.0)
+    assert expired == []
+    assert len(store) == 0
+
+
+def test_round_ends_when_every_receiver_answers(clock):
+    agent = Agent()
+    message = cfp('a@localhost:2001', 'b@localhost:2002')
+    protocol = Initiator(agent, message)
+    protocol.on_start()
+    assert agent.sent == [message]
+
+    protocol.execute(answer(message, ACLMessage.PROPOSE, 'a'))
+    assert protocol.rounds == []
+    protocol.execute(answer(message, ACLMessage.REFUSE, 'b'))
+    assert protocol.rounds == [['a', 'b']]
+    assert len(protocol.conversations) == 0
+    clock.advance(protocol.timeout + 1.0)
+    assert protocol.rounds == [['a', 'b']]
+
+
+def test_round_times_out_with_the_answers_received(clock):
+    agent = Agent()
+    protocol = Initiator(agent)
+    first = cfp('a@localhost:2001', 'b@localhost:2002')
+    second = cfp('c@localhost:2003')
+    protocol.open_round(first)
+    clock.advance(1.0)
+    protocol.open_round(second)
+
+    protocol.execute(answer(first, ACLMessage.PROPOSE, 'a'))
+    clock.advance(protocol.timeout - 1.0 + 0.2)
+    assert protocol.rounds == [['a']]
+    assert len(protocol.conversations) == 1
+
+    clock.advance(1.0)
+    assert protocol.rounds == [['a'], []]
+
+
+def test_answers_of_closed_rounds_reach_the_handler(clock):
+    agent = Agent()
+    protocol = Initiator(agent)
+    message = cfp('a@localhost:2001', 'b@localhost:2002')
+    protocol.open_round(message)
+    clock.advance(protocol.timeout + 0.2)
+    assert protocol.rounds == [[]]
+
+    # a late answer is handled, the expired round is not ended again
+    protocol.execute(answer(message, ACLMessage.PROPOSE, 'late'))
+    assert protocol.answers == ['late']
+    assert protocol.rounds == [[]]
+
+    # as the answers of a CFP sent without open_round
+    other = cfp('c@localhost:2003')
+    protocol.execute(answer(other, ACLMessage.REFUSE, 'other'))
+    assert protocol.answers == ['late', 'other']
+    assert protocol.rounds == [[]]
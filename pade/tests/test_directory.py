@@ -0,0 +1,79 @@
+from pade.acl.aid import AID
+from pade.core.directory import DELTA, SNAPSHOT, AgentDirectory
+
+import pickle
+
+
+def aid(name):
+    return AID(name)
+
+
+def build_directory():
+    names = ['ams@localhost:8000', 'machine_1@localhost:2001',
+             'machine_2@localhost:2002', 'meter@localhost:2003']
+    return AgentDirectory((name, aid(name)) for name in names)
+
+
+def test_resolve_by_full_and_local_name():
+    directory = build_directory()
+    assert directory.resolve(aid('meter@localhost:2003')).port == 2003
+    assert directory.resolve(AID(name='meter@otherhost:9999')).port == 2003
+    assert directory.resolve(AID(name='missing@localhost:1')) is None
+
+
+def test_index_follows_the_dictionary():
+    directory = build_directory()
+    del directory['meter@localhost:2003']
+    assert directory.lookup('meter') == []
+    directory.pop('machine_2@localhost:2002')
+    directory['meter@otherhost:3000'] = aid('meter@otherhost:3000')
+    assert [a.name for a in directory.lookup('meter')] == ['meter@otherhost:3000']
+    assert [a.localname for a in directory.with_prefix('machine')] == ['machine_1']
+    directory.clear()
+    assert directory.with_prefix('') == []
+
+
+def test_prefix_and_wildcard_searches():
+    directory = build_directory()
+    assert sorted(a.localname for a in directory.with_prefix('machine_')) == \
+        ['machine_1', 'machine_2']
+    assert sorted(a.localname for a in directory.match('m*@localhost:200[13]')) == \
+        ['machine_1', 'meter']
+
+
+def test_pickled_directory_rebuilds_its_index():
+    directory = pickle.loads(pickle.dumps(build_directory()))
+    assert isinstance(directory, AgentDirectory)
+    assert directory.resolve(AID(name='meter')).port == 2003
+
+
+def test_deltas_and_snapshots():
+    directory = AgentDirectory()
+    snapshot = {'ref': SNAPSHOT, 'version': 3,
+                'table': {'a@localhost:1': aid('a@localhost:1')}}
+    assert directory.apply(snapshot)
+    assert directory.version == 3
+
+    delta = {'ref': DELTA, 'base': 3, 'version': 4,
+             'added': {'b@localhost:2': aid('b@localhost:2')},
+             'removed': ['a@localhost:1']}
+    assert directory.apply(delta)
+    assert list(directory) == ['b@localhost:2']
+    assert directory.version == 4
+
+    # a delta already applied is ignored
+    assert directory.apply(delta)
+    assert directory.version == 4
+
+    # a gap asks for a snapshot and keeps the table
+    gap = {'ref': DELTA, 'base': 6, 'version': 7,
+           'added': {'c@localhost:3': aid('c@localhost:3')}, 'removed': []}
+    assert not directory.apply(gap)
+    assert list(directory) == ['b@localhost:2']
+
+
+def test_plain_table_replaces_the_directory():
+    directory = build_directory()
+    assert directory.apply({'x@localhost:1': aid('x@localhost:1')})
+    assert list(directory) == ['x@localhost:1']
+    assert directory.resolve(AID(name='meter')) is None
@@ -0,0 +1,90 @@
+from pade.acl.messages import ACLMessage
+from pade.behaviours.dispatch import BehaviourDispatcher
+
+
+class Behaviour(object):
+
+    message_filter = None
+
+    def __init__(self, name, keys=None):
+        self.name = name
+        self.keys = keys
+
+    def dispatch_keys(self):
+        return self.keys
+
+    def __repr__(self):
+        return self.name
+
+
+def build_message(performative, protocol=None, conversation_id=None):
+    message = ACLMessage(performative)
+    if protocol is not None:
+        message.set_protocol(protocol)
+    if conversation_id is not None:
+        message.set_conversation_id(conversation_id)
+    return message
+
+
+REQUEST = ACLMessage.FIPA_REQUEST_PROTOCOL
+SUBSCRIBE = ACLMessage.FIPA_SUBSCRIBE_PROTOCOL
+
+
+def build_dispatcher():
+    return BehaviourDispatcher([
+        Behaviour('catch_all'),
+        Behaviour('request', [(REQUEST, ACLMessage.REQUEST, None),
+                              (REQUEST, ACLMessage.INFORM, None)]),
+        Behaviour('subscribe', [(SUBSCRIBE, None, None)]),
+        Behaviour('conversation', [(None, None, 'c1')]),
+    ])
+
+
+def names(behaviours):
+    return [b.name for b in behaviours]
+
+
+def test_messages_go_to_the_indexed_behaviours_in_order():
+    dispatcher = build_dispatcher()
+    assert names(dispatcher.dispatch(build_message(ACLMessage.REQUEST, REQUEST))) == \
+        ['catch_all', 'request']
+    assert names(dispatcher.dispatch(build_message(ACLMessage.AGREE, SUBSCRIBE, 'c1'))) == \
+        ['catch_all', 'subscribe', 'conversation']
+    assert names(dispatcher.dispatch(build_message(ACLMessage.AGREE, REQUEST))) == \
+        ['catch_all']
+
+
+def test_list_changes_update_the_index():
+    dispatcher = build_dispatcher()
+    dispatcher.remove(dispatcher[1])
+    assert names(dispatcher.dispatch(build_message(ACLMessage.REQUEST, REQUEST))) == \
+        ['catch_all']
+    dispatcher.insert(0, Behaviour('first', [(REQUEST, None, None)]))
+    assert names(dispatcher.dispatch(build_message(ACLMessage.REQUEST, REQUEST))) == \
+        ['first', 'catch_all']
+    dispatcher += [Behaviour('last', [(REQUEST, None, None)])]
+    assert names(dispatcher.dispatch(build_message(ACLMessage.REQUEST, REQUEST))) == \
+        ['first', 'catch_all', 'last']
+
+
+def test_reindex_after_the_keys_change():
+    dispatcher = build_dispatcher()
+    behaviour = dispatcher[2]
+    behaviour.keys = [(REQUEST, None, None)]
+    dispatcher.reindex()
+    assert names(dispatcher.dispatch(build_message(ACLMessage.REQUEST, REQUEST))) == \
+        ['catch_all', 'request', 'subscribe']
+
+
+def test_message_filter_is_checked():
+
+    class Filter(object):
+        def filter(self, message):
+            return message.conversation_id == 'yes'
+
+    filtered = Behaviour('filtered', [(REQUEST, None, None)])
+    filtered.message_filter = Filter()
+    dispatcher = BehaviourDispatcher([filtered])
+    assert names(dispatcher.dispatch(build_message(ACLMessage.REQUEST, REQUEST, 'no'))) == []
+    assert names(dispatcher.dispatch(build_message(ACLMessage.REQUEST, REQUEST, 'yes'))) == \
+        ['filtered']
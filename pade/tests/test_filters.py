@@ -0,0 +1,90 @@
+from pade.acl.aid import AID
+from pade.acl.filters import Filter
+from pade.acl.messages import ACLMessage
+
+import pytest
+
+
+def build_message(performative=ACLMessage.REQUEST, sender='john@localhost:2000',
+                  content='x'):
+    message = ACLMessage(performative)
+    message.set_protocol(ACLMessage.FIPA_REQUEST_PROTOCOL)
+    message.set_sender(AID(sender))
+    message.set_ontology('energy')
+    message.set_content(content)
+    return message
+
+
+def test_fields_sets_and_patterns():
+    f = Filter()
+    f.set_performative([ACLMessage.REQUEST, ACLMessage.INFORM])
+    f.set_ontology('energy')
+    f.set_sender_pattern('john*@*')
+    assert f.filter(build_message())
+    assert f.filter(build_message(ACLMessage.INFORM))
+    assert not f.filter(build_message(ACLMessage.AGREE))
+    assert not f.filter(build_message(sender='mary@localhost:2001'))
+
+    f.set_content_type(dict)
+    assert not f.filter(build_message())
+    assert f.filter(build_message(content={'power': 1}))
+
+
+def test_composite_filters():
+    requests = Filter()
+    requests.set_performative(ACLMessage.REQUEST)
+    johns = Filter()
+    johns.set_sender_pattern('john@*')
+    message = build_message()
+    assert (requests & johns).filter(message)
+    assert not (requests & ~johns).filter(message)
+    assert (~requests | johns).filter(message)
+    assert not (~requests | ~johns)(message)
+
+
+def test_predicates_are_compiled_once():
+    child = Filter()
+    child.set_performative(ACLMessage.REQUEST)
+    other = Filter()
+    composite = ~(child & other) | other
+    composite.filter(build_message())
+    predicate = composite.compile()
+    composite.filter(build_message(ACLMessage.INFORM))
+    assert composite.compile() is predicate
+    assert child.compile() is child.compile()
+
+
+def test_child_changes_discard_the_compiled_predicates():
+    child = Filter()
+    child.set_performative(ACLMessage.REQUEST)
+    composite = ~(child & Filter())
+    message = build_message()
+    assert not composite.filter(message)
+
+    child.set_performative(ACLMessage.INFORM)
+    assert composite.filter(message)
+    child.performative = ACLMessage.REQUEST
+    assert not composite.filter(message)
+
+
+def test_keys():
+    f = Filter()
+    f.set_protocol(ACLMessage.FIPA_REQUEST_PROTOCOL)
+    f.set_performative([ACLMessage.REQUEST, ACLMessage.INFORM])
+    assert sorted(f.keys()) == sorted([
+        (ACLMessage.FIPA_REQUEST_PROTOCOL, ACLMessage.REQUEST, None),
+        (ACLMessage.FIPA_REQUEST_PROTOCOL, ACLMessage.INFORM, None)])
+    assert (f | Filter()).keys() == f.keys() + [(None, None, None)]
+    assert (~f).keys() is None
+
+
+def test_equality_without_hash():
+    first, second = Filter(), Filter()
+    first.set_performative([ACLMessage.REQUEST, ACLMessage.INFORM])
+    second.set_performative([ACLMessage.INFORM, ACLMessage.REQUEST])
+    assert first == second
+    assert (first | Filter()) == (Filter() | second)
+    second.set_ontology('energy')
+    assert first != second
+    with pytest.raises(TypeError):
+        hash(first)
@@ -0,0 +1,154 @@
+import datetime
+import re
+
+import pytest
+
+# the web interface draws the avatars of the agents with pagan
+pytest.importorskip('pagan')
+from pade.core.search import MessageSearchIndex
+from pade.web import flask_server
+from pade.web.flask_server import AgentModel, Message, Session, app, db, parse_date
+
+
+@pytest.fixture
+def client(tmpdir):
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + str(tmpdir.join('pade.sqlite'))
+    app.config['LOGIN_DISABLED'] = True
+    app.config['TESTING'] = True
+    with app.app_context():
+        db.create_all()
+        yield app.test_client()
+        db.session.remove()
+        db.drop_all()
+
+
+def add_session(name, count, sender='a@localhost:2000', date=None):
+    date = date or datetime.datetime(2020, 1, 1, 12, 0)
+    session = Session(name=name, date=date, state='Active')
+    db.session.add(session)
+    db.session.flush()
+    agent = AgentModel(name=sender, session_id=session.id, date=date, state='Active')
+    db.session.add(agent)
+    db.session.flush()
+    for i in range(count):
+        db.session.add(Message(agent_id=agent.id, date=date, performative='inform',
+                               sender=sender, receivers='b@localhost:2001',
+                               content='{} {}'.format(name, i)))
+    db.session.commit()
+    return session.id
+
+
+def listed_ids(html):
+    return [int(i) for i in re.findall(r'<h5>ID: (\d+)</h5>', html)]
+
+
+def older_cursor(html):
+    found = re.search(r'href="[^"]*before=(\d+)[^"]*">Older', html)
+    return int(found.group(1)) if found else None
+
+
+def test_parse_date_formats():
+    assert parse_date('2020-01-02T03:04') == datetime.datetime(2020, 1, 2, 3, 4)
+    assert parse_date('2020-01-02T03:04', end=True) == \
+        datetime.datetime(2020, 1, 2, 3, 4, 59, 999999)
+    assert parse_date('2020-01-02T03:04:05') == datetime.datetime(2020, 1, 2, 3, 4, 5)
+    assert parse_date('2020-01-02T03:04:05', end=True) == \
+        datetime.datetime(2020, 1, 2, 3, 4, 5, 999999)
+    assert parse_date('2020-01-02T03:04:05.250', end=True) == \
+        datetime.datetime(2020, 1, 2, 3, 4, 5, 250000)
+    assert parse_date('') is None
+    assert parse_date('2020-01-02') is None
+    assert parse_date('garbage') is None
+
+
+@pytest.mark.parametrize('limit, expected', [('0', 1), ('-5', 1), ('20', 20),
+                                             ('100000', flask_server.MAX_PAGE_SIZE),
+                                             ('x', flask_server.PAGE_SIZE)])
+def test_page_limit_is_clamped(limit, expected):
+    with app.test_request_context('/messagesList?limit=' + limit):
+        assert flask_server.page_limit() == expected
+
+
+def test_message_pages_follow_the_cursor(client):
+    add_session('first', 120)
+    seen = list()
+    html = client.get('/messagesList').get_data(as_text=True)
+    pages = 1
+    while True:
+        ids = listed_ids(html)
+        assert len(ids) <= flask_server.PAGE_SIZE
+        seen.extend(ids)
+        before = older_cursor(html)
+        if before is None:
+            break
+        assert before == ids[-1]
+        html = client.get('/messagesList?before={}'.format(before)).get_data(as_text=True)
+        pages += 1
+    assert pages == 3
+    assert seen == list(range(120, 0, -1))
+
+
+def test_zero_limit_still_makes_progress(client):
+    add_session('first', 3)
+    html = client.get('/messagesList?limit=0').get_data(as_text=True)
+    assert listed_ids(html) == [3]
+    assert older_cursor(html) == 3
+
+
+def test_remote_session_pages_stay_in_the_session(client):
+    first = add_session('first', 70)
+    add_session('second', 10, sender='c@localhost:2002')
+    data = client.get('/remote_sessions').get_json()
+    assert data['Session Name'] == 'second'
+    assert len(data['Messages']) == 10
+    assert data['Next Messages'] is None
+
+    contents = list()
+    before = None
+    while True:
+        url = '/remote_sessions?session={}'.format(first)
+        if before is not None:
+            url += '&before={}'.format(before)
+        data = client.get(url).get_json()
+        assert data['Session ID'] == first
+        contents.extend(m['Content'] for m in data['Messages'])
+        before = data['Next Messages']
+        if before is None:
+            break
+    assert contents == ['first {}'.format(i) for i in range(69, -1, -1)]
+    assert client.get('/remote_sessions?session=99').get_json() == []
+
+
+def test_date_filters(client):
+    add_session('first', 2, date=datetime.datetime(2020, 1, 1, 12, 0, 30))
+    queries = {'timeStart=2020-01-01T12:00': 2,
+               'timeStart=2020-01-01T12:00:31': 0,
+               'timeStop=2020-01-01T12:00': 2,
+               'timeStop=2020-01-01T12:00:29': 0,
+               'timeStart=garbage&timeStop=2100-01-01T00:00:00': 2}
+    for query, count in queries.items():
+        response = client.get('/messages?' + query)
+        assert response.status_code == 200
+        assert len(listed_ids(response.get_data(as_text=True))) == count, query
+
+
+def test_diagram_of_messages_without_sender(client):
+    add_session('first', 2)
+    db.session.add(Message(date=datetime.datetime(2020, 1, 1), performative='inform',
+                           sender=None, receivers='b@localhost:2001', content='x'))
+    db.session.commit()
+    assert client.get('/messages_diagram').status_code == 200
+    assert client.get('/messages_diagram?aggregate=1&limit=0').status_code == 200
+
+
+def test_content_filter_finds_messages_stored_before_the_index(client):
+    add_session('first', 3)
+    search = MessageSearchIndex(db.engine, Message.__table__)
+    if not search.create():
+        pytest.skip('sqlite without FTS5')
+    html = client.get('/messages?content=first').get_data(as_text=True)
+    assert sorted(listed_ids(html)) == [1, 2, 3]
+    search.reindex()
+    assert search.complete()
+    html = client.get('/messages?content=first').get_data(as_text=True)
+    assert sorted(listed_ids(html)) == [1, 2, 3]
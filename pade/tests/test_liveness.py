@@ -0,0 +1,127 @@
+from pade.acl.aid import AID
+from pade.acl.messages import ACLMessage
+from pade.core.agent import Agent
+from pade.core.liveness import (ArrivalWindow, LivenessMonitor, HEARTBEAT,
+                                phi_deviations, _tail)
+
+import pytest
+
+
+def test_phi_deviations_match_the_threshold():
+    deviations = phi_deviations(8.0)
+    assert _tail(deviations) == pytest.approx(1e-8, rel=1e-3)
+
+
+def test_arrival_window_keeps_the_last_intervals():
+    window = ArrivalWindow(0.0, 4.0, size=4)
+    assert window.mean() == pytest.approx(4.0)
+    for now in (5.0, 10.0, 15.0, 20.0):
+        window.add(now)
+    assert list(window.intervals) == [5.0] * 4
+    assert window.mean() == pytest.approx(5.0)
+    assert window.std_deviation() == pytest.approx(0.0)
+
+
+def test_phi_grows_while_no_heartbeat_arrives(clock):
+    monitor = LivenessMonitor(lambda name: None)
+    monitor.watch('a@localhost:2000')
+    assert monitor.phi('b@localhost:2000') is None
+    values = list()
+    for _ in range(4):
+        clock.advance(3.0)
+        values.append(monitor.phi('a@localhost:2000'))
+    assert values == sorted(values)
+    assert values[-1] > values[0]
+
+
+def test_agent_fails_after_its_deadline(clock):
+    failed = list()
+    monitor = LivenessMonitor(failed.append)
+    monitor.watch('a@localhost:2000')
+    for _ in range(20):
+        clock.advance(5.0)
+        monitor.heard('a@localhost:2000')
+    deadline = monitor.deadline('a@localhost:2000')
+    clock.advance(deadline - clock.seconds() - 0.5)
+    assert failed == []
+    clock.advance(1.0)
+    assert failed == ['a@localhost:2000']
+    assert 'a@localhost:2000' not in monitor.windows
+
+
+def test_heartbeats_keep_the_agent_alive(clock):
+    failed = list()
+    monitor = LivenessMonitor(failed.append)
+    monitor.watch('a@localhost:2000')
+    for _ in range(200):
+        clock.advance(5.0)
+        monitor.heard('a@localhost:2000')
+    assert failed == []
+
+
+def test_unwatched_agents_are_not_heard(clock):
+    monitor = LivenessMonitor(lambda name: None)
+    assert not monitor.heard('a@localhost:2000')
+    monitor.watch('a@localhost:2000')
+    monitor.forget('a@localhost:2000')
+    assert not monitor.heard('a@localhost:2000')
+    assert len(monitor._timers) == 0
+
+
+def build_agent(clock):
+    agent = Agent(AID('agent@localhost:2000'))
+    agent.update_ams({'name': 'localhost', 'port': 8000})
+    agent.local_delivery = False
+    sent = list()
+    agent.agentInstance.pool.send = lambda host, port, data: sent.append(clock.seconds())
+    agent.comport_heartbeat.on_start()
+    return agent, sent
+
+
+def test_heartbeat_is_sent_when_the_agent_is_quiet(clock):
+    agent, sent = build_agent(clock)
+    clock.advance(5.0)
+    clock.advance(5.0)
+    assert sent == [5.0, 10.0]
+
+
+def test_heartbeat_is_suppressed_by_other_messages(clock):
+    agent, sent = build_agent(clock)
+    clock.advance(5.0)
+    assert sent == [5.0]
+    for _ in range(4):
+        clock.advance(3.0)
+        message = ACLMessage(ACLMessage.INFORM)
+        message.add_receiver(AID('ams@localhost:8000'))
+        agent.send(message)
+    # the messages to the AMS at 8, 11, 14 and 17, and the
+    # heartbeat once the interval ran out since the last one
+    clock.advance(4.0)
+    assert sent == [5.0, 8.0, 11.0, 14.0, 17.0]
+    clock.advance(1.0)
+    assert sent == [5.0, 8.0, 11.0, 14.0, 17.0, 22.0]
+
+
+def test_first_heartbeat_is_always_sent(clock):
+    agent, sent = build_agent(clock)
+    clock.advance(1.0)
+    message = ACLMessage(ACLMessage.INFORM)
+    message.add_receiver(AID('ams@localhost:8000'))
+    agent.send(message)
+    clock.advance(4.0)
+    assert sent == [1.0, 5.0]
+
+
+def test_heartbeat_message():
+    agent = Agent(AID('agent@localhost:2000'))
+    agent.update_ams({'name': 'localhost', 'port': 8000})
+    message = agent.comport_heartbeat.message
+    assert message.content == HEARTBEAT
+    assert [r.name for r in message.receivers] == ['ams@localhost:8000']
+
+
+def test_no_heartbeat_without_interval():
+    agent = Agent(AID('agent@localhost:2000'))
+    agent.heartbeat_interval = None
+    agent.update_ams({'name': 'localhost', 'port': 8000})
+    assert not hasattr(agent, 'comport_heartbeat')
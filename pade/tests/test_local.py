@@ -0,0 +1,87 @@
+from twisted.internet import task
+
+from pade.acl.aid import AID
+from pade.acl.messages import ACLMessage
+from pade.core import local
+from pade.core.local import (LOCAL_AGENTS, deliver_local, register_local_agent,
+                             unregister_local_agent)
+from pade.core.pool import ConnectionPool
+
+import xml.etree.ElementTree as ET
+
+import pytest
+
+
+class Factory(object):
+
+    def __init__(self, name):
+        self.aid = AID(name)
+        self.pool = ConnectionPool(self)
+        self.received = list()
+
+    def react(self, message):
+        self.received.append(message)
+
+
+@pytest.fixture
+def reactor(monkeypatch):
+    clock = task.Clock()
+    monkeypatch.setattr(local, 'reactor', clock)
+    return clock
+
+
+def build_message(content):
+    message = ACLMessage(ACLMessage.INFORM)
+    message.add_receiver(AID('receiver@localhost:2001'))
+    message.set_content(content)
+    return message
+
+
+def test_agents_are_registered_by_address():
+    factory = Factory('receiver@localhost:2001')
+    register_local_agent(factory)
+    try:
+        assert LOCAL_AGENTS[('127.0.0.1', 2001)] is factory
+        unregister_local_agent(Factory('other@localhost:2001'))
+        assert LOCAL_AGENTS[('127.0.0.1', 2001)] is factory
+    finally:
+        unregister_local_agent(factory)
+    assert ('127.0.0.1', 2001) not in LOCAL_AGENTS
+
+
+def test_message_is_delivered_in_the_next_turn(reactor):
+    factory = Factory('receiver@localhost:2001')
+    message = build_message('hello')
+    deliver_local(factory, message)
+    assert factory.received == []
+    reactor.advance(0)
+    assert len(factory.received) == 1
+    received = factory.received[0]
+    assert received is not message
+    assert received.content == 'hello'
+    assert received.conversation_id == message.conversation_id
+
+
+def test_receiver_copy_is_independent(reactor):
+    factory = Factory('receiver@localhost:2001')
+    element = ET.Element('value')
+    element.text = '10'
+    messages = [build_message(element), build_message({'key': [1, 2]})]
+    for message in messages:
+        deliver_local(factory, message)
+    reactor.advance(0)
+    element.text = '20'
+    messages[1].content['key'].append(3)
+    messages[0].add_receiver(AID('other@localhost:2002'))
+    first, second = factory.received
+    assert first.content.text == '10'
+    assert second.content == {'key': [1, 2]}
+    assert [r.name for r in first.receivers] == ['receiver@localhost:2001']
+
+
+def test_message_is_shared_without_copy(reactor):
+    factory = Factory('receiver@localhost:2001')
+    message = build_message({'key': 1})
+    deliver_local(factory, message, copy=False)
+    reactor.advance(0)
+    assert factory.received == [message]
@@ -0,0 +1,124 @@
+from pade.acl.aid import AID
+from pade.acl.messages import ACLMessage
+
+from datetime import datetime
+import pickle
+
+
+def build_message():
+    message = ACLMessage(ACLMessage.REQUEST)
+    message.set_protocol(ACLMessage.FIPA_REQUEST_PROTOCOL)
+    message.set_sender(AID('sender@localhost:2000'))
+    message.add_receiver(AID('first@localhost:2001'))
+    message.set_content('hello')
+    message.set_ontology('ontology')
+    message.set_reply_with('key')
+    message.set_datetime(datetime(2020, 5, 17, 10, 30, 15))
+    return message
+
+
+def baseline_pickle(state):
+    """Returns the pickle of a message of the previous versions, an
+    ElementTree element subclass whose pickle only kept the attributes
+    of the instance: NEWOBJ of the class and BUILD with the state."""
+    return (b'\x80\x02cpade.acl.messages\nACLMessage\n)\x81' +
+            pickle.dumps(state, 2)[2:-1] + b'b.')
+
+
+def test_identifiers_are_generated_once():
+    message = ACLMessage()
+    assert message.conversation_id == message.conversation_id
+    assert message.messageID != message.conversation_id
+    message.set_conversation_id('conversation')
+    assert message.conversation_id == 'conversation'
+
+
+def test_pickle_round_trip():
+    message = build_message()
+    copy = pickle.loads(pickle.dumps(message))
+    assert copy.performative == ACLMessage.REQUEST
+    assert copy.sender.name == 'sender@localhost:2000'
+    assert [r.name for r in copy.receivers] == ['first@localhost:2001']
+    assert copy.content == 'hello'
+    assert copy.reply_with == 'key'
+    assert copy.datetime == datetime(2020, 5, 17, 10, 30, 15)
+    assert copy.conversation_id == message.conversation_id
+    assert copy.messageID == message.messageID
+
+
+def test_state_uses_the_public_names():
+    state = build_message().__getstate__()
+    assert 'conversation_id' in state and 'messageID' in state
+    assert '_conversation_id' not in state and '_message_id' not in state
+
+
+def test_unpickle_a_message_of_previous_versions():
+    state = {'performative': 'inform', 'conversation_id': 'conversation',
+             'messageID': 'message', 'datetime': None, 'system_message': False,
+             'sender': AID('a@localhost:2000'), 'receivers': [AID('b@localhost:2001')],
+             'reply_to': [], 'content': 'hello', 'language': None, 'encoding': None,
+             'ontology': 'ontology', 'protocol': None, 'reply_with': None,
+             'in_reply_to': None, 'reply_by': None}
+    message = pickle.loads(baseline_pickle(state))
+    assert type(message) is ACLMessage
+    assert message.performative == 'inform'
+    assert message.conversation_id == 'conversation'
+    assert message.messageID == 'message'
+    assert message.sender.name == 'a@localhost:2000'
+    assert [r.name for r in message.receivers] == ['b@localhost:2001']
+    assert message.content == 'hello'
+    assert message.findtext('ontology') == 'ontology'
+
+
+def test_create_reply():
+    message = build_message()
+    reply = message.create_reply()
+    assert reply.performative == ACLMessage.REQUEST
+    assert reply.protocol == ACLMessage.FIPA_REQUEST_PROTOCOL
+    assert reply.ontology == 'ontology'
+    assert reply.conversation_id == message.conversation_id
+    assert reply.messageID != message.messageID
+    assert reply.in_reply_to == 'key'
+    assert [r.name for r in reply.receivers] == ['sender@localhost:2000']
+
+    message.add_reply_to(AID('other@localhost:2003'))
+    assert [r.name for r in message.create_reply().receivers] == ['other@localhost:2003']
+
+
+def test_clone_copies_the_lists():
+    message = build_message()
+    # the identifiers were not read yet
+    copy = message.clone()
+    copy.add_receiver(AID('second@localhost:2002'))
+    copy.set_content('changed')
+    assert [r.name for r in message.receivers] == ['first@localhost:2001']
+    assert message.content == 'hello'
+    assert copy.conversation_id == message.conversation_id
+    assert copy.messageID == message.messageID
+
+
+def test_xml_view():
+    message = build_message()
+    assert message.tag == 'ACLMessage'
+    assert message.findtext('performative') == 'request'
+    assert message.findtext('sender') == 'sender@localhost:2000'
+    assert message.find('receivers/receiver').text == 'first@localhost:2001'
+    assert message.findtext('language') == ''
+    assert message.findtext('missing', 'default') == 'default'
+    assert [e.text for e in message.iter('receiver')] == ['first@localhost:2001']
+    assert message.find('datetime/year').text == '2020'
+
+    # the view is read only, it is generated again on every call
+    message.find('content').text = 'changed'
+    assert message.findtext('content') == 'hello'
+
+
+def test_xml_round_trip():
+    message = build_message()
+    copy = ACLMessage()
+    copy.set_message(message.get_message())
+    assert copy.performative == 'request'
+    assert copy.content == 'hello'
+    assert copy.sender.name == 'sender@localhost:2000'
+    assert [r.name for r in copy.receivers] == ['first@localhost:2001']
+    assert copy.conversation_id == message.conversation_id
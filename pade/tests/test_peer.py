@@ -0,0 +1,39 @@
+from pade.core.peer import (FRAME_HEADER, PREAMBLE, ACL_MODE, LEGACY_MODE, MOSAIK_MODE,
+                            FrameDecoder, FrameError, detect_mode)
+
+import pytest
+
+
+def frame(payload):
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+
+def test_frames_split_across_chunks():
+    decoder = FrameDecoder()
+    data = frame(b'first') + frame(b'') + frame(b'third')
+    received = list()
+    for i in range(len(data)):
+        received.extend(decoder.feed(data[i:i + 1]))
+    assert received == [b'first', b'', b'third']
+    assert not decoder.buffer
+
+
+def test_partial_frame_stays_buffered():
+    decoder = FrameDecoder()
+    data = frame(b'payload')
+    assert decoder.feed(data[:6]) == []
+    assert decoder.feed(data[6:] + data[:2]) == [b'payload']
+    assert bytes(decoder.buffer) == data[:2]
+
+
+def test_frame_over_the_limit_is_refused():
+    decoder = FrameDecoder(max_length=4)
+    with pytest.raises(FrameError):
+        decoder.feed(frame(b'12345'))
+
+
+def test_detect_mode():
+    assert detect_mode(PREAMBLE + frame(b'x')) == ACL_MODE
+    assert detect_mode(PREAMBLE[:2]) is None
+    assert detect_mode(b'\x80\x04') == LEGACY_MODE
+    assert detect_mode(frame(b'[1, 2]')) == MOSAIK_MODE
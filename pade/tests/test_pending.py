@@ -0,0 +1,89 @@
+from twisted.internet import defer
+
+from pade.acl.aid import AID
+from pade.acl.messages import ACLMessage
+from pade.core.pending import PendingRequests, RequestError
+
+import pytest
+
+
+def reply(key, performative=ACLMessage.INFORM, sender='server@localhost:2000'):
+    message = ACLMessage(performative)
+    message.set_sender(AID(sender))
+    message.set_in_reply_to(key)
+    return message
+
+
+def results(deferred):
+    found = list()
+    deferred.addBoth(found.append)
+    return found
+
+
+def test_reply_fires_the_request(clock):
+    pending = PendingRequests('client')
+    key = pending.new_key()
+    assert key.startswith('client-')
+    assert key != pending.new_key()
+    # agents with the same localname do not share keys
+    assert key != PendingRequests('client').new_key()
+    found = results(pending.add(key, timeout=5.0))
+
+    assert pending.resolve(reply(key, ACLMessage.AGREE))
+    assert found == []
+    assert pending.resolve(reply(key))
+    assert found[0].performative == ACLMessage.INFORM
+    assert len(pending) == 0
+    # the timeout was cancelled with the request
+    clock.advance(10.0)
+    assert len(found) == 1
+
+
+@pytest.mark.parametrize('performative', [ACLMessage.REFUSE, ACLMessage.FAILURE,
+                                          ACLMessage.NOT_UNDERSTOOD])
+def test_error_replies(clock, performative):
+    pending = PendingRequests('client')
+    found = results(pending.add('k'))
+    pending.resolve(reply('k', performative))
+    assert found[0].check(RequestError)
+    assert found[0].value.message.performative == performative
+
+
+def test_unknown_replies_are_not_consumed(clock):
+    pending = PendingRequests('client')
+    pending.add('k')
+    assert not pending.resolve(reply('other'))
+    assert not pending.resolve(reply(None))
+    assert len(pending) == 1
+
+
+def test_replies_of_other_agents_are_not_consumed(clock):
+    pending = PendingRequests('client')
+    found = results(pending.add('k', receivers=[AID('server@localhost:2000'),
+                                                'other@localhost:2001']))
+    assert not pending.resolve(reply('k', sender='intruder@localhost:2002'))
+    assert found == []
+    assert pending.resolve(reply('k', sender='other@localhost:2001'))
+    assert found[0].sender.name == 'other@localhost:2001'
+    assert pending.receivers == {}
+
+
+def test_timeout(clock):
+    pending = PendingRequests('client')
+    found = results(pending.add('k', timeout=5.0))
+    clock.advance(4.9)
+    assert found == []
+    clock.advance(0.2)
+    assert found[0].check(defer.TimeoutError)
+    assert not pending.resolve(reply('k'))
+
+
+def test_cancel_forgets_the_request(clock):
+    pending = PendingRequests('client')
+    deferred = pending.add('k', timeout=5.0)
+    found = results(deferred)
+    deferred.cancel()
+    assert found[0].check(defer.CancelledError)
+    assert len(pending) == 0
+    clock.advance(10.0)
+    assert len(found) == 1
@@ -0,0 +1,104 @@
+from twisted.internet.testing import StringTransport
+from twisted.python.failure import Failure
+
+from pade.acl.aid import AID
+from pade.core.peer import PREAMBLE, FrameDecoder, PeerProtocol
+from pade.core.pool import ConnectionPool
+
+
+class Factory(object):
+    """Factory of the agent that owns the pool."""
+
+    debug = False
+    aid = AID('pool_test@localhost:1000')
+
+    def buildProtocol(self, addr):
+        return PeerProtocol(self)
+
+
+def connect(memory_reactor, index=-1):
+    """Completes a connection attempt of the pool and returns
+    the transport of the connection."""
+    factory = memory_reactor.tcpClients[index][2]
+    protocol = factory.buildProtocol(None)
+    transport = StringTransport()
+    protocol.makeConnection(transport)
+    return transport
+
+
+def frames(transport):
+    data = transport.value()
+    assert data.startswith(PREAMBLE)
+    return FrameDecoder().feed(data[len(PREAMBLE):])
+
+
+def test_names_of_the_same_address_share_a_connection(memory_reactor):
+    pool = ConnectionPool(Factory())
+    pool.send('localhost', 2001, b'first')
+    pool.send('127.0.0.1', '2001', b'second')
+    pool.send('LOCALHOST', 2001, b'third')
+    assert list(pool.connections) == [('127.0.0.1', 2001)]
+
+    memory_reactor.advance(0)
+    assert len(memory_reactor.tcpClients) == 1
+    transport = connect(memory_reactor)
+    memory_reactor.advance(0)
+    assert frames(transport) == [b'first', b'second', b'third']
+
+
+def test_frames_are_written_on_the_open_connection(memory_reactor):
+    pool = ConnectionPool(Factory())
+    pool.send('localhost', 2001, b'a')
+    memory_reactor.advance(0)
+    transport = connect(memory_reactor)
+    memory_reactor.advance(0)
+
+    pool.send('localhost', 2001, b'b')
+    memory_reactor.advance(0)
+    assert len(memory_reactor.tcpClients) == 1
+    assert frames(transport) == [b'a', b'b']
+
+
+def test_failed_connections_are_retried_with_backoff(memory_reactor):
+    pool = ConnectionPool(Factory(), max_retries=2, retry_delay=0.5)
+    pool.send('localhost', 2001, b'a')
+    memory_reactor.advance(0)
+    connection = pool.connections[('127.0.0.1', 2001)]
+    error = Failure(ConnectionRefusedError())
+
+    connection.connection_failed(error)
+    memory_reactor.advance(0.4)
+    assert len(memory_reactor.tcpClients) == 1
+    memory_reactor.advance(0.1)
+    memory_reactor.advance(0)
+    assert len(memory_reactor.tcpClients) == 2
+
+    # the second retry waits twice as long
+    connection.connection_failed(error)
+    memory_reactor.advance(0.9)
+    assert len(memory_reactor.tcpClients) == 2
+    memory_reactor.advance(0.1)
+    memory_reactor.advance(0)
+    assert len(memory_reactor.tcpClients) == 3
+
+    # the frames are dropped after max_retries
+    connection.connection_failed(error)
+    assert not connection.queue
+    assert not pool.connections
+
+
+def test_idle_connections_are_closed(memory_reactor):
+    pool = ConnectionPool(Factory(), idle_timeout=10.0)
+    pool.send('localhost', 2001, b'a')
+    memory_reactor.advance(0)
+    transport = connect(memory_reactor)
+    memory_reactor.advance(0)
+
+    memory_reactor.advance(6.0)
+    pool.send('localhost', 2001, b'b')
+    memory_reactor.advance(4.0)
+    assert not transport.disconnecting
+
+    memory_reactor.advance(10.0)
+    assert transport.disconnecting
+    assert not pool.connections
@@ -0,0 +1,131 @@
+from twisted.internet.defer import succeed
+
+from pade.acl.aid import AID
+from pade.core.directory import AgentDirectory
+from pade.core.registry import AgentRegistry
+
+from sqlalchemy import (Column, DateTime, Integer, MetaData, String, Table,
+                        create_engine, select)
+
+
+class Factory(object):
+
+    def __init__(self):
+        self.table = AgentDirectory()
+
+
+class Agent(object):
+
+    def __init__(self):
+        self.agentInstance = Factory()
+
+
+class SyncConnection(object):
+    """alchimia-like connection running the statements at once."""
+
+    def __init__(self, engine):
+        self.conn = engine.connect()
+        self.transactions = list()
+
+    def begin(self):
+        self.trans = self.conn.begin()
+        self.transactions.append(self.trans)
+        return succeed(self)
+
+    def commit(self):
+        self.trans.commit()
+        return succeed(None)
+
+    def rollback(self):
+        self.trans.rollback()
+        return succeed(None)
+
+    def execute(self, *args):
+        return succeed(self.conn.execute(*args))
+
+    def close(self):
+        self.conn.close()
+        return succeed(None)
+
+
+class SyncEngine(object):
+
+    def __init__(self):
+        self.engine = create_engine('sqlite://')
+        self.connections = list()
+
+    def connect(self):
+        conn = SyncConnection(self.engine)
+        self.connections.append(conn)
+        return succeed(conn)
+
+
+def build_registry():
+    engine = SyncEngine()
+    table = Table('agents', MetaData(),
+                  Column('id', Integer, primary_key=True),
+                  Column('session_id', Integer),
+                  Column('name', String(64), unique=True),
+                  Column('date', DateTime),
+                  Column('state', String(64)))
+    table.create(engine.engine)
+    registry = AgentRegistry(Agent(), engine, table, delay=0.2)
+    registry.session_id = 1
+    return registry, engine, table
+
+
+def names(engine, table):
+    with engine.engine.connect() as conn:
+        return sorted(row['name'] for row in conn.execute(select([table])))
+
+
+def test_registrations_share_one_transaction(clock):
+    registry, engine, table = build_registry()
+    for i in range(50):
+        assert registry.register(AID('agent_{}@localhost:{}'.format(i, 2000 + i)))
+    assert not registry.register(AID('agent_0@localhost:2000'))
+    assert len(registry) == 50
+    assert names(engine, table) == []
+
+    clock.advance(0.3)
+    assert len(engine.connections) == 1
+    assert len(names(engine, table)) == 50
+
+
+def test_removals_and_registrations_in_the_same_flush(clock):
+    registry, engine, table = build_registry()
+    registry.register(AID('a@localhost:2000'))
+    registry.register(AID('b@localhost:2001'))
+    clock.advance(0.3)
+
+    registry.unregister('a@localhost:2000')
+    # same name at a new address, deleted and inserted again
+    registry.unregister('b@localhost:2001')
+    registry.register(AID('b@localhost:3001'))
+    # registered and removed before the flush, never written
+    registry.register(AID('c@localhost:2002'))
+    registry.unregister('c@localhost:2002')
+    clock.advance(0.3)
+    assert len(engine.connections) == 2
+    assert names(engine, table) == ['b@localhost:3001']
+    assert registry.unregister('missing') is None
+
+
+def test_deltas_carry_the_changes_since_the_previous_one(clock):
+    registry, _, _ = build_registry()
+    registry.register(AID('a@localhost:2000'))
+    registry.register(AID('b@localhost:2001'))
+    first = registry.delta()
+    assert (first['base'], first['version']) == (0, 2)
+    assert sorted(first['added']) == ['a@localhost:2000', 'b@localhost:2001']
+    assert registry.delta() is None
+
+    registry.unregister('a@localhost:2000')
+    second = registry.delta()
+    assert (second['base'], second['version']) == (2, 3)
+    assert second['removed'] == ['a@localhost:2000']
+    assert second['added'] == {}
+
+    snapshot = registry.snapshot()
+    assert snapshot['version'] == 3
+    assert list(snapshot['table']) == ['b@localhost:2001']
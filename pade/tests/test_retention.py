@@ -0,0 +1,98 @@
+from pade.core.retention import MessageRetention
+
+from sqlalchemy import func, select
+
+from datetime import datetime, timedelta
+
+import pytest
+
+
+NOW = datetime.now().replace(second=0, microsecond=0)
+
+
+def insert(db, minutes_ago, count=1, sender='a@localhost:2000', content='hello'):
+    date = NOW - timedelta(minutes=minutes_ago)
+    with db.engine.begin() as conn:
+        conn.execute(db.messages.insert(), [
+            {'date': date + timedelta(seconds=i % 60), 'sender': sender,
+             'performative': 'inform', 'protocol': None, 'content': content}
+            for i in range(count)])
+
+
+def count(db, table=None):
+    table = db.messages if table is None else table
+    with db.engine.connect() as conn:
+        return conn.execute(select([func.count()]).select_from(table)).scalar()
+
+
+def retention(db, **kwargs):
+    return MessageRetention(db.engine, db.messages, db.agents, db.aggregates, **kwargs)
+
+
+def test_old_messages_are_aggregated_and_archived(trace_database, tmpdir):
+    db = trace_database
+    insert(db, 120, count=3)
+    insert(db, 90, count=2, sender='b@localhost:2001')
+    insert(db, 10, count=4)
+    r = retention(db, max_age=3600, archive_dir=str(tmpdir), chunk_size=2)
+    assert r._run() == 5
+    assert count(db) == 4
+    aggregates = db.rows(db.aggregates, order_by=db.aggregates.c.minute)
+    assert [(row['sender'], row['count']) for row in aggregates] == \
+        [('a@localhost:2000', 3), ('b@localhost:2001', 2)]
+    assert [record['sender'] for record in r.archive.query()] == \
+        ['a@localhost:2000'] * 3 + ['b@localhost:2001'] * 2
+
+
+def test_row_limit_keeps_the_newest_minutes(trace_database):
+    db = trace_database
+    for minutes in (50, 40, 30, 20, 10):
+        insert(db, minutes, count=10)
+    r = retention(db, max_rows=25)
+    # the cutoff is rounded down to the minute of the 26th newest
+    # message, its minute is kept whole
+    assert r._run() == 20
+    assert count(db) == 30
+    assert r.moved == 20
+
+
+def test_nothing_is_moved_under_the_limits(trace_database):
+    db = trace_database
+    insert(db, 10, count=5)
+    r = retention(db, max_age=3600, max_rows=100, max_bytes=1 << 30)
+    assert r._run() == 0
+    assert count(db) == 5
+
+
+def test_size_limit_counts_the_used_pages(trace_database):
+    db = trace_database
+    for minutes in range(20, 0, -1):
+        insert(db, minutes, count=20, content='x' * 2000)
+    with db.engine.connect() as conn:
+        size = retention(db)._database_size(conn)
+    r = retention(db, max_bytes=size // 2, vacuum_rows=10 ** 9)
+    moved = r._run()
+    assert 0 < moved < 400
+    # the freed pages are not vacuumed, the next run moves nothing
+    assert r._run() == 0
+    with db.engine.connect() as conn:
+        assert r._database_size(conn) <= size // 2
+
+
+def test_failed_chunk_is_not_archived(trace_database, tmpdir, monkeypatch):
+    db = trace_database
+    insert(db, 120, count=3)
+    r = retention(db, max_age=3600, archive_dir=str(tmpdir))
+
+    def fail(conn, rows):
+        raise RuntimeError('aggregates')
+
+    monkeypatch.setattr(r, '_aggregate', fail)
+    with pytest.raises(RuntimeError):
+        r._run()
+    assert count(db) == 3
+    assert list(r.archive.query()) == []
+
+    monkeypatch.undo()
+    assert r._run() == 3
+    assert len(list(r.archive.query())) == 3
@@ -0,0 +1,60 @@
+from pade.acl.aid import AID
+from pade.core import runtime
+from pade.core.runtime import (LOOPBACK, SHARD_ENV, SOCKET_DIR_ENV, assign_addresses,
+                               current_shard, shard_agents, unix_socket_path)
+
+
+class Agent(object):
+
+    def __init__(self, name):
+        self.aid = AID(name)
+
+
+def test_current_shard(monkeypatch):
+    monkeypatch.delenv(SHARD_ENV, raising=False)
+    assert current_shard() == (0, 1)
+    monkeypatch.setenv(SHARD_ENV, '2/4')
+    assert current_shard() == (2, 4)
+
+
+def test_shards_cover_every_agent_once(monkeypatch):
+    agents = list(range(10))
+    shards = [shard_agents(agents, index, 3) for index in range(3)]
+    assert sorted(sum(shards, [])) == agents
+    monkeypatch.setenv(SHARD_ENV, '1/3')
+    assert shard_agents(agents) == [1, 4, 7]
+
+
+def test_assign_addresses_follows_the_list():
+    agents = [Agent('agent_{}@localhost:{}'.format(i, 1)) for i in range(3)]
+    assign_addresses(agents, 5000, host='node')
+    assert [(a.aid.host, a.aid.port) for a in agents] == \
+        [('node', 5000), ('node', 5001), ('node', 5002)]
+
+
+def test_unix_socket_path(monkeypatch, tmp_path):
+    monkeypatch.delenv(SOCKET_DIR_ENV, raising=False)
+    assert unix_socket_path(LOOPBACK, 2000) is None
+    monkeypatch.setenv(SOCKET_DIR_ENV, str(tmp_path))
+    assert unix_socket_path(LOOPBACK, 2000) is None
+    (tmp_path / '2000.sock').touch()
+    assert unix_socket_path(LOOPBACK, 2000) == str(tmp_path / '2000.sock')
+    assert unix_socket_path('10.0.0.2', 2000) is None
+
+
+def test_start_loop_uses_the_runtime_thread_pool(monkeypatch):
+    from pade.misc import utility
+
+    class Reactor(object):
+        size = None
+
+        def suggestThreadPoolSize(self, size):
+            self.size = size
+
+        def run(self):
+            pass
+
+    reactor = Reactor()
+    monkeypatch.setattr(utility, 'reactor', reactor)
+    utility.start_loop([])
+    assert reactor.size == runtime.THREAD_POOL_SIZE > 1
@@ -0,0 +1,81 @@
+from pade.core.scheduler import SendScheduler
+
+from collections import deque
+
+
+class Connection(object):
+    """Pooled connection that records the written frames."""
+
+    def __init__(self, frames=0, connected=True):
+        self.queue = deque(range(frames))
+        self.protocol = object() if connected else None
+        self.connector = None
+        self.retry_call = None
+        self.paused = False
+        self.written = list()
+        self.attempts = 0
+
+    def connect(self):
+        self.attempts += 1
+        self.connector = object()
+
+    def write_frames(self, limit):
+        written = 0
+        while self.queue and written < limit and not self.paused:
+            self.written.append(self.queue.popleft())
+            written += 1
+        return written
+
+
+def test_batch_size_per_turn(memory_reactor):
+    scheduler = SendScheduler(batch_size=4)
+    first, second = Connection(10), Connection(3)
+    scheduler.schedule(first)
+    scheduler.schedule(second)
+    scheduler.drain()
+    assert (len(first.written), len(second.written)) == (4, 3)
+    assert list(scheduler.ready) == [first]
+    memory_reactor.advance(0)
+    assert len(first.written) == 10
+    assert scheduler.sent == 13
+
+
+def test_paused_connections_are_skipped(memory_reactor):
+    scheduler = SendScheduler()
+    connection = Connection(5)
+    connection.paused = True
+    scheduler.schedule(connection)
+    memory_reactor.advance(0)
+    assert connection.written == []
+    assert not scheduler.ready
+
+
+def test_connection_attempts_are_limited(memory_reactor):
+    scheduler = SendScheduler(max_connecting=2)
+    connections = [Connection(1, connected=False) for _ in range(4)]
+    for connection in connections:
+        scheduler.schedule(connection)
+    memory_reactor.advance(0)
+    assert [c.attempts for c in connections] == [1, 1, 0, 0]
+    assert len(scheduler.waiting) == len(scheduler.waiting_set) == 2
+
+    # scheduled again while waiting, it is not queued twice
+    scheduler.schedule(connections[3])
+    memory_reactor.advance(0)
+    assert len(scheduler.waiting) == 2
+
+    connections[0].connector = None
+    scheduler.connection_finished(connections[0])
+    assert [c.attempts for c in connections] == [1, 1, 1, 0]
+    assert connections[2] not in scheduler.waiting_set
+
+
+def test_rate_samples_are_pruned_while_draining(memory_reactor):
+    scheduler = SendScheduler(rate_window=5.0)
+    connection = Connection()
+    for _ in range(100):
+        connection.queue.append(None)
+        scheduler.schedule(connection)
+        memory_reactor.advance(1.0)
+    assert len(scheduler.samples) <= 6
+    assert 1.0 <= scheduler.drain_rate() <= 1.2
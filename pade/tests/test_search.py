@@ -0,0 +1,119 @@
+from pade.core.search import MessageSearchIndex, match_expression
+
+from datetime import datetime
+
+import pytest
+
+
+def insert(db, *contents, **values):
+    values.setdefault('date', datetime(2020, 1, 1, 12, 0))
+    values.setdefault('sender', 'a@localhost:2000')
+    values.setdefault('performative', 'inform')
+    with db.engine.begin() as conn:
+        conn.execute(db.messages.insert(),
+                     [dict(values, content=content) for content in contents])
+
+
+def ids(found):
+    return [message_id for message_id, _ in found]
+
+
+@pytest.fixture
+def index(trace_database):
+    index = MessageSearchIndex(trace_database.engine, trace_database.messages, chunk_size=2)
+    if not index.supported():
+        pytest.skip('sqlite without FTS5')
+    return index
+
+
+def test_match_expression_quotes_the_words():
+    assert match_expression('') is None
+    assert match_expression('price of "oil') == '"price" "of" """oil"*'
+    assert match_expression('NEAR OR') == '"NEAR" "OR"*'
+
+
+def test_new_messages_are_indexed_by_the_triggers(trace_database, index):
+    db = trace_database
+    assert not index.exists()
+    assert index.create()
+    assert index.create()
+    insert(db, 'buy oil', 'sell gas')
+    assert ids(index.search('oil')) == [1]
+
+    with db.engine.begin() as conn:
+        conn.execute(db.messages.update().where(db.messages.c.id == 1)
+                     .values(content='buy coal'))
+        conn.execute(db.messages.delete().where(db.messages.c.id == 2))
+    assert ids(index.search('oil')) == []
+    assert ids(index.search('coal')) == [1]
+    assert ids(index.search('gas')) == []
+
+
+def test_reindex_goes_on_from_the_last_chunk(trace_database, index):
+    db = trace_database
+    insert(db, *['message {}'.format(i) for i in range(5)])
+    index.create()
+    progress = list()
+    assert index.reindex(progress=progress.append) == 5
+    assert progress == [2, 4, 5]
+    assert index.reindex() == 0
+    assert len(index.search('message')) == 5
+    assert index.reindex(full=True) == 5
+    assert len(index.search('message')) == 5
+
+
+def test_best_matches_come_first(trace_database, index):
+    db = trace_database
+    index.create()
+    insert(db, 'oil', 'oil oil oil price', 'gas')
+    with db.engine.begin() as conn:
+        conn.execute(db.messages.insert().values(content='gas', ontology='oil'))
+    assert ids(index.search('oil')) == [2, 1, 4]
+    # the last word matches as a prefix
+    assert ids(index.search('pri')) == [2]
+    assert ids(index.search('oil pri')) == [2]
+
+
+def test_search_filters_and_pages(trace_database, index):
+    db = trace_database
+    index.create()
+    insert(db, 'oil 1', 'oil 2', sender='a@localhost:2000', date=datetime(2020, 1, 1))
+    insert(db, 'oil 3', sender='b@localhost:2001', performative='request',
+           date=datetime(2020, 1, 3))
+    assert ids(index.search('oil', sender='b@localhost:2001')) == [3]
+    assert ids(index.search('oil', performative='inform')) == [2, 1]
+    assert ids(index.search('oil', start=datetime(2020, 1, 2))) == [3]
+    assert ids(index.search('oil', stop=datetime(2020, 1, 2))) == [2, 1]
+    assert ids(index.search('oil', limit=2)) == [3, 2]
+    assert ids(index.search('oil', limit=2, offset=2)) == [1]
+
+
+def test_index_is_complete_once_the_older_messages_are_indexed(trace_database, index):
+    db = trace_database
+    assert not index.complete()
+    insert(db, 'old oil', 'old gas', 'old coal')
+    index.create()
+    insert(db, 'new oil')
+    # the messages stored before the index are not found yet
+    assert not index.complete()
+    assert ids(index.search('oil')) == [4]
+
+    assert index.reindex() == 3
+    assert index.complete()
+    assert sorted(ids(index.search('oil'))) == [1, 4]
+    insert(db, 'newer oil')
+    assert index.complete()
+    assert index.reindex() == 0
+    assert len(index.search('oil')) == 3
+
+
+def test_reindex_of_deleted_messages_completes(trace_database, index):
+    db = trace_database
+    insert(db, 'oil', 'gas', 'coal')
+    index.create()
+    with db.engine.begin() as conn:
+        conn.execute(db.messages.delete().where(db.messages.c.id > 1))
+    assert index.reindex() == 1
+    assert index.complete()
+    assert index.reindex(full=True) == 1
+    assert index.complete()
@@ -0,0 +1,70 @@
+from pade.acl.aid import AID
+from pade.acl.codec import decode
+from pade.acl.messages import ACLMessage
+from pade.core.agent import Agent_
+
+from twisted.internet.testing import StringTransport
+
+from pade.tests.test_pool import Factory, frames
+
+
+class CountingTransport(StringTransport):
+
+    def __init__(self):
+        StringTransport.__init__(self)
+        self.writes = 0
+
+    def writeSequence(self, data):
+        self.writes += 1
+        StringTransport.writeSequence(self, data)
+
+
+def build_agent(receivers):
+    agent = Agent_(AID('sender@localhost:2000'))
+    agent.update_ams({'name': 'localhost', 'port': 8000})
+    agent.local_delivery = False
+    for name in receivers:
+        agent.agentInstance.table[name] = AID(name)
+    sent = list()
+    agent.agentInstance.pool.send = lambda host, port, data: sent.append((host, port, data))
+    return agent, sent
+
+
+def test_message_is_encoded_once_for_every_receiver():
+    agent, sent = build_agent(['a@localhost:2001', 'b@127.0.0.1:2002', 'c@remote:2001'])
+    message = ACLMessage(ACLMessage.INFORM)
+    for name in ('a', 'b', 'c'):
+        message.add_receiver(AID(name=name))
+    message.set_content('broadcast')
+    agent.send(message)
+
+    assert [(host, port) for host, port, _ in sent] == \
+        [('127.0.0.1', 2001), ('127.0.0.1', 2002), ('remote', 2001)]
+    assert len(set(id(data) for _, _, data in sent)) == 1
+    assert decode(sent[0][2]).content == 'broadcast'
+
+
+def test_receivers_of_the_same_address_get_one_frame():
+    agent, sent = build_agent(['a@localhost:2001'])
+    agent.agentInstance.table['alias@localhost:2001'] = AID('a@localhost:2001')
+    message = ACLMessage(ACLMessage.INFORM)
+    message.add_receiver(AID(name='a'))
+    message.add_receiver(AID(name='alias'))
+    agent.send(message)
+    assert len(sent) == 1
+
+
+def test_queued_frames_are_written_together(memory_reactor):
+    from pade.core.pool import ConnectionPool
+    pool = ConnectionPool(Factory(), batch_size=64)
+    for i in range(10):
+        pool.send('localhost', 2001, str(i).encode())
+    memory_reactor.advance(0)
+    factory = memory_reactor.tcpClients[0][2]
+    protocol = factory.buildProtocol(None)
+    transport = CountingTransport()
+    protocol.makeConnection(transport)
+    memory_reactor.advance(0)
+    # the preamble and then a single write for the ten frames
+    assert transport.writes == 1
+    assert frames(transport) == [str(i).encode() for i in range(10)]
@@ -0,0 +1,91 @@
+from pade.acl.aid import AID
+from pade.acl.codec import decode
+from pade.acl.messages import ACLMessage
+from pade.core.agent import Agent
+from pade.core.tap import MessageTap, TRACE
+
+from twisted.internet.testing import StringTransport
+
+from pade.tests.test_pool import frames
+
+from pickle import loads
+
+
+def build_tap(**kwargs):
+    agent = Agent(AID('agent@localhost:2000'))
+    agent.update_ams({'name': 'localhost', 'port': 8000})
+    agent.local_delivery = False
+    agent.agentInstance.table['sniffer@localhost:8001'] = AID('sniffer@localhost:8001')
+    return agent, MessageTap(agent, **kwargs)
+
+
+def received(i):
+    message = ACLMessage(ACLMessage.INFORM)
+    message.set_sender(AID('other@localhost:2001'))
+    message.add_receiver(AID('agent@localhost:2000'))
+    message.set_content(str(i))
+    return message
+
+
+def sniffer_connection(agent):
+    return agent.agentInstance.pool.connections[('127.0.0.1', 8001)]
+
+
+def traces(transport):
+    batches = [loads(decode(frame).content) for frame in frames(transport)]
+    assert all(batch['ref'] == TRACE for batch in batches)
+    return batches
+
+
+def test_full_buffer_drops_the_oldest_records(clock, memory_reactor):
+    agent, tap = build_tap(capacity=3, batch_size=10)
+    for i in range(5):
+        tap.record(received(i))
+    assert [record[-1] for record in tap.records] == ['2', '3', '4']
+    assert tap.dropped == 2
+
+
+def test_records_wait_while_the_sniffer_connection_is_backed_up(clock, memory_reactor):
+    agent, tap = build_tap(batch_size=2, max_queued=2)
+    for i in range(10):
+        tap.record(received(i))
+    clock.advance(0.1)
+    # the connection to the Sniffer is not established yet, two
+    # batches are queued on it and the other records stay in the tap
+    assert len(sniffer_connection(agent).queue) == 2
+    assert len(tap) == 6
+
+    memory_reactor.advance(0)
+    protocol = memory_reactor.tcpClients[0][2].buildProtocol(None)
+    transport = StringTransport()
+    protocol.makeConnection(transport)
+    memory_reactor.advance(0)
+    clock.advance(tap.flush_interval)
+    memory_reactor.advance(0)
+    clock.advance(tap.flush_interval)
+    memory_reactor.advance(0)
+
+    batches = traces(transport)
+    assert [r[-1] for batch in batches for r in batch['records']] == \
+        [str(i) for i in range(10)]
+    assert len(tap) == 0
+
+
+def test_paused_connection_holds_the_flush(clock, memory_reactor):
+    agent, tap = build_tap(batch_size=2, capacity=4)
+    tap.record(received(0))
+    tap.flush()
+    connection = sniffer_connection(agent)
+    connection.queue.clear()
+    connection.pauseProducing()
+    for i in range(1, 7):
+        tap.record(received(i))
+    clock.advance(tap.flush_interval)
+    assert len(connection.queue) == 0
+    assert [record[-1] for record in tap.records] == ['3', '4', '5', '6']
+    assert tap.dropped == 2
+
+    connection.paused = False
+    clock.advance(tap.flush_interval)
+    assert len(connection.queue) == 2
+    assert len(tap) == 0
@@ -0,0 +1,101 @@
+from twisted.internet import task
+
+from pade.core.timers import SLOTS, TimerWheel
+
+import random
+
+import pytest
+
+
+def build_wheel(resolution=0.01):
+    clock = task.Clock()
+    return clock, TimerWheel(resolution=resolution, clock=clock)
+
+
+@pytest.mark.parametrize('delay', [0.29, 2.11, 74.24, 402.41, 655.36, 700000.0])
+def test_clock_stopping_on_the_wakeup_time(delay):
+    # the floor of the elapsed ticks can fall one short of the
+    # tick of the wakeup, the wheel must still make progress
+    clock, wheel = build_wheel()
+    called = list()
+    wheel.call_later(delay, called.append, delay)
+    clock.advance(delay)
+    clock.advance(wheel.resolution)
+    assert called == [delay]
+    assert not clock.getDelayedCalls()
+
+
+def test_timers_run_in_the_first_tick_after_their_time():
+    clock, wheel = build_wheel()
+    rng = random.Random(7)
+    called = dict()
+    delays = [rng.uniform(0, 2000) for _ in range(500)] + [0.0, 2.56, 2.57, 655.36]
+    for i, delay in enumerate(delays):
+        wheel.call_later(delay, lambda i=i: called.setdefault(i, clock.seconds()))
+    while clock.seconds() < 2001:
+        clock.advance(rng.uniform(0, 3.0))
+        for i, when in called.items():
+            assert delays[i] <= when + 1e-9
+    assert len(called) == len(delays)
+    assert wheel.count == 0
+
+
+def test_long_timers_do_not_wake_the_wheel_every_turn():
+    clock, wheel = build_wheel()
+    wakeups = list()
+    advance = wheel._advance
+
+    def counted():
+        wakeups.append(clock.seconds())
+        advance()
+
+    wheel._advance = counted
+    called = list()
+    wheel.call_later(3600.0, called.append, True)
+    clock.pump([1.0] * 3601)
+    assert called == [True]
+    # one wakeup per level the timer goes down, not one
+    # for each turn of 2.56 seconds of the first level
+    assert len(wakeups) <= 4
+
+
+def test_cancel():
+    clock, wheel = build_wheel()
+    called = list()
+    timers = [wheel.call_later(d, called.append, d) for d in (1.0, 10.0, 100.0)]
+    timers[1].cancel()
+    timers[1].cancel()
+    assert wheel.count == 2
+    clock.pump([1.0] * 101)
+    assert called == [1.0, 100.0]
+    assert not timers[0].active()
+
+
+def test_timers_added_while_running():
+    clock, wheel = build_wheel()
+    called = list()
+
+    def chain(n):
+        called.append(clock.seconds())
+        if n:
+            wheel.call_later(SLOTS * wheel.resolution, chain, n - 1)
+
+    wheel.call_later(0.5, chain, 3)
+    clock.pump([0.1] * 200)
+    assert len(called) == 4
+    assert [round(b - a, 2) for a, b in zip(called, called[1:])] == [2.6] * 3
+
+
+def test_periodic_calls_do_not_drift():
+    clock, wheel = build_wheel()
+    called = list()
+    call = wheel.call_every(1.0, lambda: called.append(clock.seconds()))
+    wheel.call_every(1.0, called.append, 'same group')
+    assert len(wheel.groups) == 1
+    clock.pump([0.3] * 34)
+    ticks = [t for t in called if t != 'same group']
+    assert len(ticks) == 10
+    assert all(abs(t - round(t)) < 0.31 for t in ticks)
+    call.cancel()
+    clock.advance(5.0)
+    assert len([t for t in called if t != 'same group']) == 10
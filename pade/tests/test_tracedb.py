@@ -0,0 +1,129 @@
+from twisted.internet.defer import Deferred
+
+from pade.core import tracedb
+from pade.core.tracedb import BatchWriter, TraceWriter
+
+from datetime import datetime
+import threading
+import xml.etree.ElementTree as ET
+
+import pytest
+
+
+def record(content, sender='a@localhost:2000', date=datetime(2020, 1, 1, 12, 0)):
+    return (date, sender, 'b', 'inform', None, 'c1', 'm1', None, None, content)
+
+
+class ThreadCalls(object):
+    """Replaces deferToThread, the calls run when finish is called."""
+
+    def __init__(self):
+        self.calls = list()
+
+    def __call__(self, method, *args):
+        d = Deferred()
+        self.calls.append((d, method, args))
+        return d
+
+    def finish(self):
+        d, method, args = self.calls.pop(0)
+        d.callback(method(*args))
+
+
+@pytest.fixture
+def thread_calls(monkeypatch):
+    calls = ThreadCalls()
+    monkeypatch.setattr(tracedb.threads, 'deferToThread', calls)
+    return calls
+
+
+class ListWriter(BatchWriter):
+
+    def __init__(self, *args, **kwargs):
+        super(ListWriter, self).__init__(*args, **kwargs)
+        self.batches = list()
+
+    def _write(self, batch):
+        self.batches.append([record[-1] for _, record in batch])
+        return len(batch)
+
+
+def test_records_are_written_with_the_agent_ids(trace_database):
+    db = trace_database
+    first = db.add_agent('a@localhost:2000')
+    writer = TraceWriter(db.engine, db.messages, db.agents)
+    writer._load_agent_ids(None)
+    assert writer.agent_ids == {'a@localhost:2000': first}
+
+    # agents not seen yet are looked up when their records are written
+    second = db.add_agent('b@localhost:2001')
+    written = writer._write([('a@localhost:2000', record('one')),
+                             ('b@localhost:2001', record('two')),
+                             ('c@localhost:2002', record('three'))])
+    assert written == 3
+    assert writer.written == 3
+    rows = db.rows()
+    assert [row['content'] for row in rows] == ['one', 'two', 'three']
+    assert [row['agent_id'] for row in rows] == [first, second, None]
+
+
+def test_xml_content_and_missing_dates(trace_database):
+    db = trace_database
+    writer = TraceWriter(db.engine, db.messages, db.agents)
+    writer._write([('a@localhost:2000', record(ET.Element('state'), date=None))])
+    row = db.rows()[0]
+    assert row['content'] == '<state />'
+    assert row['date'] is not None
+
+
+def test_flush_size_triggers_a_flush(clock, thread_calls):
+    writer = ListWriter(flush_size=3, flush_interval=5.0)
+    writer.add('a', [record('1'), record('2')])
+    assert thread_calls.calls == []
+    writer.add('a', [record('3')])
+    assert len(thread_calls.calls) == 1
+    thread_calls.finish()
+    assert writer.batches == [['1', '2', '3']]
+    assert writer.pending == []
+
+
+def test_flush_interval_writes_the_first_records(clock, thread_calls):
+    writer = ListWriter(flush_size=100, flush_interval=5.0)
+    writer.add('a', [record('1')])
+    clock.advance(4.0)
+    assert thread_calls.calls == []
+    clock.advance(1.0)
+    thread_calls.finish()
+    assert writer.batches == [['1']]
+
+
+def test_one_batch_is_written_at_a_time(clock, thread_calls):
+    writer = ListWriter(flush_size=2, flush_interval=5.0)
+    writer.add('a', [record('1'), record('2')])
+    writer.add('a', [record('3'), record('4')])
+    writer.add('a', [record('5')])
+    assert len(thread_calls.calls) == 1
+    assert writer.flush() is thread_calls.calls[0][0]
+
+    # the records buffered meanwhile go in the next batch
+    thread_calls.finish()
+    assert len(thread_calls.calls) == 1
+    thread_calls.finish()
+    assert writer.batches == [['1', '2'], ['3', '4', '5']]
+    assert thread_calls.calls == []
+
+
+def test_writes_wait_for_the_lock(clock, thread_calls):
+    writer = ListWriter()
+    writer.add('a', [record('1')])
+    writer.flush()
+    d, method, args = thread_calls.calls[0]
+    # the retention holds the lock while it moves messages
+    with writer.lock:
+        thread = threading.Thread(target=method, args=args)
+        thread.start()
+        thread.join(0.1)
+        assert thread.is_alive()
+        assert writer.batches == []
+    thread.join()
+    assert writer.batches == [['1']]
@@ -0,0 +1,106 @@
+from pade.core.tracestore import (SegmentTraceStore, SegmentTraceWriter, INDEX_FILE,
+                                  SEGMENT_INDEX, timestamp)
+
+from datetime import datetime
+import json
+import os
+
+
+def block(times, sender='a@localhost:2000'):
+    rows = {'timestamp': list(times), 'agent': ['sniffed'] * len(times)}
+    for column in ('sender', 'receivers', 'performative', 'protocol',
+                   'conversation_id', 'message_id', 'ontology', 'language'):
+        rows[column] = [None] * len(times)
+    rows['sender'] = [sender] * len(times)
+    return rows, ['content {}'.format(t) for t in times]
+
+
+def fill(store, count, size=10, start=1000.0):
+    for i in range(0, count, size):
+        store.append(*block([start + i + j for j in range(size)]))
+
+
+def test_records_are_read_back_by_time_range(tmpdir):
+    store = SegmentTraceStore(str(tmpdir))
+    fill(store, 30)
+    records = list(store.query(start=1005.0, end=1014.0))
+    assert [r['timestamp'] for r in records] == [1005.0 + i for i in range(10)]
+    assert store.content(records[0]['content_ref']) == 'content 1005.0'
+
+
+def test_blocks_and_segments_are_skipped(tmpdir):
+    store = SegmentTraceStore(str(tmpdir), segment_records=20)
+    fill(store, 60)
+    store.append(*block([2000.0], sender='b@localhost:2001'))
+    assert [s.name for s in store.segments] == \
+        ['segment-00000001', 'segment-00000002', 'segment-00000003', 'segment-00000004']
+    assert [s.name for s in store.select(start=1025.0, end=1030.0)] == ['segment-00000002']
+    assert [s.name for s in store.select(sender='b@localhost:2001')] == ['segment-00000004']
+    assert [r['timestamp'] for r in store.query(sender='b@localhost:2001')] == [2000.0]
+
+
+def test_closed_segments_are_indexed_once(tmpdir, monkeypatch):
+    store = SegmentTraceStore(str(tmpdir), segment_records=20)
+    written = list()
+    write_json = store._write_json
+    monkeypatch.setattr(store, '_write_json',
+                        lambda path, value: (written.append(os.path.basename(path)),
+                                             write_json(path, value)))
+    fill(store, 60)
+    assert written.count('segment-00000001' + SEGMENT_INDEX) == 1
+    assert written.count('segment-00000002' + SEGMENT_INDEX) == 1
+    assert written.count(INDEX_FILE) == 6
+    with open(os.path.join(str(tmpdir), INDEX_FILE)) as f:
+        assert json.load(f)['open']['name'] == 'segment-00000003'
+
+
+def test_index_is_loaded_again(tmpdir):
+    store = SegmentTraceStore(str(tmpdir), segment_records=20)
+    fill(store, 50)
+    store = SegmentTraceStore(str(tmpdir), segment_records=20)
+    assert [(s.name, s.count) for s in store.segments] == \
+        [('segment-00000001', 20), ('segment-00000002', 20), ('segment-00000003', 10)]
+    assert len(list(store.query())) == 50
+    records = list(store.query(start=1045.0))
+    assert store.content(records[0]['content_ref']) == 'content 1045.0'
+    fill(store, 10, start=1050.0)
+    assert store.segments[-1].count == 20
+
+
+def test_blocks_missing_from_the_index_are_dropped(tmpdir):
+    store = SegmentTraceStore(str(tmpdir))
+    fill(store, 20)
+    segment = store.segments[-1]
+    size = os.path.getsize(store.path(segment, '.cols'))
+    # a block written without its index entry, as after a crash
+    store._save_index = lambda: None
+    fill(store, 10, start=2000.0)
+    store = SegmentTraceStore(str(tmpdir))
+    assert os.path.getsize(store.path(segment, '.cols')) == size
+    assert len(list(store.query())) == 20
+
+
+def test_index_of_older_versions(tmpdir):
+    store = SegmentTraceStore(str(tmpdir), segment_records=20)
+    fill(store, 50)
+    entries = [segment.to_dict() for segment in store.segments]
+    for segment in store.segments[:-1]:
+        os.remove(store.path(segment, SEGMENT_INDEX))
+    with open(os.path.join(str(tmpdir), INDEX_FILE), 'w') as f:
+        json.dump(entries, f)
+
+    store = SegmentTraceStore(str(tmpdir), segment_records=20)
+    assert [s.count for s in store.segments] == [20, 20, 10]
+    assert os.path.exists(store.path(store.segments[0], SEGMENT_INDEX))
+    store = SegmentTraceStore(str(tmpdir), segment_records=20)
+    assert [s.count for s in store.segments] == [20, 20, 10]
+
+
+def test_segment_writer(tmpdir):
+    writer = SegmentTraceWriter(str(tmpdir))
+    date = datetime(2020, 1, 1, 12, 0)
+    record = (date, 'a@localhost:2000', 'b', 'inform', None, 'c1', 'm1', None, None, 'hi')
+    assert writer._write([('a@localhost:2000', record)] * 3) == 3
+    records = list(writer.store.query())
+    assert [r['timestamp'] for r in records] == [timestamp(date)] * 3
+    assert writer.store.content(records[2]['content_ref']) == 'hi'
@@ -2,6 +2,7 @@ import os
 import datetime
 import requests
 import json
+import threading
 import pagan
 from requests.exceptions import Timeout
 from flask import Flask
@@ -11,6 +12,7 @@ from flask_login import LoginManager, login_required, login_user, logout_user, U
 from flask_wtf import FlaskForm
 from flask_migrate import Migrate, MigrateCommand
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import func, inspect
 from flask_script import Manager
 from flask_login import UserMixin
 from livereload import Server
@@ -20,6 +22,8 @@ from wtforms.validators import DataRequired, Email, Length, EqualTo
 
 from werkzeug.security import generate_password_hash, check_password_hash
 
+from pade.core.search import MessageSearchIndex
+
 basedir = os.path.abspath(os.path.dirname(__file__))
 
 
@@ -110,13 +114,13 @@ class AgentModel(db.Model):
 class Message(db.Model):
     __tablename__ = 'messages'
     id = db.Column(db.Integer, primary_key=True)
-    agent_id = db.Column(db.Integer, db.ForeignKey('agents.id'))
-    conversation_id = db.Column(db.String(64))
+    agent_id = db.Column(db.Integer, db.ForeignKey('agents.id'), index=True)
+    conversation_id = db.Column(db.String(64), index=True)
     message_id = db.Column(db.String(64))
-    date = db.Column(db.DateTime)
-    performative = db.Column(db.String(64))
+    date = db.Column(db.DateTime, index=True)
+    performative = db.Column(db.String(64), index=True)
     protocol = db.Column(db.String(64))
-    sender = db.Column(db.String(64))
+    sender = db.Column(db.String(64), index=True)
     receivers = db.Column(db.String)
     content = db.Column(db.String)
     ontology = db.Column(db.String)
@@ -126,6 +130,19 @@ class Message(db.Model):
         return 'Message %s' % self.id
 
 
+class MessageAggregate(db.Model):
+    __tablename__ = 'message_aggregates'
+    id = db.Column(db.Integer, primary_key=True)
+    minute = db.Column(db.DateTime, index=True)
+    sender = db.Column(db.String(64))
+    performative = db.Column(db.String(64))
+    protocol = db.Column(db.String(64))
+    count = db.Column(db.Integer)
+
+    def __repr__(self):
+        return 'MessageAggregate %s %s' % (self.minute, self.sender)
+
+
 class RemoteSession(db.Model):
     __tablename__ = 'remote_sessions'
     id = db.Column(db.Integer, primary_key=True)
@@ -160,12 +177,59 @@ class RegistrationForm(FlaskForm):
     submit = SubmitField('Create')
 
 
+# messages shown in a page of the message lists
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+# messages drawn in the sequence diagram
+DIAGRAM_SIZE = 200
+
+
 @app.before_first_request
 def create_database():
     db.create_all()
+    create_missing_indexes()
+    # the messages stored before the full-text index are indexed
+    # in the background, the LIKE filter is used until they are
+    search = MessageSearchIndex(db.engine, Message.__table__)
+    if search.create():
+        threading.Thread(target=search.reindex, daemon=True).start()
     print('[Flask-Server] >>> Database created.')
 
 
+def create_missing_indexes():
+    # create_all does not add indexes to tables that already exist
+    for table in (Message.__table__,):
+        existing = set(index['name'] for index in inspect(db.engine).get_indexes(table.name))
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(db.engine)
+
+
+def page_limit(default=PAGE_SIZE):
+    """Returns the limit argument of the request, kept between
+    1 and MAX_PAGE_SIZE.
+    """
+    limit = request.values.get('limit', default, type=int)
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def keyset_page(query, column=Message.id):
+    """Returns a page of a query, newest first, and the cursor
+    of the next page, None on the last page.
+
+    The page starts after the cursor given in the before argument
+    of the request, so a page costs the same at any depth.
+    """
+    before = request.values.get('before', type=int)
+    limit = page_limit()
+    if before is not None:
+        query = query.filter(column < before)
+    items = query.order_by(column.desc()).limit(limit + 1).all()
+    if len(items) > limit:
+        return items[:limit], getattr(items[limit - 1], column.key)
+    return items, None
+
+
 @login_manager.user_loader
 def load_user(user_id):
     return User.query.get(int(user_id))
@@ -288,8 +352,8 @@ def messagesTable():
 
 @app.route('/messagesList', methods=['GET'])
 def messagesList():
-    messages = Message.query.all()
-    return render_template('messagesList.html', messages=messages)
+    messages, next_before = keyset_page(Message.query)
+    return render_template('messagesList.html', messages=messages, next_before=next_before)
 
 
 @app.route('/manage_users', methods=['GET', 'POST'])
@@ -341,8 +405,9 @@ def suggestions():
 @login_required
 def agent_messages(agent_id):
     agent = AgentModel.query.filter_by(id=agent_id).first()
-    messages = agent.messages
-    return render_template('agent_messages.html', messages=messages, agent=agent)
+    messages, next_before = keyset_page(Message.query.filter(Message.agent_id == agent.id))
+    return render_template('agent_messages.html', messages=messages, agent=agent,
+                           next_before=next_before)
 
 
 @app.route('/session/agents', methods=['POST'])
@@ -390,50 +455,54 @@ def manage_sessions():
 
 @app.route('/remote_sessions', methods=['GET'])
 def get_sessions():
-    data = []
-
-    # List to store agents over the loop
-    agents = []
-    messages = []
-    sessions = Session.query.all()
-
-    for session in sessions:
-        data = {'Session Name': session.name,
-                'Session ID': session.id,
-                'Session Date': session.date,
-                'Session State': session.state,
-                'Agents': [],
-                'Messages': []
-                }
-
-        for agent in session.agents:
-            data_agents = {'Agent ID': agent.id,
-                           'Session Agent ID': agent.session.id,
-                           'Agent Name': agent.name,
-                           'Agent Date': agent.date,
-                           'Agent State': agent.state,
-                           }
-
-            for m in agent.messages:
-                data_messages = {'Message ID': m.id,
-                                 'Agent Message ID': m.agent_id,
-                                 'Conversation ID': m.conversation_id,
-                                 'Message Date': m.date,
-                                 'Message Performative': m.performative,
-                                 'Protocol': m.protocol,
-                                 'Sender': m.sender,
-                                 'Receivers': m.receivers,
-                                 'Content': m.content,
-                                 'Ontology': m.ontology,
-                                 'Language': m.language,
-                                 }
-
-                messages.append(data_messages)
-
-            data['Messages'] = messages
-            agents.append(data_agents)
-
-        data['Agents'] = agents
+    """Returns a session with its agents and one page of its
+    messages. The session is given by its id in the session
+    argument, the latest session by default, and the next page
+    of its messages is requested with before=<Next Messages>.
+    """
+    session_id = request.values.get('session', type=int)
+    if session_id is not None:
+        session = Session.query.filter_by(id=session_id).first()
+    else:
+        session = Session.query.order_by(Session.id.desc()).first()
+    if session is None:
+        return jsonify([])
+
+    data = {'Session Name': session.name,
+            'Session ID': session.id,
+            'Session Date': session.date,
+            'Session State': session.state,
+            'Agents': [],
+            'Messages': []
+            }
+
+    for agent in session.agents:
+        data_agents = {'Agent ID': agent.id,
+                       'Session Agent ID': session.id,
+                       'Agent Name': agent.name,
+                       'Agent Date': agent.date,
+                       'Agent State': agent.state,
+                       }
+        data['Agents'].append(data_agents)
+
+    page, next_before = keyset_page(
+        Message.query.join(AgentModel).filter(AgentModel.session_id == session.id))
+    for m in page:
+        data_messages = {'Message ID': m.id,
+                         'Agent Message ID': m.agent_id,
+                         'Conversation ID': m.conversation_id,
+                         'Message Date': m.date,
+                         'Message Performative': m.performative,
+                         'Protocol': m.protocol,
+                         'Sender': m.sender,
+                         'Receivers': m.receivers,
+                         'Content': m.content,
+                         'Ontology': m.ontology,
+                         'Language': m.language,
+                         }
+        data['Messages'].append(data_messages)
+
+    data['Next Messages'] = next_before
 
     return jsonify(data)
 
@@ -488,21 +557,44 @@ def diagrams():
 
 @app.route('/messages_diagram', methods=['GET'])
 def messages_diagram():
-    data = Message.query.order_by(Message.date).all()
     data_diagram = ''
-    msgs_id = list()
 
+    if request.args.get('aggregate', type=int):
+        # one arrow for each sender, receivers and performative,
+        # counted by the database
+        rows = db.session.query(Message.sender, Message.receivers, Message.performative,
+                                func.count(func.distinct(Message.message_id))) \
+            .group_by(Message.sender, Message.receivers, Message.performative) \
+            .order_by(func.min(Message.id)).all()
+        for sender, receivers, performative, count in rows:
+            sender = (sender or '').split("@")[0]
+            for receiver in (receivers or '').split(';'):
+                receiver_ = str(receiver).split('@')[0]
+                data_diagram += '{}-->{}: {} x{}\n'.format(sender, receiver_, performative, count)
+        return render_template('messagesDiagrams.html', messages=data_diagram)
+
+    # the last DIAGRAM_SIZE messages, or the ones before the
+    # cursor given in the before argument
+    limit = page_limit(DIAGRAM_SIZE)
+    query = Message.query.with_entities(Message.id, Message.message_id, Message.sender,
+                                        Message.receivers, Message.performative,
+                                        Message.content)
+    before = request.args.get('before', type=int)
+    if before is not None:
+        query = query.filter(Message.id < before)
+    data = query.order_by(Message.id.desc()).limit(limit).all()
+    data.reverse()
+
+    msgs_id = set()
     for msg in data:
         if msg.message_id in msgs_id:
-            data.remove(msg)
             continue
-        msgs_id.append(msg.message_id)
+        msgs_id.add(msg.message_id)
 
-    for msg in data:
-        content = msg.content
-        sender = msg.sender.split("@")[0]
-        
-        for receiver in msg.receivers.split(';'):
+        content = msg.content or ''
+        sender = (msg.sender or '').split("@")[0]
+
+        for receiver in (msg.receivers or '').split(';'):
             receiver_ = str(receiver).split('@')[0]
             performative = msg.performative
 
@@ -516,53 +608,108 @@ def messages_diagram():
     return render_template('messagesDiagrams.html', messages=data_diagram)
 
 
+def message_filters():
+    """Returns the filters of the messages page given in the
+    form or in the query string.
+    """
+    filters = dict()
+    for name in ('sender', 'performative', 'content', 'timeStart', 'timeStop'):
+        value = request.values.get(name)
+        if value:
+            filters[name] = value
+    return filters
+
+
+# formats of the datetime-local inputs, with the time added
+# to the end of a range given with them
+DATE_FORMATS = (('%Y-%m-%dT%H:%M', datetime.timedelta(seconds=59, microseconds=999999)),
+                ('%Y-%m-%dT%H:%M:%S', datetime.timedelta(microseconds=999999)),
+                ('%Y-%m-%dT%H:%M:%S.%f', datetime.timedelta()))
+
+
+def parse_date(value, end=False):
+    """Returns the datetime of a datetime-local input, None if
+    the value is not a date. With end, the last instant of the
+    minute or second given is returned.
+    """
+    for date_format, precision in DATE_FORMATS:
+        try:
+            date = datetime.datetime.strptime(value, date_format)
+        except ValueError:
+            continue
+        return date + precision if end else date
+    return None
+
+
 @app.route('/messages', methods=['GET', 'POST'])
 @login_required
 def messages():
-    data = Message.query.all()
-    senders = []
-    performatives = []
-
-    # This for loop its used to get all the senders and performatives from the messages being sent,
-    # so it can be used in the filters
-    for message in data:
-        if message.sender not in senders[:]:
-            senders.append(message.sender)
-
-        if message.performative not in performatives[:]:
-            performatives.append(message.performative)
-
-    if request.method == 'GET':
-        return render_template('messages.html', messages=data, senders=senders, performatives=performatives)
-
-    if request.method == 'POST':
-
-        data = []
-
-        ###############################
-        # Capturing values from input #
-        ###############################
-        selected_sender = request.form.get('sender')
-        selected_performative = request.form.get('performative')
-        content = request.form.get('content')
-        time_start = request.form.get('timeStart')
-        time_stop = request.form.get('timeStop')
-
-        if content:
-            data = Message.query.filter(Message.content.contains(content))
-
-        if selected_performative:
-            data = Message.query.filter(Message.performative == selected_performative)
-
-        if selected_sender:
-            data = Message.query.filter(Message.sender == selected_sender)
-
-        if time_start:
-            start = time_start.replace("T", " ") + ":00.000000"
-            stop = time_stop.replace("T", " ") + ":59.999999"
-            data = Message.query.filter(Message.date > start).filter(Message.date < stop)
-
-        return render_template('messagesFiltered.html', messages=data, senders=senders, performatives=performatives)
+    # the filters are built from the indexes instead of
+    # walking every message
+    senders = [sender for sender, in db.session.query(Message.sender).distinct()]
+    performatives = [performative for performative, in
+                     db.session.query(Message.performative).distinct()]
+    filters = message_filters()
+
+    if request.method == 'GET' and not filters:
+        data, next_before = keyset_page(Message.query)
+        return render_template('messages.html', messages=data, senders=senders,
+                               performatives=performatives, next_before=next_before)
+
+    ###############################
+    # Capturing values from input #
+    ###############################
+    start = stop = None
+    if 'timeStart' in filters:
+        start = parse_date(filters['timeStart'])
+        if start is None:
+            del filters['timeStart']
+    if 'timeStop' in filters:
+        stop = parse_date(filters['timeStop'], end=True)
+        if stop is None:
+            del filters['timeStop']
+
+    search = MessageSearchIndex(db.engine, Message.__table__)
+    if 'content' in filters and search.complete():
+        # ranked search in the full-text index, paginated by
+        # offset since the order is the rank and not the id
+        offset = request.values.get('offset', 0, type=int)
+        limit = page_limit()
+        found = search.search(filters['content'], sender=filters.get('sender'),
+                              performative=filters.get('performative'),
+                              start=start, stop=stop, limit=limit + 1, offset=offset)
+        ids = [message_id for message_id, _ in found[:limit]]
+        rows = dict((m.id, m) for m in Message.query.filter(Message.id.in_(ids)))
+        data = [rows[message_id] for message_id in ids if message_id in rows]
+        next_page = None
+        if len(found) > limit:
+            next_page = dict(filters, offset=offset + limit)
+        return render_template('messagesFiltered.html', messages=data, senders=senders,
+                               performatives=performatives, next_page=next_page)
+
+    query = Message.query
+
+    if 'content' in filters:
+        # databases without a complete full-text index
+        query = query.filter(Message.content.contains(filters['content']))
+
+    if 'performative' in filters:
+        query = query.filter(Message.performative == filters['performative'])
+
+    if 'sender' in filters:
+        query = query.filter(Message.sender == filters['sender'])
+
+    if start is not None:
+        query = query.filter(Message.date > start)
+    if stop is not None:
+        query = query.filter(Message.date < stop)
+
+    data, next_before = keyset_page(query)
+    next_page = None
+    if next_before is not None:
+        next_page = dict(filters, before=next_before)
+    return render_template('messagesFiltered.html', messages=data, senders=senders,
+                           performatives=performatives, next_page=next_page)
 
 
 def generate_agent_avatars():
@@ -50,6 +50,7 @@ setup(name='pade',
                         'Flask-Script==2.0.6',
                         'Flask==1.1.2',
                         'terminaltables==3.1.0'],
+      extras_require={'numpy': ['numpy>=1.16']},
       license='MIT',
       keywords='multiagent distributed systems',
       url='http://pade.readthedocs.org',